@@ -0,0 +1,76 @@
+"""
+Compare the results of two benchmark runs stored with
+``pytest --benchmark-json`` and report benchmarks that became slower.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+#: Statistics of pytest-benchmark that can be compared.
+STATISTIC_NAMES = ('min', 'max', 'mean', 'median', 'stddev')
+
+
+def _parsed_args(arguments: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        '--statistic', '-s', choices=STATISTIC_NAMES, default='median',
+        help='statistic to compare; default: %(default)s')
+    parser.add_argument(
+        '--threshold', '-t', type=float, default=10.0, metavar='PERCENT',
+        help='report benchmarks that are more than PERCENT slower as regression; default: %(default)s')
+    parser.add_argument('baseline_path', metavar='BASELINE', help='JSON file with results of the baseline')
+    parser.add_argument('current_path', metavar='CURRENT', help='JSON file with results of the current code')
+    return parser.parse_args(arguments)
+
+
+def benchmark_name_to_statistic_map(benchmark_json_path: str, statistic_name: str='median') -> Dict[str, float]:
+    """
+    Map of the full name of each benchmark in ``benchmark_json_path`` to
+    its statistic ``statistic_name`` in seconds.
+    """
+    with open(benchmark_json_path, encoding='utf-8') as benchmark_json_file:
+        benchmark_json = json.load(benchmark_json_file)
+    return {
+        benchmark['fullname']: benchmark['stats'][statistic_name]
+        for benchmark in benchmark_json['benchmarks']
+    }
+
+
+def changes_in_percent(baseline_map: Dict[str, float], current_map: Dict[str, float]) -> Dict[str, float]:
+    """
+    Map of the name of each benchmark in both ``baseline_map`` and
+    ``current_map`` to how many percent slower (positive) or faster
+    (negative) the current result is.
+    """
+    return {
+        name: 100.0 * (current_map[name] - baseline_time) / baseline_time if baseline_time > 0 else 0.0
+        for name, baseline_time in baseline_map.items()
+        if name in current_map
+    }
+
+
+def main(arguments: List[str]=None) -> int:
+    args = _parsed_args(arguments)
+    baseline_map = benchmark_name_to_statistic_map(args.baseline_path, args.statistic)
+    current_map = benchmark_name_to_statistic_map(args.current_path, args.statistic)
+    name_to_change_map = changes_in_percent(baseline_map, current_map)
+    regression_count = 0
+    for name in sorted(name_to_change_map.keys()):
+        change = name_to_change_map[name]
+        is_regression = change > args.threshold
+        if is_regression:
+            regression_count += 1
+        print('%-10s %+8.1f%%  %12.6f -> %12.6f s  %s' % (
+            'SLOWER' if is_regression else 'ok', change, baseline_map[name], current_map[name], name))
+    for name in sorted(set(baseline_map.keys()) - set(current_map.keys())):
+        print('%-10s %s' % ('REMOVED', name))
+    for name in sorted(set(current_map.keys()) - set(baseline_map.keys())):
+        print('%-10s %s' % ('ADDED', name))
+    if regression_count != 0:
+        print('%d benchmark(s) are more than %.1f%% slower' % (regression_count, args.threshold), file=sys.stderr)
+    return 1 if regression_count != 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Fixtures for the benchmarks. For details, see https://pytest.org/latest/plugins.html.
+"""
+from functools import lru_cache
+
+import pytest
+from shapiro.analysis import Lexicon
+from shapiro.language import EnglishSentiment
+
+from synthetic import synthetic_lexicon, synthetic_words
+
+#: Sizes of lexicons to benchmark.
+LEXICON_SIZES = (10, 1000, 100000, 1000000)
+
+#: Numbers of tokens in texts to benchmark.
+TOKEN_COUNTS = (10, 1000, 100000)
+
+#: Number of different words in synthetic texts.
+VOCABULARY_SIZE = 5000
+
+
+@lru_cache(maxsize=None)
+def cached_synthetic_lexicon(size: int) -> Lexicon:
+    """
+    Same as :py:func:`synthetic.synthetic_lexicon` but built only once for
+    all benchmarks because large lexicons take a while to build.
+    """
+    return synthetic_lexicon(size)
+
+
+@pytest.fixture(scope='session')
+def vocabulary():
+    return synthetic_words(VOCABULARY_SIZE)
+
+
+@pytest.fixture(scope='session')
+def english_sentiment():
+    return EnglishSentiment()
+
+
+@pytest.fixture(scope='session')
+def nlp_en():
+    """
+    spaCy model for English; benchmarks using it are skipped if spaCy or the
+    model are not installed.
+    """
+    pytest.importorskip('spacy')
+    from shapiro import models
+    from shapiro.analysis import add_token_extension
+
+    add_token_extension(force=True)
+    try:
+        return models.language_model('en')
+    except OSError as error:
+        pytest.skip('spaCy model "en" must be installed: %s' % error)
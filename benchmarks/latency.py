@@ -0,0 +1,431 @@
+"""
+Measure the latency percentiles of single documents analyzed with
+:py:meth:`shapiro.analysis.OpinionMiner.opinions` by concurrent clients.
+
+Each client is a thread that analyzes one document after another (closed
+loop), so effects of the global interpreter lock and of queueing show up
+in the tail latencies. Requests during the warm-up are not recorded.
+
+Latencies are corrected for coordinated omission: while a slow request
+blocks a client, it cannot send the requests it otherwise would have sent,
+so simply recording the time of each request hides how long those would
+have waited. With ``--rate``, each client sends requests according to a
+fixed schedule and latencies are measured from the time a request was
+supposed to start. Without ``--rate``, the median latency during the
+warm-up (or of the first measured requests if there is no warm-up) is used
+as expected interval between requests and additional latencies are derived
+the same way HdrHistogram's ``recordValueWithExpectedInterval`` does.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from shapiro import models
+from shapiro.analysis import OpinionMiner, add_token_extension
+from shapiro.language import language_sentiment_for
+
+from synthetic import SEED, SyntheticFeedbackGenerator, restauranteering_lexicon
+
+#: Pairs of the number of sentences per document and how often they occur in relation to each other.
+SENTENCE_COUNT_WEIGHTS = ((1, 50), (2, 20), (3, 10), (5, 10), (10, 7), (30, 3))
+
+#: Percentiles to report.
+REPORTED_PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+#: Number of different texts the clients choose from.
+_TEXT_COUNT = 1000
+
+#: Number of measured requests whose median service time is the expected interval between requests if there is no
+#: warm-up.
+_EXPECTED_INTERVAL_REQUEST_COUNT = 10
+
+_MICROSECONDS_PER_SECOND = 1000000
+_MICROSECONDS_PER_MILLISECOND = 1000
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies in microseconds similar to HdrHistogram: values
+    are stored with a relative precision of ``significant_digits`` using
+    buckets whose width grows with the value, so even millions of values
+    need little memory.
+    """
+    def __init__(self, significant_digits: int=3):
+        assert 1 <= significant_digits <= 5
+
+        self.significant_digits = significant_digits
+        # Values below this are stored exactly, larger ones are rounded down to the same number of bits.
+        sub_bucket_count = 2 ** math.ceil(math.log2(2 * 10 ** significant_digits))
+        self._sub_bucket_bits = sub_bucket_count.bit_length() - 1
+        self._lowest_value_to_count_map = Counter()
+        self.total_count = 0
+        self.min = None
+        self.max = None
+        self._total = 0
+
+    def _shift_of(self, value: int) -> int:
+        return max(0, value.bit_length() - self._sub_bucket_bits)
+
+    def _lowest_equivalent_value(self, value: int) -> int:
+        shift = self._shift_of(value)
+        return (value >> shift) << shift
+
+    def _highest_equivalent_value(self, lowest_value: int) -> int:
+        return lowest_value + (1 << self._shift_of(lowest_value)) - 1
+
+    def record(self, value: int, count: int=1):
+        assert value >= 0
+        assert count >= 1
+
+        self._lowest_value_to_count_map[self._lowest_equivalent_value(value)] += count
+        self.total_count += count
+        self._total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def record_corrected(self, value: int, expected_interval: int):
+        """
+        Record ``value`` and, if it is larger than ``expected_interval``,
+        the latencies of the requests that could not be sent in the
+        meantime, see HdrHistogram's ``recordValueWithExpectedInterval``.
+        """
+        self.record(value)
+        if expected_interval > 0:
+            missing_value = value - expected_interval
+            while missing_value >= expected_interval:
+                self.record(missing_value)
+                missing_value -= expected_interval
+
+    def merge(self, other: 'LatencyHistogram'):
+        assert other.significant_digits == self.significant_digits
+
+        self._lowest_value_to_count_map.update(other._lowest_value_to_count_map)
+        self.total_count += other.total_count
+        self._total += other._total
+        if other.total_count != 0:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self._total / self.total_count if self.total_count != 0 else 0.0
+
+    @property
+    def standard_deviation(self) -> float:
+        if self.total_count == 0:
+            return 0.0
+        mean = self.mean
+        squared_deviation_total = sum(
+            count * (self._median_equivalent_value(lowest_value) - mean) ** 2
+            for lowest_value, count in self._lowest_value_to_count_map.items()
+        )
+        return math.sqrt(squared_deviation_total / self.total_count)
+
+    def _median_equivalent_value(self, lowest_value: int) -> float:
+        return (lowest_value + self._highest_equivalent_value(lowest_value)) / 2
+
+    def value_at_percentile(self, percentile: float) -> int:
+        """
+        The highest value equivalent to the value ``percentile`` percent of
+        all values are less than or equal to.
+        """
+        assert 0.0 <= percentile <= 100.0
+
+        result = 0
+        if self.total_count != 0:
+            count_at_percentile = max(1, math.ceil(percentile / 100.0 * self.total_count))
+            cumulated_count = 0
+            for lowest_value in sorted(self._lowest_value_to_count_map.keys()):
+                cumulated_count += self._lowest_value_to_count_map[lowest_value]
+                if cumulated_count >= count_at_percentile:
+                    result = min(self._highest_equivalent_value(lowest_value), self.max)
+                    break
+        return result
+
+    def percentile_distribution(self, ticks_per_half_distance: int=5) -> List[Tuple[int, float, int]]:
+        """
+        Tuples ``(value, percentile, total_count)`` at percentiles that get
+        closer to 100 the same way HdrHistogram's
+        ``outputPercentileDistribution`` does: each half of the remaining
+        distance to 100 is divided into ``ticks_per_half_distance`` steps.
+        """
+        assert ticks_per_half_distance >= 1
+
+        result = []
+        if self.total_count != 0:
+            cumulated_count = 0
+            sorted_lowest_values = sorted(self._lowest_value_to_count_map.keys())
+            value_index = 0
+            half_distance = 50.0
+            percentile = 0.0
+            while True:
+                count_at_percentile = max(1, math.ceil(percentile / 100.0 * self.total_count))
+                while cumulated_count < count_at_percentile:
+                    cumulated_count += self._lowest_value_to_count_map[sorted_lowest_values[value_index]]
+                    value_index += 1
+                value = min(self._highest_equivalent_value(sorted_lowest_values[value_index - 1]), self.max)
+                result.append((value, percentile, cumulated_count))
+                if cumulated_count >= self.total_count:
+                    break
+                percentile += half_distance / ticks_per_half_distance
+                if percentile >= 100.0 - half_distance:
+                    half_distance /= 2
+            if result[-1][1] < 100.0:
+                result.append((self.max, 100.0, self.total_count))
+        return result
+
+    def write_percentile_distribution(self, target_file, ticks_per_half_distance: int=5):
+        """
+        Write the percentile distribution in milliseconds using the text
+        format of HdrHistogram, which can be plotted for example with
+        http://hdrhistogram.github.io/HdrHistogram/plotFiles.html.
+        """
+        target_file.write('%12s %14s %10s %14s\n\n' % ('Value', 'Percentile', 'TotalCount', '1/(1-Percentile)'))
+        for value, percentile, total_count in self.percentile_distribution(ticks_per_half_distance):
+            fraction = percentile / 100.0
+            inverted_fraction_text = '%14.2f' % (1 / (1 - fraction)) if fraction < 1.0 else ''
+            target_file.write('%12.3f %2.12f %10d %s\n' % (
+                value / _MICROSECONDS_PER_MILLISECOND, fraction, total_count, inverted_fraction_text))
+        target_file.write('#[Mean    = %12.3f, StdDeviation   = %12.3f]\n' % (
+            self.mean / _MICROSECONDS_PER_MILLISECOND, self.standard_deviation / _MICROSECONDS_PER_MILLISECOND))
+        target_file.write('#[Max     = %12.3f, Total count    = %12d]\n' % (
+            (self.max or 0) / _MICROSECONDS_PER_MILLISECOND, self.total_count))
+
+
+class _Client(threading.Thread):
+    def __init__(self, client_index: int, opinion_miner: OpinionMiner, texts: List[str], rate: Optional[float],
+                 start_time: float, measure_time: float, stop_time: float, significant_digits: int):
+        super().__init__(name='client-%d' % client_index, daemon=True)
+        self._opinion_miner = opinion_miner
+        self._texts = texts
+        self._random_generator = random.Random(SEED + client_index)
+        self._interval = 1.0 / rate if rate is not None else None
+        self._start_time = start_time
+        self._measure_time = measure_time
+        self._stop_time = stop_time
+        self.warm_up_histogram = LatencyHistogram(significant_digits)
+        self.service_time_histogram = LatencyHistogram(significant_digits)
+        self.response_time_histogram = LatencyHistogram(significant_digits)
+        self.error = None
+
+    def run(self):
+        try:
+            self._run_requests()
+        except Exception as error:
+            self.error = error
+
+    def _run_requests(self):
+        intended_start_time = self._start_time
+        expected_interval = None
+        # Service times whose response time cannot be recorded until the expected interval is known.
+        uncorrected_service_times = []
+        while True:
+            now = time.perf_counter()
+            if self._interval is not None and now < intended_start_time:
+                time.sleep(intended_start_time - now)
+            actual_start_time = time.perf_counter()
+            if actual_start_time >= self._stop_time:
+                break
+            for _ in self._opinion_miner.opinions(self._random_generator.choice(self._texts)):
+                pass
+            end_time = time.perf_counter()
+            service_time = _microseconds(end_time - actual_start_time)
+            if actual_start_time < self._measure_time:
+                self.warm_up_histogram.record(service_time)
+            else:
+                self.service_time_histogram.record(service_time)
+                if self._interval is not None:
+                    self.response_time_histogram.record(_microseconds(end_time - intended_start_time))
+                else:
+                    uncorrected_service_times.append(service_time)
+                    if expected_interval is None:
+                        if self.warm_up_histogram.total_count != 0:
+                            expected_interval = self.warm_up_histogram.value_at_percentile(50.0)
+                        elif len(uncorrected_service_times) >= _EXPECTED_INTERVAL_REQUEST_COUNT:
+                            expected_interval = self._median_service_time(uncorrected_service_times)
+                    if expected_interval is not None:
+                        self._record_corrected(uncorrected_service_times, expected_interval)
+            if self._interval is not None:
+                intended_start_time += self._interval
+            else:
+                intended_start_time = end_time
+        if len(uncorrected_service_times) != 0:
+            # The measurement ended before enough requests were measured to know the expected interval.
+            self._record_corrected(
+                uncorrected_service_times, self._median_service_time(uncorrected_service_times))
+
+    def _median_service_time(self, service_times: List[int]) -> int:
+        histogram = LatencyHistogram(self.service_time_histogram.significant_digits)
+        for service_time in service_times:
+            histogram.record(service_time)
+        return histogram.value_at_percentile(50.0)
+
+    def _record_corrected(self, service_times: List[int], expected_interval: int):
+        for service_time in service_times:
+            self.response_time_histogram.record_corrected(service_time, expected_interval)
+        service_times.clear()
+
+
+def _microseconds(seconds: float) -> int:
+    return max(0, int(round(seconds * _MICROSECONDS_PER_SECOND)))
+
+
+def measured_latencies(
+        opinion_miner: OpinionMiner, texts: List[str], client_count: int, duration: float, warm_up: float,
+        rate: float=None, significant_digits: int=3) -> Tuple[LatencyHistogram, LatencyHistogram]:
+    """
+    Histograms of the service time and coordinated omission corrected
+    response time of ``client_count`` concurrent clients each analyzing
+    random ``texts`` for ``warm_up`` plus ``duration`` seconds, and
+    optionally with ``rate`` requests per second and client.
+    """
+    assert client_count >= 1
+    assert duration > 0
+    assert warm_up >= 0
+    assert rate is None or rate > 0
+
+    # Analyze one text in advance so lazily built structures like the lexicon index exist before the
+    # clients start.
+    for _ in opinion_miner.opinions(texts[0]):
+        pass
+    start_time = time.perf_counter()
+    measure_time = start_time + warm_up
+    stop_time = measure_time + duration
+    clients = [
+        _Client(client_index, opinion_miner, texts, rate, start_time, measure_time, stop_time, significant_digits)
+        for client_index in range(client_count)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    service_time_histogram = LatencyHistogram(significant_digits)
+    response_time_histogram = LatencyHistogram(significant_digits)
+    for client in clients:
+        if client.error is not None:
+            raise client.error
+        service_time_histogram.merge(client.service_time_histogram)
+        response_time_histogram.merge(client.response_time_histogram)
+    return service_time_histogram, response_time_histogram
+
+
+def mixed_length_texts(feedback_generator: SyntheticFeedbackGenerator, text_count: int, seed: int=SEED) \
+        -> List[str]:
+    """
+    ``text_count`` texts with a number of sentences distributed according
+    to :py:data:`SENTENCE_COUNT_WEIGHTS`.
+    """
+    random_generator = random.Random(seed)
+    sentence_counts = [sentence_count for sentence_count, _ in SENTENCE_COUNT_WEIGHTS]
+    weights = [weight for _, weight in SENTENCE_COUNT_WEIGHTS]
+    return [
+        feedback_generator.text(random_generator.choices(sentence_counts, weights)[0])
+        for _ in range(text_count)
+    ]
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(item) for item in text.split(',')]
+
+
+def _parsed_args(arguments: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n\n')[0], formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='\n\n'.join(__doc__.strip().split('\n\n')[1:]))
+    parser.add_argument(
+        '--clients', '-c', type=_int_list, default=[1, 2, 4, 8], metavar='NUMBERS',
+        help='comma separated numbers of concurrent clients; default: 1,2,4,8')
+    parser.add_argument(
+        '--duration', '-d', type=float, default=30.0, metavar='SECONDS',
+        help='seconds to measure for each number of clients; default: %(default)s')
+    parser.add_argument(
+        '--hgrm', dest='hgrm_path_prefix', metavar='PREFIX',
+        help='write the percentile distribution of the corrected latencies for N clients '
+             'to PREFIX-N.hgrm')
+    parser.add_argument(
+        '--json', dest='json_path', metavar='JSON', help='JSON file to also write the results to')
+    parser.add_argument(
+        '--language', '-l', default='en', choices=['de', 'en'],
+        help='language of feedback, lexicon and spaCy model; default: %(default)s')
+    parser.add_argument(
+        '--rate', '-r', type=float, metavar='REQUESTS',
+        help='requests per second and client; default: send the next request as soon as the previous one is done')
+    parser.add_argument(
+        '--warm-up', '-w', type=float, default=5.0, metavar='SECONDS',
+        help='seconds before measuring during which latencies are not recorded; default: %(default)s')
+    result = parser.parse_args(arguments)
+    for client_count in result.clients:
+        if client_count < 1:
+            parser.error('--clients must be at least 1 but is: %d' % client_count)
+    if result.duration <= 0:
+        parser.error('--duration must be greater than 0 but is: %s' % result.duration)
+    if result.rate is not None and result.rate <= 0:
+        parser.error('--rate must be greater than 0 but is: %s' % result.rate)
+    if result.warm_up < 0:
+        parser.error('--warm-up must be at least 0 but is: %s' % result.warm_up)
+    return result
+
+
+def _latency_summary(histogram: LatencyHistogram) -> Dict[str, float]:
+    result = {
+        'p%s' % ('%g' % percentile): histogram.value_at_percentile(percentile) / _MICROSECONDS_PER_MILLISECOND
+        for percentile in REPORTED_PERCENTILES
+    }
+    result['max'] = (histogram.max or 0) / _MICROSECONDS_PER_MILLISECOND
+    result['mean'] = histogram.mean / _MICROSECONDS_PER_MILLISECOND
+    result['count'] = histogram.total_count
+    return result
+
+
+def write_table(target_file, results: List[Dict]):
+    percentile_names = ['p%g' % percentile for percentile in REPORTED_PERCENTILES] + ['max']
+    target_file.write('%7s %-8s %8s %s\n' % (
+        'clients', 'latency', 'requests', ' '.join('%9s' % name for name in percentile_names)))
+    for result in results:
+        for latency_name in ('service', 'response'):
+            summary = result[latency_name]
+            target_file.write('%7d %-8s %8d %s\n' % (
+                result['clients'], latency_name, summary['count'],
+                ' '.join('%9.2f' % summary[name] for name in percentile_names)))
+    target_file.write('latencies in milliseconds; response latencies are corrected for coordinated omission\n')
+
+
+def main(arguments: List[str]=None) -> int:
+    args = _parsed_args(arguments)
+    add_token_extension(force=True)
+    nlp = models.language_model(args.language)
+    opinion_miner = OpinionMiner(nlp, restauranteering_lexicon(args.language), language_sentiment_for(args.language))
+    texts = mixed_length_texts(SyntheticFeedbackGenerator(args.language), _TEXT_COUNT)
+    results = []
+    for client_count in args.clients:
+        print('measuring latencies of %d client(s) for %.1f seconds after %.1f seconds warm-up' % (
+            client_count, args.duration, args.warm_up), file=sys.stderr)
+        service_time_histogram, response_time_histogram = measured_latencies(
+            opinion_miner, texts, client_count, args.duration, args.warm_up, args.rate)
+        results.append({
+            'language': args.language,
+            'clients': client_count,
+            'rate': args.rate,
+            'duration': args.duration,
+            'warm_up': args.warm_up,
+            'service': _latency_summary(service_time_histogram),
+            'response': _latency_summary(response_time_histogram),
+        })
+        if args.hgrm_path_prefix is not None:
+            with open('%s-%d.hgrm' % (args.hgrm_path_prefix, client_count), 'w', encoding='utf-8') as hgrm_file:
+                response_time_histogram.write_percentile_distribution(hgrm_file)
+    write_table(sys.stdout, results)
+    if args.json_path is not None:
+        with open(args.json_path, 'w', encoding='utf-8') as json_file:
+            json.dump({'results': results}, json_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Synthetic lexicons, tokens and texts of arbitrary size for benchmarks.
+
+All functions use a random generator with a fixed seed, so the same
+arguments always result in the same data.
+"""
+import csv
+import os
+import random
+import re
+from types import SimpleNamespace
+from typing import List
+
+from shapiro.analysis import Lexicon, LexiconEntry
+from shapiro.common import CSV_ENCODING, Rating, RestaurantTopic
+from shapiro.language import LanguageSentiment
+
+#: Folder with the example lexicons and feedback.
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+
+#: Seed for the random generators, so benchmarks are reproducible.
+SEED = 20181019
+
+#: Share of lexicon entries that are regular expressions.
+REGEX_SHARE = 0.01
+
+_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+_MIN_WORD_LENGTH = 3
+_MAX_WORD_LENGTH = 10
+_WORDS_PER_SENTENCE = 12
+
+#: Index of the column with the feedback text in ``data/*_restauranteering_data.csv``.
+_FEEDBACK_TEXT_COLUMN_INDEX = 3
+
+_SENTENCE_END_REGEX = re.compile(r'(?<=[.!?])\s+')
+_WORD_REGEX = re.compile(r'\w+')
+
+#: Emoticons inserted in synthetic texts, see :py:func:`shapiro.preprocess.unified_emoticons`.
+_EMOTICONS = (':-)', ':)', ':-(', ';-)', ':D')
+
+
+def synthetic_words(count: int, seed: int=SEED) -> List[str]:
+    """
+    ``count`` different random lower case words.
+    """
+    assert count >= 0
+
+    random_generator = random.Random(seed)
+    result = set()
+    while len(result) < count:
+        word_length = random_generator.randint(_MIN_WORD_LENGTH, _MAX_WORD_LENGTH)
+        result.add(''.join(random_generator.choice(_LETTERS) for _ in range(word_length)))
+    return sorted(result)
+
+
+def synthetic_lexicon(size: int, seed: int=SEED) -> Lexicon:
+    """
+    Lexicon with ``size`` entries for :py:func:`synthetic_words` with random
+    topics and ratings, about :py:data:`REGEX_SHARE` of them regular
+    expressions.
+    """
+    random_generator = random.Random(seed)
+    topics = list(RestaurantTopic) + [None]
+    ratings = list(Rating) + [None]
+    regex_interval = max(1, int(1 / REGEX_SHARE))
+    result = Lexicon(RestaurantTopic)
+    for word_index, word in enumerate(synthetic_words(size, seed)):
+        lemma = word[:_MIN_WORD_LENGTH] + '.*' if word_index % regex_interval == regex_interval - 1 else word
+        result.entries.append(
+            LexiconEntry(lemma, random_generator.choice(topics), random_generator.choice(ratings)))
+    return result
+
+
+class SyntheticToken:
+    """
+    Replacement for :py:class:`spacy.tokens.Token` with the attributes
+    shapiro uses, so functions can be benchmarked without spaCy.
+    """
+    def __init__(self, text: str, lemma: str=None):
+        self.text = text
+        self.lemma_ = lemma if lemma is not None else text.lower()
+        self.pos_ = 'X'
+        self.is_stop = False
+        self._ = SimpleNamespace(
+            topic=None, rating=None, is_diminisher=False, is_intensifier=False, is_negation=False,
+            is_modifier_continuation=False)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def synthetic_tokens(words: List[str], count: int, seed: int=SEED) -> List[SyntheticToken]:
+    """
+    ``count`` tokens for random ``words``, some of them capitalized.
+    """
+    random_generator = random.Random(seed)
+    result = []
+    for _ in range(count):
+        word = random_generator.choice(words)
+        text = word.capitalize() if random_generator.random() < 0.1 else word
+        result.append(SyntheticToken(text, word))
+    return result
+
+
+def synthetic_text(words: List[str], token_count: int, language_sentiment: LanguageSentiment=None,
+                   seed: int=SEED) -> str:
+    """
+    Text with about ``token_count`` tokens of random ``words`` in sentences
+    of about 12 tokens. If ``language_sentiment`` is specified, some
+    sentences contain one of its idioms. Some sentences end in an emoticon.
+    """
+    random_generator = random.Random(seed)
+    idioms = sorted(language_sentiment.idioms.keys()) if language_sentiment is not None else []
+    sentences = []
+    remaining_token_count = token_count
+    while remaining_token_count > 0:
+        sentence_length = min(remaining_token_count, _WORDS_PER_SENTENCE)
+        sentence_words = [random_generator.choice(words) for _ in range(sentence_length)]
+        if idioms and random_generator.random() < 0.2:
+            sentence_words[random_generator.randrange(sentence_length)] = random_generator.choice(idioms)
+        sentence = ' '.join(sentence_words).capitalize() + '.'
+        if random_generator.random() < 0.1:
+            sentence += ' ' + random_generator.choice(_EMOTICONS)
+        sentences.append(sentence)
+        remaining_token_count -= sentence_length
+    return ' '.join(sentences)
+
+
+def restauranteering_lexicon_path(language_code: str) -> str:
+    return os.path.join(DATA_FOLDER, '%s_restauranteering.csv' % language_code)
+
+
+def restauranteering_lexicon(language_code: str) -> Lexicon:
+    """
+    The example lexicon for restaurant feedback in ``language_code``.
+    """
+    result = Lexicon(RestaurantTopic)
+    result.read_from_csv(restauranteering_lexicon_path(language_code), encoding=CSV_ENCODING)
+    return result
+
+
+def padded_lexicon(lexicon: Lexicon, size: int, seed: int=SEED) -> Lexicon:
+    """
+    Lexicon with the entries of ``lexicon`` followed by synthetic entries so
+    it has at least ``size`` entries.
+    """
+    result = Lexicon(RestaurantTopic)
+    result.entries.extend(lexicon.entries)
+    padding_size = size - len(lexicon.entries)
+    if padding_size > 0:
+        result.entries.extend(synthetic_lexicon(padding_size, seed).entries)
+    return result
+
+
+def restauranteering_sentences(language_code: str) -> List[str]:
+    """
+    Sentences of the example feedback in ``language_code``.
+    """
+    result = []
+    feedback_path = os.path.join(DATA_FOLDER, '%s_restauranteering_data.csv' % language_code)
+    with open(feedback_path, encoding=CSV_ENCODING, newline='') as feedback_file:
+        for row in csv.reader(feedback_file, delimiter=',', quotechar='"'):
+            if len(row) > _FEEDBACK_TEXT_COLUMN_INDEX and not row[0].startswith('#'):
+                feedback_text = row[_FEEDBACK_TEXT_COLUMN_INDEX].strip()
+                result.extend(sentence for sentence in _SENTENCE_END_REGEX.split(feedback_text) if sentence != '')
+    return result
+
+
+class SyntheticFeedbackGenerator:
+    """
+    Generator for realistic restaurant feedback in ``language_code`` based on
+    the example feedback and lexicon in the folder ``data``.
+
+    Each sentence is a sentence of the example feedback where words that
+    are in the lexicon are replaced by random lexicon words with the same
+    kind of meaning, for example a word about food with a positive rating by
+    another one. This keeps the grammar intact so the sentences can be
+    parsed like real ones while still resulting in many different texts.
+    """
+    def __init__(self, language_code: str, seed: int=SEED):
+        self._random_generator = random.Random(seed)
+        self._sentences = restauranteering_sentences(language_code)
+        self._kind_to_words_map = {}
+        self._word_to_kind_map = {}
+        for lexicon_entry in restauranteering_lexicon(language_code).entries:
+            if not lexicon_entry.is_regex:
+                kind = (lexicon_entry.topic, lexicon_entry.rating)
+                self._kind_to_words_map.setdefault(kind, []).append(lexicon_entry.lemma)
+                self._word_to_kind_map[lexicon_entry.lemma.lower()] = kind
+        assert len(self._sentences) >= 1
+
+    def sentence(self) -> str:
+        return _WORD_REGEX.sub(self._replaced_word, self._random_generator.choice(self._sentences))
+
+    def _replaced_word(self, word_match) -> str:
+        word = word_match.group(0)
+        kind = self._word_to_kind_map.get(word.lower())
+        if kind is None:
+            result = word
+        else:
+            result = self._random_generator.choice(self._kind_to_words_map[kind])
+            if word[0].isupper():
+                result = result[0].upper() + result[1:]
+        return result
+
+    def text(self, sentence_count: int) -> str:
+        """
+        Feedback text with ``sentence_count`` sentences.
+        """
+        assert sentence_count >= 1
+        return ' '.join(self.sentence() for _ in range(sentence_count))
+
+    def texts(self, text_count: int, sentence_count: int) -> List[str]:
+        """
+        ``text_count`` feedback texts, each with ``sentence_count`` sentences.
+        """
+        return [self.text(sentence_count) for _ in range(text_count)]
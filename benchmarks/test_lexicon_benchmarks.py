@@ -0,0 +1,41 @@
+"""
+Benchmarks for matching tokens with lexicon entries.
+"""
+import pytest
+from shapiro.analysis import LexiconEntry
+from shapiro.common import Rating, RestaurantTopic
+
+from conftest import LEXICON_SIZES, cached_synthetic_lexicon
+from synthetic import SyntheticToken, synthetic_tokens
+
+#: Number of tokens to look up in each round.
+_LOOKUP_TOKEN_COUNT = 1000
+
+
+@pytest.mark.parametrize('lemma', ['tasty', 'tast.*'])
+def test_lexicon_entry_matching(benchmark, lemma):
+    lexicon_entry = LexiconEntry(lemma, RestaurantTopic.FOOD, Rating.GOOD)
+    tokens = [SyntheticToken(text, 'tasty') for text in ('tasty', 'Tasty', 'tastier', 'hugo')]
+
+    def match_all_tokens():
+        for token in tokens:
+            lexicon_entry.matching(token)
+
+    benchmark(match_all_tokens)
+
+
+@pytest.mark.parametrize('lexicon_size', LEXICON_SIZES)
+def test_lexicon_entry_for(benchmark, lexicon_size):
+    lexicon = cached_synthetic_lexicon(lexicon_size)
+    # Half of the tokens are lemmas of the lexicon, the other half are unknown.
+    lexicon_words = [lexicon_entry.lemma for lexicon_entry in lexicon.entries if not lexicon_entry.is_regex]
+    unknown_words = ['unknown%d' % word_index for word_index in range(len(lexicon_words))]
+    tokens = synthetic_tokens(lexicon_words + unknown_words, _LOOKUP_TOKEN_COUNT)
+    # Build the index in advance so only the lookup is measured.
+    lexicon.lexicon_entry_for(tokens[0])
+
+    def look_up_all_tokens():
+        for token in tokens:
+            lexicon.lexicon_entry_for(token)
+
+    benchmark(look_up_all_tokens)
@@ -0,0 +1,63 @@
+"""
+Benchmarks for finding opinions in documents.
+"""
+import pytest
+from shapiro.analysis import OpinionMiner
+from shapiro.common import Rating, RestaurantTopic
+
+from conftest import TOKEN_COUNTS, cached_synthetic_lexicon
+from synthetic import SyntheticToken, synthetic_text
+
+#: Numbers of modifiers in front of a rating.
+_MODIFIER_COUNTS = (1, 10, 1000)
+
+#: Size of the lexicon used to find opinions in parsed documents.
+_OPINION_LEXICON_SIZE = 1000
+
+
+def _essential_tokens(modifier_count: int):
+    result = []
+    topic_token = SyntheticToken('waiter')
+    topic_token._.topic = RestaurantTopic.SERVICE
+    result.append(topic_token)
+    for modifier_index in range(modifier_count):
+        if modifier_index % 2 == 0:
+            modifier_token = SyntheticToken('very')
+            modifier_token._.is_intensifier = True
+        else:
+            modifier_token = SyntheticToken('not')
+            modifier_token._.is_negation = True
+        result.append(modifier_token)
+    rating_token = SyntheticToken('good')
+    result.append(rating_token)
+    return result
+
+
+@pytest.mark.parametrize('modifier_count', _MODIFIER_COUNTS)
+def test_combine_ratings(benchmark, english_sentiment, modifier_count):
+    # Bypass __init__ so the benchmark does not need a language model.
+    opinion_miner = OpinionMiner.__new__(OpinionMiner)
+    opinion_miner.language_sentiment = english_sentiment
+    essential_tokens = _essential_tokens(modifier_count)
+    rating_token = essential_tokens[-1]
+
+    def fresh_essential_tokens():
+        # NOTE: _combine_ratings() removes modifiers and changes the rating, so each round needs fresh tokens.
+        rating_token._.rating = Rating.GOOD
+        return (list(essential_tokens),), {}
+
+    benchmark.pedantic(opinion_miner._combine_ratings, setup=fresh_essential_tokens, rounds=100)
+
+
+@pytest.mark.parametrize('token_count', TOKEN_COUNTS)
+def test_opinions_of_document(benchmark, nlp_en, english_sentiment, vocabulary, token_count):
+    lexicon = cached_synthetic_lexicon(_OPINION_LEXICON_SIZE)
+    opinion_miner = OpinionMiner(nlp_en, lexicon, english_sentiment)
+    lexicon_words = [lexicon_entry.lemma for lexicon_entry in lexicon.entries if not lexicon_entry.is_regex]
+    document = opinion_miner.parsed(synthetic_text(vocabulary[:100] + lexicon_words, token_count))
+
+    def consume_opinions():
+        for _ in opinion_miner.opinions_of_document(document):
+            pass
+
+    benchmark(consume_opinions)
@@ -0,0 +1,22 @@
+"""
+Benchmarks for preprocessing texts before they are parsed.
+"""
+import pytest
+from shapiro.preprocess import compiled_idiom_to_localized_rating_text_map, replaced_idioms, unified_emoticons
+
+from conftest import TOKEN_COUNTS
+from synthetic import synthetic_text
+
+
+@pytest.mark.parametrize('token_count', TOKEN_COUNTS)
+def test_replaced_idioms(benchmark, english_sentiment, vocabulary, token_count):
+    idiom_to_localized_rating_text_map = compiled_idiom_to_localized_rating_text_map(
+        english_sentiment.idioms, english_sentiment.rating_to_localized_text_map)
+    text = synthetic_text(vocabulary, token_count, english_sentiment)
+    benchmark(replaced_idioms, text, idiom_to_localized_rating_text_map)
+
+
+@pytest.mark.parametrize('token_count', TOKEN_COUNTS)
+def test_unified_emoticons(benchmark, vocabulary, token_count):
+    text = synthetic_text(vocabulary, token_count)
+    benchmark(unified_emoticons, text)
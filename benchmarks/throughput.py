@@ -0,0 +1,251 @@
+"""
+Measure how many documents and sentences per second the opinion miner
+analyzes depending on the document length, lexicon size, spaCy pipeline
+and number of worker processes.
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from shapiro import models
+from shapiro.analysis import OpinionMiner, add_token_extension
+from shapiro.language import language_sentiment_for
+
+from synthetic import SyntheticFeedbackGenerator, padded_lexicon, restauranteering_lexicon
+
+#: Names of pipeline configurations and the pipes they disable.
+PIPELINE_TO_DISABLED_PIPES_MAP = {
+    'full': (),
+    'no-ner': ('ner',),
+}
+
+#: Number of chunks each worker process analyzes, so fast workers do not have to wait for slow ones.
+_CHUNKS_PER_JOB = 4
+
+#: Opinion miner used by worker processes, see :py:func:`_worker_sentence_and_token_count`.
+_worker_opinion_miner: OpinionMiner = None
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(item) for item in text.split(',')]
+
+
+def _parsed_args(arguments: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        '--documents', '-d', type=int, default=1000, metavar='NUMBER',
+        help='number of documents to analyze for each scenario; default: %(default)s')
+    parser.add_argument(
+        '--jobs', '-j', type=_int_list, default=[1, 2, 4], metavar='NUMBERS',
+        help='comma separated numbers of worker processes; default: 1,2,4')
+    parser.add_argument(
+        '--json', dest='json_path', metavar='JSON', help='JSON file to also write the results to')
+    parser.add_argument(
+        '--language', '-l', default='en', choices=['de', 'en'],
+        help='language of feedback, lexicon and spaCy model; default: %(default)s')
+    parser.add_argument(
+        '--lexicon-sizes', '-x', type=_int_list, default=[0, 10000, 1000000], metavar='NUMBERS',
+        help='comma separated sizes the example lexicon is padded to with synthetic entries, '
+             '0=example lexicon only; default: 0,10000,1000000')
+    parser.add_argument(
+        '--pipelines', '-p', default='full,no-ner', metavar='NAMES',
+        help='comma separated spaCy pipeline configurations, available: %s; default: %%(default)s'
+             % ', '.join(PIPELINE_TO_DISABLED_PIPES_MAP.keys()))
+    parser.add_argument(
+        '--sentences', '-s', type=_int_list, default=[1, 5, 20], metavar='NUMBERS',
+        help='comma separated numbers of sentences per document; default: 1,5,20')
+    result = parser.parse_args(arguments)
+    if result.documents < 1:
+        parser.error('--documents must be at least 1 but is: %d' % result.documents)
+    for jobs in result.jobs:
+        if jobs < 1:
+            parser.error('--jobs must be at least 1 but is: %d' % jobs)
+    result.pipelines = [pipeline.strip() for pipeline in result.pipelines.split(',')]
+    for pipeline in result.pipelines:
+        if pipeline not in PIPELINE_TO_DISABLED_PIPES_MAP:
+            parser.error('--pipelines must be one of %s but is: %s' % (
+                ', '.join(PIPELINE_TO_DISABLED_PIPES_MAP.keys()), pipeline))
+    return result
+
+
+def sentence_and_token_count(opinion_miner: OpinionMiner, texts: Sequence[str]) -> Tuple[int, int]:
+    """
+    Number of sentences and tokens after finding the opinions in ``texts``
+    the same way ``shapiro analyze`` does.
+    """
+    sentence_count = 0
+    token_count = 0
+    for text in texts:
+        document = opinion_miner.parsed(text)
+        token_count += len(document)
+        for _ in opinion_miner.opinions_of_document(document):
+            sentence_count += 1
+    return sentence_count, token_count
+
+
+def _worker_sentence_and_token_count(texts: List[str]) -> Tuple[int, int]:
+    return sentence_and_token_count(_worker_opinion_miner, texts)
+
+
+def _peak_rss_in_mib() -> float:
+    # NOTE: ru_maxrss is in KiB on Linux but in bytes on macOS.
+    bytes_per_unit = 1 if sys.platform == 'darwin' else 1024
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak_rss * bytes_per_unit / (1024 * 1024)
+
+
+def _measured_scenario(opinion_miner: OpinionMiner, texts: List[str], jobs: int) -> Dict[str, float]:
+    global _worker_opinion_miner
+
+    start_time = time.perf_counter()
+    if jobs == 1:
+        sentence_count, token_count = sentence_and_token_count(opinion_miner, texts)
+    else:
+        sentence_count = 0
+        token_count = 0
+        chunk_size = max(1, math.ceil(len(texts) / (jobs * _CHUNKS_PER_JOB)))
+        chunks = [texts[chunk_start:chunk_start + chunk_size] for chunk_start in range(0, len(texts), chunk_size)]
+        # NOTE: The miner must be set before the workers are forked so they can inherit it.
+        _worker_opinion_miner = opinion_miner
+        try:
+            with models.prepared_fork(), multiprocessing.get_context('fork').Pool(jobs) as pool:
+                for chunk_sentence_count, chunk_token_count in pool.imap_unordered(
+                        _worker_sentence_and_token_count, chunks):
+                    sentence_count += chunk_sentence_count
+                    token_count += chunk_token_count
+        finally:
+            _worker_opinion_miner = None
+    duration = time.perf_counter() - start_time
+    return {
+        'sentences': sentence_count,
+        'tokens': token_count,
+        'seconds': duration,
+        'documents_per_second': len(texts) / duration,
+        'sentences_per_second': sentence_count / duration,
+        'tokens_per_second': token_count / duration,
+        'peak_rss_mib': _peak_rss_in_mib(),
+    }
+
+
+def _scenario_process(connection, opinion_miner: OpinionMiner, texts: List[str], jobs: int):
+    connection.send(_measured_scenario(opinion_miner, texts, jobs))
+    connection.close()
+
+
+def measured_scenario(opinion_miner: OpinionMiner, texts: List[str], jobs: int) -> Dict[str, float]:
+    """
+    Throughput and peak memory when analyzing ``texts`` with ``jobs``
+    worker processes. The scenario runs in a process of its own, so the
+    peak memory only includes this scenario.
+    """
+    parent_connection, child_connection = multiprocessing.Pipe(duplex=False)
+    scenario_process = multiprocessing.get_context('fork').Process(
+        target=_scenario_process, args=(child_connection, opinion_miner, texts, jobs))
+    scenario_process.start()
+    child_connection.close()
+    try:
+        result = parent_connection.recv()
+    except EOFError:
+        raise RuntimeError('scenario process must send results but exited with %s' % scenario_process.exitcode)
+    finally:
+        scenario_process.join()
+    return result
+
+
+def with_scaling_efficiency(results: List[Dict]) -> List[Dict]:
+    """
+    Add ``scaling_efficiency`` to ``results``: the throughput with N jobs
+    divided by N times the throughput of the same scenario with 1 job.
+    """
+    def scenario_key(result: Dict):
+        return result['pipeline'], result['lexicon_size'], result['sentences_per_document']
+
+    key_to_single_job_throughput_map = {
+        scenario_key(result): result['documents_per_second']
+        for result in results
+        if result['jobs'] == 1
+    }
+    for result in results:
+        single_job_throughput = key_to_single_job_throughput_map.get(scenario_key(result))
+        result['scaling_efficiency'] = (
+            result['documents_per_second'] / (result['jobs'] * single_job_throughput)
+            if single_job_throughput else None
+        )
+    return results
+
+
+_TABLE_COLUMNS = (
+    ('pipeline', '%-8s', '%-8s'),
+    ('lexicon_size', '%9s', '%9d'),
+    ('sentences_per_document', '%9s', '%9d'),
+    ('jobs', '%4s', '%4d'),
+    ('documents_per_second', '%10s', '%10.1f'),
+    ('sentences_per_second', '%10s', '%10.1f'),
+    ('tokens_per_second', '%10s', '%10.1f'),
+    ('scaling_efficiency', '%10s', '%10.2f'),
+    ('peak_rss_mib', '%9s', '%9.1f'),
+)
+
+_TABLE_HEADINGS = ('pipeline', 'lexicon', 'sent/doc', 'jobs', 'docs/s', 'sent/s', 'tokens/s', 'efficiency', 'RSS MiB')
+
+
+def write_table(target_file, results: List[Dict]):
+    target_file.write(' '.join(
+        heading_format % heading for (_, heading_format, _), heading in zip(_TABLE_COLUMNS, _TABLE_HEADINGS)
+    ) + '\n')
+    for result in results:
+        target_file.write(' '.join(
+            (value_format % result[name]) if result[name] is not None else (heading_format % '-')
+            for name, heading_format, value_format in _TABLE_COLUMNS
+        ) + '\n')
+
+
+def main(arguments: List[str]=None) -> int:
+    args = _parsed_args(arguments)
+    add_token_extension(force=True)
+    language_sentiment = language_sentiment_for(args.language)
+    example_lexicon = restauranteering_lexicon(args.language)
+    feedback_generator = SyntheticFeedbackGenerator(args.language)
+    sentence_count_to_texts_map = {
+        sentence_count: feedback_generator.texts(args.documents, sentence_count)
+        for sentence_count in args.sentences
+    }
+    results = []
+    for pipeline, lexicon_size in itertools.product(args.pipelines, args.lexicon_sizes):
+        # Load the model in advance so it does not count towards the throughput.
+        nlp = models.language_model(args.language, PIPELINE_TO_DISABLED_PIPES_MAP[pipeline])
+        lexicon = padded_lexicon(example_lexicon, lexicon_size)
+        opinion_miner = OpinionMiner(nlp, lexicon, language_sentiment)
+        for sentence_count, jobs in itertools.product(args.sentences, args.jobs):
+            print('analyzing %d documents: pipeline=%s, lexicon_size=%d, sentences=%d, jobs=%d' % (
+                args.documents, pipeline, len(lexicon.entries), sentence_count, jobs), file=sys.stderr)
+            result = {
+                'language': args.language,
+                'pipeline': pipeline,
+                'lexicon_size': len(lexicon.entries),
+                'sentences_per_document': sentence_count,
+                'jobs': jobs,
+                'documents': args.documents,
+                'cpu_count': os.cpu_count(),
+            }
+            result.update(measured_scenario(opinion_miner, sentence_count_to_texts_map[sentence_count], jobs))
+            results.append(result)
+    with_scaling_efficiency(results)
+    write_table(sys.stdout, results)
+    if args.json_path is not None:
+        with open(args.json_path, 'w', encoding='utf-8') as json_file:
+            json.dump({'results': results}, json_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,6 +16,7 @@ from setuptools import setup
 entry_points = """
 [console_scripts]
 shapiro = shapiro.commandline:main
+shalex = shapiro.shalex:main
 """
 
 
@@ -2,11 +2,17 @@
 """
 Shapiro - lexicon based sentence oriented sentiment analysis.
 """
-from pkg_resources import get_distribution, DistributionNotFound
+# NOTE: Use importlib.metadata instead of pkg_resources because importing the
+# latter takes a long time, which slows down the start of the command line tools.
+try:
+    from importlib.metadata import PackageNotFoundError, version
+except ImportError:  # pragma: no cover
+    # Python 3.6 and 3.7
+    from importlib_metadata import PackageNotFoundError, version
 
 try:
     # Change here if project is renamed and does not equal the package name
     dist_name = __name__
-    __version__ = get_distribution(dist_name).version
-except DistributionNotFound:
+    __version__ = version(dist_name)
+except PackageNotFoundError:
     __version__ = 'unknown'
@@ -0,0 +1,284 @@
+"""
+Streaming aggregation of opinions to rating distributions by keys, topic and
+time window.
+
+Instead of storing each opinion and aggregating later, an
+:py:class:`OpinionAggregator` keeps only a counter for each rating and
+group, so its memory consumption depends on the number of groups but not on
+the number of opinions. Aggregators from parallel workers can be merged.
+"""
+import csv
+import datetime
+import json
+import re
+from enum import Enum
+from typing import Any, Dict, Generator, List, Optional, Sequence, TextIO, Tuple
+
+from shapiro.common import CSV_ENCODING, Rating
+from shapiro.output import (STDOUT_PATH, OpinionWriter, OutputFormat,
+                            enum_text, opened_text_target)
+
+#: Regular expression for time stamps in ISO 8601 format, for example "2018-07-28T08:23:48Z".
+_TIMESTAMP_REGEX = re.compile(
+    r'^(?P<date>\d{4}-\d{2}-\d{2})'
+    r'([T ](?P<time>\d{2}:\d{2}(:\d{2})?)(\.\d+)?)?'
+    r'(?P<zone>Z|[+-]\d{2}:?\d{2})?$')
+
+#: Names of the fields of an aggregate following the keys, window and topic.
+AGGREGATE_FIELD_NAMES = ('opinion_count', 'rated_count', 'coverage', 'mean_rating')
+
+
+class TimeWindow(Enum):
+    HOUR = 'hour'
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+
+
+#: Names of valid time windows (to be used for command line options and error messages).
+TIME_WINDOW_NAMES = [time_window.value for time_window in TimeWindow]
+
+
+def parsed_timestamp(text: str) -> datetime.datetime:
+    """
+    Time stamp in ISO 8601 format, for example "2018-07-28T08:23:48Z",
+    "2018-07-28T10:23:48+02:00" or "2018-07-28". If ``text`` has a time
+    zone, the result is converted to UTC, so time stamps with different
+    offsets that refer to the same instant are equal. Otherwise the result
+    is a naive time stamp without time zone.
+    """
+    assert text is not None
+
+    match = _TIMESTAMP_REGEX.match(text.strip())
+    if match is None:
+        raise ValueError('time stamp must match YYYY-MM-DD[Thh:mm[:ss]][zone] but is: %r' % text)
+    date_and_time_text = match.group('date') + 'T' + (match.group('time') or '00:00')
+    if date_and_time_text.count(':') == 1:
+        date_and_time_text += ':00'
+    result = datetime.datetime.strptime(date_and_time_text, '%Y-%m-%dT%H:%M:%S')
+    zone_text = match.group('zone')
+    if zone_text is not None:
+        # NOTE: With Python 3.6 "%z" does not accept offsets like "+02:00", so the offset is parsed manually.
+        if zone_text == 'Z':
+            offset = datetime.timedelta(0)
+        else:
+            offset_digits = zone_text[1:].replace(':', '')
+            offset = datetime.timedelta(hours=int(offset_digits[:2]), minutes=int(offset_digits[2:]))
+            if zone_text[0] == '-':
+                offset = -offset
+        result = result.replace(tzinfo=datetime.timezone(offset)).astimezone(datetime.timezone.utc)
+    return result
+
+
+def window_start(timestamp: datetime.datetime, time_window: TimeWindow) -> str:
+    """
+    ISO 8601 text for the start of the tumbling ``time_window`` that
+    contains ``timestamp``. Weeks start on Monday.
+    """
+    assert timestamp is not None
+    assert time_window is not None
+
+    if time_window == TimeWindow.HOUR:
+        result = timestamp.strftime('%Y-%m-%dT%H:00')
+    else:
+        date = timestamp.date()
+        if time_window == TimeWindow.WEEK:
+            date -= datetime.timedelta(days=date.weekday())
+        elif time_window == TimeWindow.MONTH:
+            date = date.replace(day=1)
+        else:
+            assert time_window == TimeWindow.DAY, 'time_window=%r' % time_window
+        result = date.isoformat()
+    return result
+
+
+class OpinionAggregator:
+    """
+    Incremental counters for the ratings of opinions grouped by ``keys``,
+    topic and optionally a tumbling time window.
+
+    If ``time_key_name`` is specified, it must be one of ``key_names`` and
+    the respective key must be a time stamp as understood by
+    :py:func:`parsed_timestamp`. In the aggregates the time stamp is replaced
+    by the start of its ``time_window``. Time stamps with a time zone are
+    converted to UTC, so their windows start at UTC. Because naive time
+    stamps cannot be related to those, either all time stamps must have a
+    time zone or none of them.
+    """
+    def __init__(self, key_names: Sequence[str]=(), time_key_name: str=None,
+                 time_window: TimeWindow=TimeWindow.DAY, rating_type: Enum=Rating):
+        assert key_names is not None
+        assert time_key_name is None or time_key_name in key_names, \
+            'time_key_name=%r must be one of key_names=%r' % (time_key_name, key_names)
+        assert time_window is not None
+        assert rating_type is not None
+
+        self.key_names = list(key_names)
+        self.time_key_name = time_key_name
+        self.time_window = time_window
+        self.ratings = list(rating_type)
+        self._time_key_index = key_names.index(time_key_name) if time_key_name is not None else None
+        self._rating_to_index_map = {rating: rating_index for rating_index, rating in enumerate(self.ratings)}
+        # Index of the counter for opinions without rating.
+        self._unrated_index = len(self.ratings)
+        self._group_to_counts_map: Dict[Tuple[Tuple[str, ...], Enum], List[int]] = {}
+        # Whether the time stamps have a time zone or None until the first time stamp has been added.
+        self._has_time_zone: Optional[bool] = None
+
+    @property
+    def group_count(self) -> int:
+        return len(self._group_to_counts_map)
+
+    def add(self, topic: Enum, rating: Enum, keys: Sequence[str]=()):
+        """
+        Count an opinion on ``topic`` with ``rating``.
+        """
+        assert len(keys) == len(self.key_names), \
+            'keys=%r must match key_names=%r' % (keys, self.key_names)
+
+        if self._time_key_index is not None:
+            keys = list(keys)
+            timestamp_text = keys[self._time_key_index]
+            timestamp = parsed_timestamp(timestamp_text)
+            self._check_has_time_zone(timestamp.tzinfo is not None, 'the time stamp is %r' % timestamp_text)
+            keys[self._time_key_index] = window_start(timestamp, self.time_window)
+        group = (tuple(keys), topic)
+        counts = self._group_to_counts_map.get(group)
+        if counts is None:
+            counts = [0] * (self._unrated_index + 1)
+            self._group_to_counts_map[group] = counts
+        counts[self._rating_to_index_map[rating] if rating is not None else self._unrated_index] += 1
+
+    def _check_has_time_zone(self, has_time_zone: bool, timestamp_description: str):
+        if self._has_time_zone is None:
+            self._has_time_zone = has_time_zone
+        elif has_time_zone != self._has_time_zone:
+            raise ValueError('time stamps must either all have a time zone or none of them but %s %s' % (
+                timestamp_description, 'with time zone' if has_time_zone else 'without time zone'))
+
+    def merge(self, other: 'OpinionAggregator'):
+        """
+        Add the counts of ``other``, for example the partial aggregates of a
+        parallel worker.
+        """
+        assert other is not None
+        if (self.key_names, self.time_key_name, self.time_window, self.ratings) \
+                != (other.key_names, other.time_key_name, other.time_window, other.ratings):
+            raise ValueError('aggregator to merge must have the same keys, time window and ratings')
+        if other._has_time_zone is not None:
+            self._check_has_time_zone(other._has_time_zone, 'the aggregator to merge has time stamps')
+
+        for group, other_counts in other._group_to_counts_map.items():
+            counts = self._group_to_counts_map.get(group)
+            if counts is None:
+                self._group_to_counts_map[group] = list(other_counts)
+            else:
+                for count_index, other_count in enumerate(other_counts):
+                    counts[count_index] += other_count
+
+    def field_names(self) -> List[str]:
+        """
+        Names of the fields of each aggregate provided by :py:meth:`aggregates`.
+        """
+        return self.key_names + ['topic'] + list(AGGREGATE_FIELD_NAMES) + [
+            'count_' + enum_text(rating) for rating in self.ratings
+        ]
+
+    def aggregates(self) -> Generator[Dict[str, Any], None, None]:
+        """
+        Aggregates for each group ordered by keys and topic with the
+        :py:meth:`field_names` as keys. ``coverage`` is the share of opinions
+        with a rating, and ``mean_rating`` is ``None`` if no opinion in the
+        group has a rating.
+        """
+        def group_sort_key(group):
+            keys, topic = group
+            return keys, enum_text(topic)
+
+        for group in sorted(self._group_to_counts_map.keys(), key=group_sort_key):
+            keys, topic = group
+            counts = self._group_to_counts_map[group]
+            rated_count = sum(counts[:self._unrated_index])
+            opinion_count = rated_count + counts[self._unrated_index]
+            rating_sum = sum(rating.value * counts[rating_index] for rating_index, rating in enumerate(self.ratings))
+            result = dict(zip(self.key_names, keys))
+            result['topic'] = enum_text(topic) or None
+            result['opinion_count'] = opinion_count
+            result['rated_count'] = rated_count
+            result['coverage'] = rated_count / opinion_count
+            result['mean_rating'] = rating_sum / rated_count if rated_count != 0 else None
+            for rating_index, rating in enumerate(self.ratings):
+                result['count_' + enum_text(rating)] = counts[rating_index]
+            yield result
+
+
+class AggregatingOpinionWriter(OpinionWriter):
+    """
+    Writer that passes opinions to an :py:class:`OpinionAggregator` and
+    writes only the aggregates as CSV or JSON Lines once it is closed.
+    """
+    def __init__(self, output_path: str=STDOUT_PATH, output_format: OutputFormat=OutputFormat.CSV,
+                 key_names: Sequence[str]=(), time_key_name: str=None,
+                 time_window: TimeWindow=TimeWindow.DAY, encoding: str=CSV_ENCODING):
+        assert output_path is not None
+        if output_format not in (OutputFormat.CSV, OutputFormat.JSON_LINES):
+            raise ValueError('output format for aggregates must be csv or jsonl but is: %s' % output_format.value)
+
+        super().__init__(key_names)
+        self.aggregator = OpinionAggregator(key_names, time_key_name, time_window)
+        self._output_path = output_path
+        self._output_format = output_format
+        self._encoding = encoding
+        self._is_closed = False
+
+    def _write_opinion(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str],
+                       document_index: int, start: int, end: int):
+        self.aggregator.add(topic, rating, keys)
+
+    def close(self):
+        if not self._is_closed:
+            self._is_closed = True
+            target_file, owns_target_file = opened_text_target(self._output_path, self._encoding)
+            try:
+                if self._output_format == OutputFormat.CSV:
+                    write_csv_aggregates(target_file, self.aggregator)
+                else:
+                    write_json_lines_aggregates(target_file, self.aggregator)
+                target_file.flush()
+            finally:
+                if owns_target_file:
+                    target_file.close()
+
+
+def write_csv_aggregates(target_file: TextIO, aggregator: OpinionAggregator):
+    """
+    Write the aggregates of ``aggregator`` as CSV with an initial comment
+    line describing the fields.
+    """
+    csv_writer = csv.writer(target_file, delimiter=',', quotechar='"', lineterminator='\n')
+    header_row = aggregator.field_names()
+    header_row[0] = '# ' + header_row[0]
+    csv_writer.writerow(header_row)
+    for aggregate in aggregator.aggregates():
+        csv_writer.writerow([
+            _csv_text(aggregate[field_name]) for field_name in aggregator.field_names()
+        ])
+
+
+def _csv_text(value) -> str:
+    if value is None:
+        result = ''
+    elif isinstance(value, float):
+        result = '%.4f' % value
+    else:
+        result = str(value)
+    return result
+
+
+def write_json_lines_aggregates(target_file: TextIO, aggregator: OpinionAggregator):
+    """
+    Write the aggregates of ``aggregator`` as JSON Lines.
+    """
+    for aggregate in aggregator.aggregates():
+        target_file.write(json.dumps(aggregate, ensure_ascii=False))
+        target_file.write('\n')
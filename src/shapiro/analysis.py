@@ -1,40 +1,84 @@
 """
 Types and functions for sentiment analysis.
 """
+import bisect
 import csv
+import heapq
+import multiprocessing
+import os
 import re
+import sys
+import threading
+from collections import Counter
 from enum import Enum
-from typing import Dict, Generator, List, Pattern, Sequence, Tuple, Union
+from typing import (Any, Callable, Dict, Generator, Iterable, List, Optional, Pattern, Sequence,
+                    Tuple, Union)
 
-import spacy
-from shapiro import tools
+import numpy as np
+from shapiro import models, profiling, tools
 from shapiro.common import Rating, debugged_token, negated_rating
-from shapiro.language import LanguageSentiment
-from shapiro.preprocess import (compiled_idiom_to_localized_rating_text_map,
-                                create_emoticon_to_name_and_rating_map,
+from shapiro.countstate import LemmaCountState, most_common_counts
+from shapiro.language import DIMINISHER, INTENSIFIER, NEGATION, LanguageSentiment, WordTrie, lower_words
+from shapiro.preprocess import (create_emoticon_to_name_and_rating_map,
                                 replaced_idioms)
+from shapiro.profiling import TimingStats
+from shapiro.sketch import SpaceSavingCounter
+from spacy.attrs import IS_STOP, LEMMA, POS
 from spacy.language import Language
-from spacy.tokens import Token
+from spacy.tokens import Doc, Span, Token
 
 _log = tools.log
 
 
+#: Number of texts spaCy processes at once.
+DEFAULT_BATCH_SIZE = 1000
+
+#: Number of texts each parallel worker counts before passing its result to the main process.
+DEFAULT_CHUNK_SIZE = 10000
+
+#: Number of chunks per parallel worker that are read from the input before the worker has counted them. This
+#: keeps the workers busy while preventing the whole input from being read into memory.
+_MAX_PENDING_CHUNKS_PER_JOB = 2
+
+#: Idiom matching that replaces idioms in the text by the localized text of their rating before parsing it.
+IDIOM_MATCHING_TEXT = 'text'
+
+#: Idiom matching that assigns the rating of idioms to the matching tokens of the parsed document, which keeps the
+#: text unchanged.
+IDIOM_MATCHING_TOKENS = 'tokens'
+
+#: Available ways to match idioms, see :py:class:`OpinionMiner`.
+IDIOM_MATCHINGS = (IDIOM_MATCHING_TEXT, IDIOM_MATCHING_TOKENS)
+
+
 def most_common_lemmas(
-        nlp: Language, text: Union[str, Sequence[str]],
-        number: int=20, count_stopwords: bool=False, use_pos: bool=False) \
+        nlp: Language, text: Union[str, Iterable[str]],
+        number: int=20, count_stopwords: bool=False, use_pos: bool=False,
+        jobs: int=1, batch_size: int=DEFAULT_BATCH_SIZE, capacity: int=None) \
         -> Sequence[Tuple[int, Tuple[str, str]]]:
-    counter = LemmaCounter(nlp, count_stopwords=count_stopwords, use_pos=use_pos)
+    """
+    The ``number`` most common lemmas in ``text``, which can either be a
+    single text or an iterable of texts, for example an open file with one
+    text per line. If ``number`` is 0, all lemmas are included.
+
+    If ``jobs`` is greater than 1, the texts are counted by as many worker
+    processes in parallel, with 0 meaning the number of CPUs available. The
+    result is the same as when counting serially.
+
+    If ``capacity`` is specified, at most this many lemmas are kept in
+    memory and counts are approximate, see :py:class:`LemmaCounter`.
+    """
+    assert jobs >= 0
+
     texts_to_count = [text] if type(text) == str else text
-    for text_to_count in texts_to_count:
-        counter.count(text_to_count)
+    if jobs == 1:
+        counter = VectorizedLemmaCounter(nlp, count_stopwords=count_stopwords, use_pos=use_pos, capacity=capacity)
+        counter.count_texts(texts_to_count, batch_size)
+        result = counter.most_common(number)
     else:
-        result = []
-    result = sorted([
-        (count, lemma, pos)
-        for (lemma, pos), count in counter.lemma_pos_to_count_map.items()
-    ], reverse=True)
-    if number != 0:
-        result = result[:number]
+        result = most_common_counts(parallel_lemma_pos_to_count_map(
+            nlp, texts_to_count, jobs, count_stopwords=count_stopwords, use_pos=use_pos,
+            batch_size=batch_size, capacity=capacity), number)
     return result
 
 
@@ -42,47 +86,350 @@ class LemmaCounter:
     """
     Counter for pairs of lemmas and part of speech tags in a text only
     considering tokens that start with a (Unicode) letter.
+
+    If ``capacity`` is specified, at most this many pairs are kept in memory
+    using a :py:class:`shapiro.sketch.SpaceSavingCounter`. This limits the
+    memory needed for large texts with many rare lemmas (for example typos
+    and names) at the expense of counts being approximate for
+    lemmas that are not among the most common ones.
+
+    If :py:attr:`stats` are enabled, the time spent in each component of the
+    spaCy pipeline and in counting is measured.
     """
-    def __init__(self, nlp: Language, count_stopwords: bool=False, use_pos: bool=False):
+    def __init__(self, nlp: Language, count_stopwords: bool=False, use_pos: bool=False, capacity: int=None):
         assert nlp is not None
+        assert capacity is None or capacity >= 1
 
-        self.lemma_pos_to_count_map = {}
         self._nlp = nlp
         self._use_pos = use_pos
         self._count_stopwords = count_stopwords
         self._stopwords = nlp.Defaults.stop_words
+        self._capacity = capacity
+        # Cache for whether tokens with a certain lemma should be counted
+        # (as long as the token itself is not a stop word).
+        self._lemma_to_is_countable_map: Dict[str, bool] = {}
+        self.stats = TimingStats()
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all counts.
+        """
+        if self._capacity is None:
+            self.lemma_pos_to_count_map = Counter()
+        else:
+            self.lemma_pos_to_count_map = SpaceSavingCounter(self._capacity)
+
+    def state(self) -> LemmaCountState:
+        """
+        The current counts together with the options used to count them,
+        which can be stored using
+        :py:func:`shapiro.countstate.write_lemma_count_state`.
+        """
+        return LemmaCountState(self._use_pos, self._count_stopwords, self._capacity, self.lemma_pos_to_count_map)
+
+    def merge_state(self, state: LemmaCountState):
+        """
+        Add the counts of ``state``, for example counts of previous days read
+        using :py:func:`shapiro.countstate.read_lemma_count_state`. The
+        state must have been counted with the same options as this counter.
+        """
+        self.state().merge(state)
 
     def count(self, text: str):
-        document = self._nlp(text)
-        for sent in document.sents:
-            for token in sent:
-                is_stop = token.is_stop or token.lemma_.lower() in self._nlp.Defaults.stop_words
-                if self._count_stopwords or not is_stop:
-                    lemma = token.lemma_
-                    is_proper_word = (len(lemma) >= 1) and lemma[0].isalpha()
-                    if is_proper_word:
-                        pos = token.pos_ if self._use_pos else None
-                        key = (lemma, pos)
-                        if key in self.lemma_pos_to_count_map:
-                            self.lemma_pos_to_count_map[key] += 1
-                        else:
-                            self.lemma_pos_to_count_map[key] = 1
+        self.count_document(self._nlp(text))
+
+    def count_texts(self, texts: Iterable[str], batch_size: int=DEFAULT_BATCH_SIZE):
+        """
+        Count all ``texts`` while letting spaCy process ``batch_size`` of
+        them at once, which is considerably faster than calling
+        :py:meth:`count` for each text.
+        """
+        for document in profiling.parsed_documents(self._nlp, texts, self.stats, batch_size):
+            with self.stats.measured('count'):
+                self.count_document(document)
+
+    def count_document(self, document: Doc):
+        """
+        Count the lemmas in an already parsed ``document``.
+        """
+        self.lemma_pos_to_count_map.update(self._countable_lemma_pos_pairs(document))
+
+    def most_common(self, number: int=0) -> Sequence[Tuple[int, str, str]]:
+        """
+        The ``number`` most common lemmas counted so far, see
+        :py:func:`shapiro.countstate.most_common_counts`.
+        """
+        return most_common_counts(self.lemma_pos_to_count_map, number)
+
+    def _countable_lemma_pos_pairs(self, document: Doc) -> Generator[Tuple[str, str], None, None]:
+        for token in document:
+            lemma = token.lemma_
+            is_countable = self._lemma_to_is_countable_map.get(lemma)
+            if is_countable is None:
+                is_countable = self._is_countable_lemma(lemma)
+                self._lemma_to_is_countable_map[lemma] = is_countable
+            if is_countable and (self._count_stopwords or not token.is_stop):
+                yield lemma, token.pos_ if self._use_pos else None
+
+    def _is_countable_lemma(self, lemma: str) -> bool:
+        is_proper_word = (len(lemma) >= 1) and lemma[0].isalpha()
+        return is_proper_word and (self._count_stopwords or lemma.lower() not in self._stopwords)
+
+
+class VectorizedLemmaCounter(LemmaCounter):
+    """
+    Same as :py:class:`LemmaCounter` but instead of looping over the tokens
+    in Python it obtains the hashes of lemmas, part of speech tags and stop
+    word flags of a whole batch of documents using :py:meth:`Doc.to_array`
+    and counts them with NumPy. Strings are only resolved once for each
+    distinct lemma to check whether it should be counted, and for the
+    result. :py:meth:`most_common` resolves only the lemmas it returns.
+
+    Exact counts are the same as with :py:class:`LemmaCounter`. Approximate
+    counts might differ slightly because each batch is added at once.
+    """
+    #: Attributes obtained for each token with the column index matching the constants below.
+    _ATTRIBUTES = [LEMMA, POS, IS_STOP]
+    _LEMMA_COLUMN = 0
+    _POS_COLUMN = 1
+    _IS_STOP_COLUMN = 2
+
+    #: Part of speech hash used in keys if ``use_pos`` is ``False``.
+    _NO_POS = 0
+
+    def __init__(self, nlp: Language, count_stopwords: bool=False, use_pos: bool=False, capacity: int=None):
+        self._strings = nlp.vocab.strings
+        self._lemma_hash_to_is_countable_map: Dict[int, bool] = {}
+        super().__init__(nlp, count_stopwords=count_stopwords, use_pos=use_pos, capacity=capacity)
+
+    def reset(self):
+        if self._capacity is None:
+            self._lemma_pos_hash_to_count_map = Counter()
+        else:
+            self._lemma_pos_hash_to_count_map = SpaceSavingCounter(self._capacity)
+
+    @property
+    def lemma_pos_to_count_map(self) -> Union[Counter, SpaceSavingCounter]:
+        """
+        All counts with the hashes resolved to strings. For only the most
+        common lemmas, :py:meth:`most_common` is considerably faster.
+        """
+        if self._capacity is None:
+            result = Counter({
+                self._lemma_pos_pair(lemma_pos_hash_pair): count
+                for lemma_pos_hash_pair, count in self._lemma_pos_hash_to_count_map.items()
+            })
+        else:
+            result = SpaceSavingCounter.restored(
+                self._capacity, self._lemma_pos_hash_to_count_map.total, (
+                    (self._lemma_pos_pair(lemma_pos_hash_pair), count, error)
+                    for lemma_pos_hash_pair, count, error in self._lemma_pos_hash_to_count_map.items_with_error()
+                ))
+        return result
+
+    def merge_state(self, state: LemmaCountState):
+        LemmaCountState(self._use_pos, self._count_stopwords, self._capacity).check_is_compatible_with(state)
+        source_map = state.lemma_pos_to_count_map
+        if self._capacity is None:
+            for (lemma, pos), count in source_map.items():
+                self._lemma_pos_hash_to_count_map[self._lemma_pos_hash_pair(lemma, pos)] += count
+        else:
+            self._lemma_pos_hash_to_count_map.merge(SpaceSavingCounter.restored(
+                self._capacity, source_map.total, (
+                    (self._lemma_pos_hash_pair(lemma, pos), count, error)
+                    for (lemma, pos), count, error in source_map.items_with_error()
+                )))
+
+    def count_texts(self, texts: Iterable[str], batch_size: int=DEFAULT_BATCH_SIZE):
+        for documents in tools.chunked(
+                profiling.parsed_documents(self._nlp, texts, self.stats, batch_size), batch_size):
+            with self.stats.measured('count'):
+                self.count_documents(documents)
+
+    def count_document(self, document: Doc):
+        self.count_documents([document])
+
+    def count_documents(self, documents: Sequence[Doc]):
+        """
+        Count the lemmas in already parsed ``documents`` at once.
+        """
+        attribute_arrays = [document.to_array(self._ATTRIBUTES) for document in documents]
+        attribute_arrays = [attribute_array for attribute_array in attribute_arrays if len(attribute_array) != 0]
+        if len(attribute_arrays) != 0:
+            attribute_array = np.concatenate(attribute_arrays)
+            if not self._count_stopwords:
+                attribute_array = attribute_array[attribute_array[:, self._IS_STOP_COLUMN] == 0]
+            key_columns = [self._LEMMA_COLUMN, self._POS_COLUMN] if self._use_pos else [self._LEMMA_COLUMN]
+            keys, counts = np.unique(attribute_array[:, key_columns], axis=0, return_counts=True)
+            is_counter = self._capacity is None
+            lemma_pos_hash_to_count_map = self._lemma_pos_hash_to_count_map
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                lemma_hash = key[0]
+                is_countable = self._lemma_hash_to_is_countable_map.get(lemma_hash)
+                if is_countable is None:
+                    is_countable = self._is_countable_lemma(self._strings[lemma_hash])
+                    self._lemma_hash_to_is_countable_map[lemma_hash] = is_countable
+                if is_countable:
+                    lemma_pos_hash_pair = (lemma_hash, key[1] if self._use_pos else self._NO_POS)
+                    if is_counter:
+                        lemma_pos_hash_to_count_map[lemma_pos_hash_pair] += count
+                    else:
+                        lemma_pos_hash_to_count_map.add(lemma_pos_hash_pair, count)
+
+    def most_common(self, number: int=0) -> Sequence[Tuple[int, str, str]]:
+        """
+        Same as :py:meth:`LemmaCounter.most_common` but only resolving the
+        hashes of lemmas that can be part of the result.
+        """
+        assert number >= 0
+
+        lemma_pos_hash_and_count_pairs = self._lemma_pos_hash_to_count_map.items()
+        if number == 0 or number >= len(self._lemma_pos_hash_to_count_map):
+            result = most_common_counts(self.lemma_pos_to_count_map, number)
+        else:
+            # Counts equal to the lowest one in the result are resolved too
+            # so ties are broken by lemma and part of speech like in
+            # most_common_counts().
+            lowest_count = heapq.nlargest(
+                number, (count for _, count in lemma_pos_hash_and_count_pairs))[-1]
+            result = most_common_counts({
+                self._lemma_pos_pair(lemma_pos_hash_pair): count
+                for lemma_pos_hash_pair, count in lemma_pos_hash_and_count_pairs
+                if count >= lowest_count
+            }, number)
+        return result
+
+    def _lemma_pos_pair(self, lemma_pos_hash_pair: Tuple[int, int]) -> Tuple[str, str]:
+        lemma_hash, pos_hash = lemma_pos_hash_pair
+        return self._strings[lemma_hash], self._strings[pos_hash] if self._use_pos else None
+
+    def _lemma_pos_hash_pair(self, lemma: str, pos: str) -> Tuple[int, int]:
+        # NOTE: Adding the strings ensures they can be resolved again, for
+        # example if they were counted by another process.
+        return self._strings.add(lemma), self._strings.add(pos) if self._use_pos else self._NO_POS
+
+
+def merge_lemma_pos_to_count_maps(
+        target: Union[Counter, SpaceSavingCounter], source: Union[Counter, SpaceSavingCounter]):
+    """
+    Add the counts of ``source`` to ``target``.
+    """
+    assert type(target) == type(source), 'target=%s, source=%s' % (type(target).__name__, type(source).__name__)
+    if isinstance(target, SpaceSavingCounter):
+        target.merge(source)
+    else:
+        target.update(source)
+
+
+#: Counter used by parallel workers, see :py:func:`parallel_counts`.
+_worker_counter = None
+
+
+def _worker_counts(texts_and_batch_size: Tuple[List[str], int]):
+    texts, batch_size = texts_and_batch_size
+    _worker_counter.reset()
+    _worker_counter.count_texts(texts, batch_size)
+    return _worker_counter.lemma_pos_to_count_map
+
+
+def parallel_counts(counter, texts: Iterable[str], jobs: int, batch_size: int, chunk_size: int,
+                    merge: Callable[[Any, Any], None]):
+    """
+    The ``lemma_pos_to_count_map`` of ``counter`` after counting ``texts``
+    using ``jobs`` worker processes (0 = number of CPUs) that each count
+    ``chunk_size`` texts at a time. ``counter`` can be any counter with the
+    methods ``reset()`` and ``count_texts(texts, batch_size)``, for example
+    a :py:class:`LemmaCounter`. The counts of each chunk are added to the
+    result using ``merge(target, source)``.
+
+    Texts are read lazily, at most two chunks per worker ahead of the
+    counted ones. The workers are forked from the current process and
+    consequently share ``counter`` and its language model with it. On platforms that cannot
+    fork processes, the texts are counted serially.
+    """
+    global _worker_counter
+
+    assert counter is not None
+    assert jobs >= 0
+    assert chunk_size >= 1
+    assert merge is not None
+
+    actual_jobs = jobs if jobs != 0 else (os.cpu_count() or 1)
+    can_fork = 'fork' in multiprocessing.get_all_start_methods()
+    if not can_fork:  # pragma: no cover
+        _log.warning('cannot fork worker processes on this platform, counting serially')
+    if actual_jobs == 1 or not can_fork:
+        counter.count_texts(texts, batch_size)
+        result = counter.lemma_pos_to_count_map
+    else:
+        _log.info('counting using %d worker processes', actual_jobs)
+        result = counter.lemma_pos_to_count_map
+        # NOTE: The counter must be set before the workers are forked so they can inherit it.
+        _worker_counter = counter
+        try:
+            with models.prepared_fork(), multiprocessing.get_context('fork').Pool(actual_jobs) as pool:
+                chunks_and_batch_size = (
+                    (chunk, batch_size) for chunk in tools.chunked(texts, chunk_size)
+                )
+                for chunk_lemma_pos_to_count_map in tools.bounded_imap_unordered(
+                        pool, _worker_counts, chunks_and_batch_size, _MAX_PENDING_CHUNKS_PER_JOB * actual_jobs):
+                    merge(result, chunk_lemma_pos_to_count_map)
+        finally:
+            _worker_counter = None
+    return result
+
+
+def parallel_lemma_pos_to_count_map(
+        nlp: Language, texts: Iterable[str], jobs: int=0, count_stopwords: bool=False, use_pos: bool=False,
+        batch_size: int=DEFAULT_BATCH_SIZE, chunk_size: int=DEFAULT_CHUNK_SIZE, capacity: int=None) \
+        -> Union[Counter, SpaceSavingCounter]:
+    """
+    Same as :py:attr:`LemmaCounter.lemma_pos_to_count_map` after counting
+    ``texts`` but using ``jobs`` worker processes (0 = number of CPUs), see
+    :py:func:`parallel_counts`.
+    """
+    counter = LemmaCounter(nlp, count_stopwords=count_stopwords, use_pos=use_pos, capacity=capacity)
+    return parallel_counts(counter, texts, jobs, batch_size, chunk_size, merge_lemma_pos_to_count_maps)
 
 
 class LexiconEntry:
     """
     Entry in a lexicon that can be compared with a token.
+
+    Large lexicons have many entries, so each entry only stores its
+    attributes in slots. Lemmas are interned, so equal lemmas of different
+    lexicons share the same string. Entries that are regular expressions
+    refer to their compiled ``regex``, which for entries of a lexicon is
+    kept in a table of its :py:class:`LexiconEntries`, so plain entries need
+    no memory for it.
     """
+    __slots__ = ('lemma', 'topic', 'rating', 'regex')
+
     _IS_REGEX_REGEX = re.compile(r'.*[.+*\[$^\\]')
 
     def __init__(self, lemma: str, topic: Enum=None, rating: Rating=None):
         assert lemma is not None
-        self.lemma = lemma
-        self._lower_lemma = lemma.lower()
+        self.lemma = sys.intern(lemma)
         self.topic = topic
         self.rating = rating
-        self.is_regex = LexiconEntry._IS_REGEX_REGEX.match(self.lemma) is not None
-        self._regex = re.compile(lemma) if self.is_regex else None
+        # Compile early so broken regular expressions are detected when reading the lexicon.
+        self.regex: Optional[Pattern] = re.compile(lemma) if LexiconEntry._IS_REGEX_REGEX.match(lemma) else None
+
+    @classmethod
+    def _restored(cls, lemma: str, topic: Optional[Enum], rating: Optional[Enum], regex: Optional[Pattern]) \
+            -> 'LexiconEntry':
+        # Skip __init__() because the lemma is interned and the regex compiled already.
+        result = cls.__new__(cls)
+        result.lemma = lemma
+        result.topic = topic
+        result.rating = rating
+        result.regex = regex
+        return result
+
+    @property
+    def is_regex(self) -> bool:
+        return self.regex is not None
 
     def matching(self, token: Token) -> float:
         """
@@ -90,10 +437,11 @@ class LexiconEntry:
         """
         assert token is not None
         result = 0.0
-        if self.is_regex:
-            if self._regex.match(token.text):
+        regex = self.regex
+        if regex is not None:
+            if regex.match(token.text):
                 result = 0.6
-            elif self._regex.match(token.lemma_):
+            elif regex.match(token.lemma_):
                 result = 0.5
         else:
             if token.text == self.lemma:
@@ -121,6 +469,92 @@ class LexiconEntry:
         return self.__str__()
 
 
+class LexiconEntries(Sequence[LexiconEntry]):
+    """
+    Entries of a :py:class:`Lexicon` stored as parallel lists of lemmas,
+    topics and ratings instead of one object per entry, which takes only a
+    fraction of the memory. A :py:class:`LexiconEntry` is created only when
+    an entry is accessed, so changing its attributes does not change the
+    lexicon.
+    """
+    def __init__(self, lexicon_entries: Iterable[LexiconEntry]=()):
+        self._lemmas: List[str] = []
+        self._topics: List[Optional[Enum]] = []
+        self._ratings: List[Optional[Enum]] = []
+        # Ascending positions of the entries that are regular expressions, which are rare.
+        self._regex_positions: List[int] = []
+        # Compiled regular expressions of the entries that are regular expressions.
+        self._lemma_to_regex_map: Dict[str, Pattern] = {}
+        self.extend(lexicon_entries)
+
+    def append(self, lexicon_entry: LexiconEntry):
+        assert lexicon_entry is not None
+        if lexicon_entry.is_regex:
+            self._regex_positions.append(len(self._lemmas))
+            self._lemma_to_regex_map.setdefault(lexicon_entry.lemma, lexicon_entry.regex)
+        self._lemmas.append(lexicon_entry.lemma)
+        self._topics.append(lexicon_entry.topic)
+        self._ratings.append(lexicon_entry.rating)
+
+    def extend(self, lexicon_entries: Iterable[LexiconEntry]):
+        assert lexicon_entries is not None
+        if isinstance(lexicon_entries, LexiconEntries):
+            # Copy the lists without creating an entry for each item.
+            position_offset = len(self._lemmas)
+            self._regex_positions.extend(
+                position_offset + regex_position for regex_position in lexicon_entries._regex_positions)
+            for lemma, regex in lexicon_entries._lemma_to_regex_map.items():
+                self._lemma_to_regex_map.setdefault(lemma, regex)
+            self._lemmas.extend(lexicon_entries._lemmas)
+            self._topics.extend(lexicon_entries._topics)
+            self._ratings.extend(lexicon_entries._ratings)
+        else:
+            for lexicon_entry in lexicon_entries:
+                self.append(lexicon_entry)
+
+    def lemma_and_position_pairs(self) -> Iterable[Tuple[str, int]]:
+        """
+        Pairs of lemma and position of all entries that are no regular
+        expressions.
+        """
+        regex_positions = set(self._regex_positions)
+        return (
+            (lemma, position)
+            for position, lemma in enumerate(self._lemmas)
+            if position not in regex_positions
+        )
+
+    def regex_positions(self) -> List[int]:
+        return list(self._regex_positions)
+
+    def __len__(self) -> int:
+        return len(self._lemmas)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[LexiconEntry, List[LexiconEntry]]:
+        if isinstance(index, slice):
+            result = [self[position] for position in range(*index.indices(len(self._lemmas)))]
+        else:
+            if index < 0:
+                index += len(self._lemmas)
+            if not 0 <= index < len(self._lemmas):
+                raise IndexError('lexicon entry index must be between 0 and %d but is: %d'
+                                 % (len(self._lemmas) - 1, index))
+            regex_position_index = bisect.bisect_left(self._regex_positions, index)
+            is_regex = regex_position_index < len(self._regex_positions) \
+                and self._regex_positions[regex_position_index] == index
+            lemma = self._lemmas[index]
+            regex = self._lemma_to_regex_map[lemma] if is_regex else None
+            result = LexiconEntry._restored(lemma, self._topics[index], self._ratings[index], regex)
+        return result
+
+    def __iter__(self) -> Generator[LexiconEntry, None, None]:
+        regex_positions = set(self._regex_positions)
+        lemma_to_regex_map = self._lemma_to_regex_map
+        for position, (lemma, topic, rating) in enumerate(zip(self._lemmas, self._topics, self._ratings)):
+            regex = lemma_to_regex_map[lemma] if position in regex_positions else None
+            yield LexiconEntry._restored(lemma, topic, rating, regex)
+
+
 class Lexicon:
     """
     Collection of :py:class:`LexiconEntry` that can be searched for a best match.
@@ -143,9 +577,14 @@ class Lexicon:
 
         check_enum_names_are_case_insensitely_unique(topic_enum)
         check_enum_names_are_case_insensitely_unique(rating_enum)
-        self.entries: List[LexiconEntry] = []
+        self.entries = LexiconEntries()
         self._topic_enum = topic_enum
         self._rating_enum = rating_enum
+        # Index for lexicon_entry_for(), see _build_index().
+        self._indexed_entry_count = 0
+        # Until looked up for the first time, plain entries are only represented by their position.
+        self._lemma_to_plain_entry_map: Dict[str, Union[int, LexiconEntry]] = {}
+        self._regex_entries: List[LexiconEntry] = []
 
     def read_from_csv(self, lexicon_csv_path: str, encoding: str='utf-8', **csv_reader_keyword_arguments):
         """
@@ -210,27 +649,77 @@ class Lexicon:
 
     def lexicon_entry_for(self, token: Token) -> LexiconEntry:
         """
-        Entry in lexicon that best matches ``token``.
-        """
-        result = None
-        lexicon_size = len(self.entries)
-        lexicon_entry_index = 0
-        best_matching = 0.0
-        while lexicon_entry_index < lexicon_size and not tools.is_close(best_matching, 1.0):
-            lexicon_entry = self.entries[lexicon_entry_index]
-            matching = lexicon_entry.matching(token)
-            if matching > best_matching:
-                result = lexicon_entry
-                best_matching = matching
-            lexicon_entry_index += 1
+        Entry in lexicon that best matches ``token``. If multiple entries
+        match equally well, the first one is used.
+
+        Plain entries are looked up using an index that is rebuilt when
+        the number of entries changes. Only if no plain entry matches,
+        regular expressions are tried.
+        """
+        if self._indexed_entry_count != len(self.entries):
+            self._build_index()
+        lemma_to_plain_entry_map = self._lemma_to_plain_entry_map
+        # NOTE: The order reflects the decreasing weights of LexiconEntry.matching().
+        text = token.text
+        lemma = token.lemma_
+        for lemma_to_look_up in (text, text.lower(), lemma, lemma.lower()):
+            result = lemma_to_plain_entry_map.get(lemma_to_look_up)
+            if result is not None:
+                if type(result) is int:
+                    result = self.entries[result]
+                    lemma_to_plain_entry_map[lemma_to_look_up] = result
+                break
+        else:
+            best_matching = 0.0
+            for lexicon_entry in self._regex_entries:
+                matching = lexicon_entry.matching(token)
+                if matching > best_matching:
+                    result = lexicon_entry
+                    best_matching = matching
         return result
 
+    def _build_index(self):
+        self._lemma_to_plain_entry_map = {}
+        for lemma, position in self.entries.lemma_and_position_pairs():
+            self._lemma_to_plain_entry_map.setdefault(lemma, position)
+        self._regex_entries = [self.entries[position] for position in self.entries.regex_positions()]
+        self._indexed_entry_count = len(self.entries)
+
+
+#: Lexicons read by cached_lexicon() with the modification time and size of their file.
+_lexicon_key_to_modification_and_lexicon_map: Dict[Tuple, Tuple[Tuple[int, int], Lexicon]] = {}
+_lexicon_cache_lock = threading.Lock()
+
+
+def cached_lexicon(
+        lexicon_csv_path: str, topic_enum: Enum, rating_enum: Enum=Rating, encoding: str='utf-8') -> Lexicon:
+    """
+    Lexicon read from ``lexicon_csv_path`` that is kept in memory and only
+    read again once the modification time or size of the file changes. The
+    result is shared by all callers and consequently must not be modified.
+    """
+    assert lexicon_csv_path is not None
+
+    key = (os.path.abspath(lexicon_csv_path), topic_enum, rating_enum, encoding)
+    lexicon_csv_status = os.stat(lexicon_csv_path)
+    modification = (lexicon_csv_status.st_mtime_ns, lexicon_csv_status.st_size)
+    with _lexicon_cache_lock:
+        modification_and_lexicon = _lexicon_key_to_modification_and_lexicon_map.get(key)
+    if modification_and_lexicon is not None and modification_and_lexicon[0] == modification:
+        result = modification_and_lexicon[1]
+    else:
+        result = Lexicon(topic_enum, rating_enum)
+        result.read_from_csv(lexicon_csv_path, encoding=encoding)
+        with _lexicon_cache_lock:
+            _lexicon_key_to_modification_and_lexicon_map[key] = (modification, result)
+    return result
+
 
 class SentimentContext:
     def __init__(self, language: Union[Language, str], lexicon: Lexicon, synonyms: Dict[str, str]=None):
         assert language is not None
         if type(language) == str:
-            self._language = spacy.load(language)
+            self._language = models.language_model(language)
         else:
             self._language = language
         self._synonyms = {}
@@ -265,6 +754,69 @@ def add_token_extension(force=False):
     Token.set_extension('is_negation', default=False, force=force)
     Token.set_extension('is_intensifier', default=False, force=force)
     Token.set_extension('is_diminisher', default=False, force=force)
+    # True for all but the first token of a modifier consisting of multiple tokens, for example "a little bit".
+    Token.set_extension('is_modifier_continuation', default=False, force=force)
+
+
+class OpinionRecord:
+    """
+    Opinion found in a sentence. Unlike the spaCy span of the sentence, the
+    record does not keep the whole parsed document alive, so documents can
+    be freed right after finding their opinions.
+
+    ``start`` and ``end`` are the character offsets of the sentence
+    ``text`` without leading and trailing white space within the original
+    text, or ``None`` if they are unknown because idioms have been replaced
+    in the text before parsing it. Optionally ``token_indices`` are the
+    indices of the tokens in the document that contributed to the opinion.
+    """
+    __slots__ = ('topic', 'rating', 'start', 'end', 'text', 'token_indices')
+
+    def __init__(self, topic: Optional[Enum], rating: Optional[Rating], start: Optional[int], end: Optional[int],
+                 text: str, token_indices: Optional[Tuple[int, ...]]=None):
+        assert (start is None) == (end is None)
+        assert start is None or 0 <= start <= end
+        assert text is not None
+        self.topic = topic
+        self.rating = rating
+        self.start = start
+        self.end = end
+        self.text = text
+        self.token_indices = token_indices
+
+    def __str__(self) -> str:
+        result = 'OpinionRecord(%d:%d' % (self.start, self.end) if self.start is not None else 'OpinionRecord(?:?'
+        if self.topic is not None:
+            result += ', topic=%s' % self.topic.name
+        if self.rating is not None:
+            result += ', rating=%s' % self.rating.name
+        result += ', text=%r)' % self.text
+        return result
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def opinion_record(topic: Optional[Enum], rating: Optional[Rating], sent: Span,
+                   with_token_indices: bool=False, has_original_offsets: bool=True) -> OpinionRecord:
+    """
+    :py:class:`OpinionRecord` for an opinion yielded by
+    :py:meth:`OpinionMiner.opinions`. Unless ``has_original_offsets``, the
+    offsets of ``sent`` do not refer to the original text, and the record
+    has no offsets.
+    """
+    sent_text = str(sent)
+    stripped_sent_text = sent_text.strip()
+    if has_original_offsets:
+        start = sent.start_char + len(sent_text) - len(sent_text.lstrip())
+        end = start + len(stripped_sent_text)
+    else:
+        start = None
+        end = None
+    token_indices = tuple(
+        token.i for token in sent if OpinionMiner._is_essential(token) or token._.is_modifier_continuation
+    ) if with_token_indices else None
+    return OpinionRecord(topic, rating, start, end, stripped_sent_text, token_indices)
 
 
 class OpinionMiner:
@@ -272,52 +824,149 @@ class OpinionMiner:
     Miner for opinions written in a specific language based on a lexicon.
 
     Opinions are matched to a topic and :py:class:`Rating`.
+
+    The miner does not change the pipeline of ``nlp``, so multiple miners
+    can share the same language model. Additionally each call can use a
+    different lexicon, see :py:meth:`opinions_of_document`.
+
+    If ``nlp`` is the name of a language model, the model is obtained from
+    :py:func:`shapiro.models.language_model`.
+
+    If :py:attr:`stats` are enabled, the time spent in each stage of the
+    analysis is measured, for example ``preprocess``, each component of the
+    spaCy pipeline, ``annotate`` or ``combine_ratings``.
+
+    With ``idiom_matching=IDIOM_MATCHING_TEXT`` idioms are replaced by the
+    localized text of their rating before parsing, so the text of the
+    resulting sentences differs from the original text. With
+    ``IDIOM_MATCHING_TOKENS`` the lower case tokens of the parsed document
+    are matched with the tokenized idioms instead, and the first token of
+    each matching idiom gets its rating. This keeps the text and its
+    offsets unchanged and needs no passes over the text before parsing.
+
+    If ``nlp`` is ``None``, the miner can only find opinions in documents
+    that have already been parsed, for example a
+    :py:class:`shapiro.pretokenized.PretokenizedDoc`, and idioms are matched
+    with tokens. Without a tokenizer, idioms are split into words at white
+    space and hyphens.
     """
-    def __init__(self, nlp: Language, lexicon: Lexicon, language_sentiment: LanguageSentiment, topic_type: Enum=None):
-        assert nlp is not None
+    def __init__(self, nlp: Optional[Union[Language, str]], lexicon: Lexicon, language_sentiment: LanguageSentiment,
+                 topic_type: Enum=None, idiom_matching: str=None):
         assert lexicon is not None
         assert language_sentiment is not None
-        self.nlp = nlp
+        assert idiom_matching is None or idiom_matching in IDIOM_MATCHINGS, 'idiom_matching=%r' % idiom_matching
+        if nlp is None and idiom_matching == IDIOM_MATCHING_TEXT:
+            raise ValueError('idiom_matching must be %r if there is no language model to parse texts with'
+                             % IDIOM_MATCHING_TOKENS)
+        self.nlp = models.language_model(nlp) if type(nlp) == str else nlp
         self.language_sentiment = language_sentiment
         self.lexicon = lexicon
+        if idiom_matching is not None:
+            self.idiom_matching = idiom_matching
+        else:
+            self.idiom_matching = IDIOM_MATCHING_TEXT if nlp is not None else IDIOM_MATCHING_TOKENS
         self._topic_type = topic_type
         self._emoticon_to_name_and_rating_map = create_emoticon_to_name_and_rating_map()
-        self._idiom_to_localized_rating_text_map = compiled_idiom_to_localized_rating_text_map(
-            language_sentiment.idioms, language_sentiment.rating_to_localized_text_map)
+        if self.idiom_matching == IDIOM_MATCHING_TEXT:
+            self._idiom_to_localized_rating_text_map = language_sentiment.compiled_idiom_to_localized_rating_text_map
+            self._idiom_trie = None
+        else:
+            self._idiom_to_localized_rating_text_map = {}
+            self._idiom_trie = self._tokenized_idiom_trie()
+        self.stats = TimingStats()
 
-        def opinion_matcher(doc):
-            """
-            SpaCy pipeline pipe that sets opinion related attributes for each
-            token.
-            """
-            for sentence in doc.sents:
-                for token in sentence:
-                    if self.language_sentiment.is_intensifier(token):
-                        token._.is_intensifier = True
-                    elif self.language_sentiment.is_diminisher(token):
-                        token._.is_diminisher = True
-                    elif self.language_sentiment.is_negation(token):
-                        token._.is_negation = True
-                    else:
-                        lexicon_entry = self.lexicon.lexicon_entry_for(token)
-                        if lexicon_entry is not None:
-                            token._.rating = lexicon_entry.rating
-                            token._.topic = lexicon_entry.topic
-                        else:
-                            # Check for lexicon independent negatives and positives.
-                            lower_lemma = token.lemma_.lower()
-                            rating = self.language_sentiment.negatives.get(lower_lemma)
-                            if rating is None:
-                                rating = self.language_sentiment.positives.get(lower_lemma)
-                            if rating is not None:
-                                token._.rating = rating
-            return doc
-
-        if self.nlp.has_pipe('opinion_matcher'):
-            self.nlp.remove_pipe('opinion_matcher')
-        self.nlp.add_pipe(opinion_matcher)
-
-    def opinions(self, text: str, expected_topic=None) -> Generator[Tuple[Enum, Rating, List[Token]], None, None]:
+    def _tokenized_idiom_trie(self) -> WordTrie:
+        # Tokenize the idioms the same way as the texts, for example "don't" becomes "do" and "n't".
+        result = WordTrie()
+        for idiom, rating in self.language_sentiment.idioms.items():
+            words = [token.lower_ for token in self.nlp.make_doc(idiom)] if self.nlp is not None \
+                else lower_words(idiom)
+            result.add_words(words, rating)
+        return result
+
+    def annotate(self, document: Doc, lexicon: Lexicon=None):
+        """
+        Set the opinion related attributes of each token in ``document``
+        using ``lexicon`` or the lexicon of the miner if ``lexicon`` is
+        ``None``. Attributes of a previous annotation are reset, so the same
+        document can be annotated with multiple lexicons one after another.
+        """
+        assert document is not None
+
+        actual_lexicon = lexicon if lexicon is not None else self.lexicon
+        language_sentiment = self.language_sentiment
+        token_index_to_idiom_rating_map = {}
+        idiom_token_indices = set()
+        if self._idiom_trie is not None:
+            lower_texts = [token.lower_ for token in document]
+            for idiom_start, idiom_end, idiom_rating in self._idiom_trie.sentence_spans(document, lower_texts):
+                token_index_to_idiom_rating_map[idiom_start] = idiom_rating
+                idiom_token_indices.update(range(idiom_start, idiom_end))
+        token_index_to_modifier_kind_map = {}
+        modifier_continuation_token_indices = set()
+        for modifier_start, modifier_end, modifier_kind in language_sentiment.modifier_spans(document):
+            # Idioms take precedence, for example "not" in "not rocket science".
+            if idiom_token_indices.isdisjoint(range(modifier_start, modifier_end)):
+                for token_index in range(modifier_start, modifier_end):
+                    token_index_to_modifier_kind_map[token_index] = modifier_kind
+                modifier_continuation_token_indices.update(range(modifier_start + 1, modifier_end))
+        for token_index, token in enumerate(document):
+            token_extension = token._
+            token_extension.topic = None
+            token_extension.rating = None
+            token_extension.is_modifier_continuation = token_index in modifier_continuation_token_indices
+            modifier_kind = token_index_to_modifier_kind_map.get(token_index)
+            token_extension.is_intensifier = modifier_kind == INTENSIFIER
+            token_extension.is_diminisher = modifier_kind == DIMINISHER
+            token_extension.is_negation = modifier_kind == NEGATION
+            if token_index in idiom_token_indices:
+                # Like a replaced idiom, the tokens of an idiom only contribute its rating.
+                token_extension.rating = token_index_to_idiom_rating_map.get(token_index)
+            elif modifier_kind is None:
+                lexicon_entry = actual_lexicon.lexicon_entry_for(token)
+                if lexicon_entry is not None:
+                    token_extension.rating = lexicon_entry.rating
+                    token_extension.topic = lexicon_entry.topic
+                else:
+                    # Check for lexicon independent negatives and positives.
+                    lower_lemma = token.lemma_.lower()
+                    rating = language_sentiment.negatives.get(lower_lemma)
+                    if rating is None:
+                        rating = language_sentiment.positives.get(lower_lemma)
+                    if rating is not None:
+                        token_extension.rating = rating
+
+    def parsed(self, text: str) -> Doc:
+        """
+        ``text`` preprocessed and parsed by the language model but not yet
+        annotated, see :py:meth:`opinions_of_document`.
+        """
+        assert text is not None
+        assert self.nlp is not None, 'opinion miner without language model must only be used with parsed documents'
+
+        _log.info('preprocessing text')
+        with self.stats.measured('preprocess'):
+            preprocessed_text = self._preprocessed_text(text)
+        return profiling.parsed_document(self.nlp, preprocessed_text, self.stats)
+
+    def parsed_documents(self, texts: Iterable[str], batch_size: int=DEFAULT_BATCH_SIZE) -> Iterable[Doc]:
+        """
+        Same as :py:meth:`parsed` for each of ``texts`` but letting spaCy
+        process ``batch_size`` of them at once, which is faster.
+        """
+        assert texts is not None
+        assert self.nlp is not None, 'opinion miner without language model must only be used with parsed documents'
+
+        def preprocessed_texts():
+            for text in texts:
+                with self.stats.measured('preprocess'):
+                    preprocessed_text = self._preprocessed_text(text)
+                yield preprocessed_text
+
+        return profiling.parsed_documents(self.nlp, preprocessed_texts(), self.stats, batch_size)
+
+    def opinions(self, text: str, expected_topic=None, lexicon: Lexicon=None) \
+            -> Generator[Tuple[Enum, Rating, List[Token]], None, None]:
         """
         Opinions found in ``text``. This yields an opinion for each sent in text.
 
@@ -325,11 +974,52 @@ class OpinionMiner:
         first sentence with a rating does not have another topic. This is
         useful if ``text`` is an answer to a question about a certain topic,
         for example: "How did you like the wine?" - "It was too warm."
+
+        If ``lexicon`` is specified, it is used instead of the lexicon of the
+        miner.
         """
-        assert text is not None
+        yield from self.opinions_of_document(self.parsed(text), expected_topic, lexicon)
 
-        _log.info('preprocessing text')
-        document = self.nlp(self._preprocessed_text(text))
+    def opinion_records(self, text: str, expected_topic=None, lexicon: Lexicon=None,
+                        with_token_indices: bool=False) -> Generator[OpinionRecord, None, None]:
+        """
+        Same as :py:meth:`opinions` but yielding an :py:class:`OpinionRecord`
+        for each sentence, which does not keep the parsed ``text`` alive.
+        If ``with_token_indices`` is set, each record includes the indices
+        of the tokens that contributed to the opinion.
+        """
+        yield from self.opinion_records_of_document(
+            self.parsed(text), expected_topic, lexicon, with_token_indices, text)
+
+    def opinion_records_of_document(self, document: Doc, expected_topic=None, lexicon: Lexicon=None,
+                                    with_token_indices: bool=False, original_text: str=None) \
+            -> Generator[OpinionRecord, None, None]:
+        """
+        Same as :py:meth:`opinion_records` but for a ``document`` like
+        :py:meth:`opinions_of_document` takes. If ``original_text`` is
+        specified and differs from the text of ``document``, for example
+        because idioms have been replaced by :py:meth:`parsed`, the records
+        have no offsets.
+        """
+        has_original_offsets = original_text is None or original_text == document.text
+        for topic, rating, sent in self.opinions_of_document(document, expected_topic, lexicon):
+            yield opinion_record(topic, rating, sent, with_token_indices, has_original_offsets)
+
+    def opinions_of_document(self, document: Doc, expected_topic=None, lexicon: Lexicon=None) \
+            -> Generator[Tuple[Enum, Rating, List[Token]], None, None]:
+        """
+        Same as :py:meth:`opinions` but for a ``document`` obtained from
+        :py:meth:`parsed` or a :py:class:`shapiro.pretokenized.PretokenizedDoc`.
+        This allows to parse a text once and find the opinions for multiple
+        lexicons, for example one for each tenant. Because the lexicon
+        related information is stored in the tokens, the opinions of a
+        lexicon must be processed before the document is used with the next
+        lexicon.
+        """
+        assert document is not None
+
+        with self.stats.measured('annotate'):
+            self.annotate(document, lexicon)
         previous_topic = expected_topic
         for sent in document.sents:
             _log.info('analyzing: %s', str(sent).strip())
@@ -343,7 +1033,8 @@ class OpinionMiner:
 
     def _preprocessed_text(self, text: str) -> str:
         result = text
-        result = replaced_idioms(result, self._idiom_to_localized_rating_text_map)
+        if self.idiom_matching == IDIOM_MATCHING_TEXT:
+            result = replaced_idioms(result, self._idiom_to_localized_rating_text_map)
         return result
 
     def _topic_and_rating_of(self, tokens: List[Token]) -> Tuple[Enum, Rating]:
@@ -351,8 +1042,10 @@ class OpinionMiner:
 
         result_topic = None
         result_rating = None
-        opinion_essence = OpinionMiner._essential_tokens(tokens)
-        self._combine_ratings(opinion_essence)
+        with self.stats.measured('essential_tokens'):
+            opinion_essence = OpinionMiner._essential_tokens(tokens)
+        with self.stats.measured('combine_ratings'):
+            self._combine_ratings(opinion_essence)
         for token in opinion_essence:
             _log.debug('  using token for opinion: %s', debugged_token(token))
             # print(debugged_token(token))
@@ -401,22 +1094,29 @@ class OpinionMiner:
             modified = True  # Did the last iteration modify anything?
             while modified and modifier_token_index >= 0:
                 modifier_token = tokens[modifier_token_index]
-                if self.language_sentiment.is_intensifier(modifier_token):
+                if modifier_token._.is_intensifier:
                     combined_rating = self.language_sentiment.intensified(combined_rating)
-                elif self.language_sentiment.is_diminisher(modifier_token):
+                elif modifier_token._.is_diminisher:
                     combined_rating = self.language_sentiment.diminished(combined_rating)
-                elif self.language_sentiment.is_negation(modifier_token):
+                elif modifier_token._.is_negation:
                     combined_rating = negated_rating(combined_rating)
                 else:
                     # We are done, no more modifiers
                     # to the left of this rating.
                     modified = False
                 if modified:
+                    # A modifier consisting of multiple tokens counts as one,
+                    # so find its first token.
+                    modifier_start_index = modifier_token_index
+                    while modifier_start_index > 0 and tokens[modifier_start_index]._.is_modifier_continuation:
+                        modifier_start_index -= 1
+                    modifier_text = ' '.join(
+                        token.text for token in tokens[modifier_start_index:modifier_token_index + 1])
                     # Discard the current modifier
                     # and move on to the token on the left.
-                    combined_text = modifier_token.text + '+' + combined_text
-                    del tokens[modifier_token_index]
-                    modifier_token_index -= 1
+                    combined_text = modifier_text + '+' + combined_text
+                    del tokens[modifier_start_index:modifier_token_index + 1]
+                    modifier_token_index = modifier_start_index - 1
                     _log.debug('  combining %s and %s to %s -> %s',
-                               modifier_token, original_rating_token.text, combined_text, combined_rating.name)
+                               modifier_text, original_rating_token.text, combined_text, combined_rating.name)
             original_rating_token._.rating = combined_rating
@@ -0,0 +1,201 @@
+"""
+Checkpoints that allow to resume a long running analysis after it has been
+interrupted, for example by a crash or a preempted machine.
+
+A checkpoint records the number of documents whose opinions have been
+written and the size of the output at that point. Documents are analyzed
+and written in the order they are read, so on resume the output is truncated
+to this size and analysis continues with the next document, without
+duplicating or losing opinions.
+
+The checkpoint is stored as JSON and replaced atomically, so it always
+describes a consistent state even if the process is killed while writing it.
+"""
+import json
+import os
+from typing import Iterable, Optional, Sequence
+
+from shapiro import tools
+from shapiro.common import OpinionError
+from shapiro.documents import Document
+from shapiro.output import OpinionWriter
+
+_log = tools.log
+
+#: Number of documents after which a new checkpoint is written.
+DEFAULT_CHECKPOINT_INTERVAL = 10000
+
+#: Value of the "format" field identifying a checkpoint.
+_CHECKPOINT_FORMAT = 'shapiro-analysis-checkpoint'
+
+#: Version of the checkpoint format.
+_CHECKPOINT_VERSION = 1
+
+#: Encoding of the JSON stored in a checkpoint file.
+_CHECKPOINT_ENCODING = 'utf-8'
+
+
+class AnalysisCheckpoint:
+    """
+    Progress of analyzing the documents in ``text_to_analyze_paths`` and
+    writing their opinions to ``output_path``: the opinions of the first
+    ``document_count`` documents are stored in the first ``output_size``
+    bytes of the output.
+    """
+    def __init__(self, text_to_analyze_paths: Sequence[str], output_path: str, document_count: int=0,
+                 output_size: int=0, opinion_count: int=0):
+        assert text_to_analyze_paths is not None
+        assert output_path is not None
+        assert document_count >= 0
+        assert output_size >= 0
+        assert opinion_count >= 0
+        self.text_to_analyze_paths = list(text_to_analyze_paths)
+        self.output_path = output_path
+        self.document_count = document_count
+        self.output_size = output_size
+        self.opinion_count = opinion_count
+
+    def check_can_resume(self, text_to_analyze_paths: Sequence[str], output_path: str):
+        """
+        Raise :py:exc:`shapiro.common.OpinionError` if the analysis of
+        ``text_to_analyze_paths`` to ``output_path`` cannot continue from
+        this checkpoint.
+        """
+        if list(text_to_analyze_paths) != self.text_to_analyze_paths:
+            raise OpinionError('files to analyze must be the same as for the checkpoint but are %s instead of %s'
+                               % (list(text_to_analyze_paths), self.text_to_analyze_paths))
+        if output_path != self.output_path:
+            raise OpinionError('output must be the same as for the checkpoint but is %r instead of %r'
+                               % (output_path, self.output_path))
+        actual_output_size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        if actual_output_size < self.output_size:
+            raise OpinionError('output "%s" must have at least %d bytes to resume from the checkpoint but has %d'
+                               % (output_path, self.output_size, actual_output_size))
+
+    def __str__(self) -> str:
+        return 'AnalysisCheckpoint(document_count=%d, output_size=%d, opinion_count=%d)' % (
+            self.document_count, self.output_size, self.opinion_count)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def write_checkpoint(checkpoint_path: str, checkpoint: AnalysisCheckpoint):
+    """
+    Write ``checkpoint`` to ``checkpoint_path``. The file is replaced
+    atomically, so ``checkpoint_path`` is either left unchanged or contains
+    the complete new checkpoint, even if the process is interrupted.
+    """
+    assert checkpoint_path is not None
+    assert checkpoint is not None
+
+    checkpoint_map = {
+        'format': _CHECKPOINT_FORMAT,
+        'version': _CHECKPOINT_VERSION,
+        'text_to_analyze_paths': checkpoint.text_to_analyze_paths,
+        'output_path': checkpoint.output_path,
+        'document_count': checkpoint.document_count,
+        'output_size': checkpoint.output_size,
+        'opinion_count': checkpoint.opinion_count,
+    }
+    temp_checkpoint_path = checkpoint_path + '.tmp'
+    with open(temp_checkpoint_path, 'w', encoding=_CHECKPOINT_ENCODING) as checkpoint_file:
+        json.dump(checkpoint_map, checkpoint_file, ensure_ascii=False)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temp_checkpoint_path, checkpoint_path)
+
+
+def read_checkpoint(checkpoint_path: str) -> AnalysisCheckpoint:
+    """
+    Checkpoint previously written to ``checkpoint_path`` using
+    :py:func:`write_checkpoint`.
+    """
+    assert checkpoint_path is not None
+
+    with open(checkpoint_path, encoding=_CHECKPOINT_ENCODING) as checkpoint_file:
+        try:
+            checkpoint_map = json.load(checkpoint_file)
+        except ValueError as error:
+            raise OpinionError('%s: cannot read checkpoint: %s' % (checkpoint_path, error))
+    if not isinstance(checkpoint_map, dict) or checkpoint_map.get('format') != _CHECKPOINT_FORMAT:
+        raise OpinionError('%s: file must contain a checkpoint' % checkpoint_path)
+    version = checkpoint_map.get('version')
+    if version != _CHECKPOINT_VERSION:
+        raise OpinionError('%s: version of checkpoint must be %d but is: %r'
+                           % (checkpoint_path, _CHECKPOINT_VERSION, version))
+    return AnalysisCheckpoint(
+        checkpoint_map['text_to_analyze_paths'], checkpoint_map['output_path'], checkpoint_map['document_count'],
+        checkpoint_map['output_size'], checkpoint_map['opinion_count'])
+
+
+def truncate_output_to_checkpoint(checkpoint: AnalysisCheckpoint):
+    """
+    Remove opinions that have been written to the output after
+    ``checkpoint`` and consequently will be written again when resuming.
+    """
+    assert checkpoint is not None
+
+    if os.path.exists(checkpoint.output_path):
+        removed_size = os.path.getsize(checkpoint.output_path) - checkpoint.output_size
+        if removed_size > 0:
+            _log.info('removing %d bytes written to "%s" after the checkpoint', removed_size, checkpoint.output_path)
+        os.truncate(checkpoint.output_path, checkpoint.output_size)
+    else:
+        assert checkpoint.output_size == 0, 'checkpoint=%s' % checkpoint
+        # Create the output so it can be appended to.
+        open(checkpoint.output_path, 'wb').close()
+
+
+def documents_after_checkpoint(documents: Iterable[Document], checkpoint: Optional[AnalysisCheckpoint]) \
+        -> Iterable[Document]:
+    """
+    Those ``documents`` that have not been analyzed yet according to
+    ``checkpoint``, or all of them if ``checkpoint`` is ``None``.
+    """
+    return documents if checkpoint is None \
+        else (document for document in documents if document.index >= checkpoint.document_count)
+
+
+class Checkpointer:
+    """
+    Writes a checkpoint to ``checkpoint_path`` after each ``interval``
+    documents whose opinions have been written to ``writer``. If the
+    analysis is resumed, ``checkpoint`` is the checkpoint to continue from.
+    """
+    def __init__(self, checkpoint_path: str, writer: OpinionWriter, checkpoint: AnalysisCheckpoint,
+                 interval: int=DEFAULT_CHECKPOINT_INTERVAL):
+        assert checkpoint_path is not None
+        assert writer is not None
+        assert checkpoint is not None
+        assert interval >= 1
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = checkpoint
+        self._writer = writer
+        self._interval = interval
+        self._opinion_count_before_resume = checkpoint.opinion_count
+        self._unsaved_document_count = 0
+
+    def document_written(self, document: Document):
+        """
+        Remember that all opinions of ``document`` have been passed to the
+        writer, and write a new checkpoint if the interval is reached.
+        """
+        assert document.index == self.checkpoint.document_count + self._unsaved_document_count, \
+            'documents must be written in order: document.index=%d, checkpoint=%s' % (document.index, self.checkpoint)
+        self._unsaved_document_count += 1
+        if self._unsaved_document_count >= self._interval:
+            self.save()
+
+    def save(self):
+        """
+        Write all buffered opinions to the output and a checkpoint referring
+        to them.
+        """
+        self._writer.sync()
+        self.checkpoint.document_count += self._unsaved_document_count
+        self.checkpoint.output_size = os.path.getsize(self.checkpoint.output_path)
+        self.checkpoint.opinion_count = self._opinion_count_before_resume + self._writer.opinion_count
+        _log.info('writing checkpoint after %d documents to "%s"', self.checkpoint.document_count, self.checkpoint_path)
+        write_checkpoint(self.checkpoint_path, self.checkpoint)
+        self._unsaved_document_count = 0
@@ -0,0 +1,397 @@
+"""
+Columnar binary output of opinions that analytics tools can load (or memory
+map) without having to parse text.
+
+Topics and ratings are stored as small integer codes together with a
+dictionary of their names. Two layouts are available:
+
+* `Apache Arrow IPC <https://arrow.apache.org/docs/format/Columnar.html>`_
+  files, which require the optional package ``pyarrow``.
+* A folder with a NumPy ``.npy`` file for each column, which only requires
+  NumPy.
+"""
+import io
+import os
+from array import array
+from enum import Enum
+from typing import Any, Dict, Generator, List, Sequence
+
+import numpy as np
+
+from shapiro.common import OpinionError, Rating
+from shapiro.output import OpinionWriter
+
+#: Number of opinions collected before they are converted to columns.
+DEFAULT_BATCH_SIZE = 65536
+
+#: Code used for missing topics, ratings, document indices and offsets.
+MISSING_CODE = -1
+
+#: Encoding used for texts in ``.npy`` columns.
+_NPY_TEXT_ENCODING = 'utf-8'
+
+#: Prefix for ``.npy`` files storing codes of key columns.
+_NPY_KEY_PREFIX = 'key_'
+
+#: Suffix for ``.npy`` files storing the distinct values of key columns.
+_NPY_KEY_VALUES_SUFFIX = '_values'
+
+#: Suffix of the files in a folder written by :py:class:`NpyOpinionWriter`.
+_NPY_SUFFIX = '.npy'
+
+
+def enum_names(enum_type: Enum) -> List[str]:
+    """
+    Lower case names of ``enum_type`` in the order of the enum entries. The
+    index of a name in the result is the code used for the enum entry.
+    """
+    return [enum_entry.name.lower() for enum_entry in enum_type]
+
+
+class ColumnarOpinionWriter(OpinionWriter):
+    """
+    Writer for opinions that collects them in typed columns and passes them
+    to :py:meth:`_write_batch` each ``batch_size`` opinions.
+    """
+    def __init__(self, target_path: str, topic_type: Enum, rating_type: Enum=Rating,
+                 key_names: Sequence[str]=(), batch_size: int=DEFAULT_BATCH_SIZE):
+        assert target_path is not None
+        assert topic_type is not None
+        assert rating_type is not None
+        assert batch_size >= 1
+
+        super().__init__(key_names)
+        self.target_path = target_path
+        self.topic_names = enum_names(topic_type)
+        self.rating_names = enum_names(rating_type)
+        self._topic_to_code_map = {topic: code for code, topic in enumerate(topic_type)}
+        self._rating_to_code_map = {rating: code for code, rating in enumerate(rating_type)}
+        self._batch_size = batch_size
+        self._is_closed = False
+        self._clear_batch()
+
+    def _clear_batch(self):
+        self._topic_codes = array('b')
+        self._rating_codes = array('b')
+        self._document_indices = array('q')
+        self._starts = array('q')
+        self._ends = array('q')
+        self._texts = []
+        self._key_columns = [[] for _ in self.key_names]
+
+    def _write_opinion(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str],
+                       document_index: int, start: int, end: int):
+        def code_or_missing(value):
+            return value if value is not None else MISSING_CODE
+
+        self._topic_codes.append(self._topic_to_code_map[topic] if topic is not None else MISSING_CODE)
+        self._rating_codes.append(self._rating_to_code_map[rating] if rating is not None else MISSING_CODE)
+        self._document_indices.append(code_or_missing(document_index))
+        self._starts.append(code_or_missing(start))
+        self._ends.append(code_or_missing(end))
+        self._texts.append(text)
+        for key_column, key in zip(self._key_columns, keys):
+            key_column.append(key)
+        if len(self._texts) >= self._batch_size:
+            self.flush()
+
+    def _write_batch(self):
+        raise NotImplementedError()
+
+    def _finish(self):
+        """
+        Write everything that has to follow the last batch and close the
+        target file.
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        if len(self._texts) != 0:
+            self._write_batch()
+            self._clear_batch()
+
+    def close(self):
+        if not self._is_closed:
+            self._is_closed = True
+            self.flush()
+            self._finish()
+
+
+class _NpyColumnFile:
+    """
+    One-dimensional ``.npy`` file of ``dtype`` at ``path`` that values are
+    appended to as they arrive. The header is written with the final number
+    of values on :py:meth:`close`; until then the file is a valid empty
+    array.
+    """
+    def __init__(self, path: str, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.value_count = 0
+        self._file = open(path, 'wb')
+        self._header_size = self._write_header()
+
+    def _write_header(self) -> int:
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (self.value_count,),
+        })
+        self._file.write(header.getvalue())
+        return len(header.getvalue())
+
+    def append(self, values: np.ndarray):
+        assert values.dtype == self.dtype, 'values.dtype=%s, dtype=%s' % (values.dtype, self.dtype)
+        self._file.write(values.tobytes())
+        self.value_count += len(values)
+
+    def flush(self):
+        self._file.flush()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        try:
+            self._file.seek(0)
+            # NOTE: NumPy pads the header to a multiple of 64 bytes, so for one-dimensional arrays the
+            # header size does not depend on the number of values and can be replaced in place.
+            header_size = self._write_header()
+            assert header_size == self._header_size, \
+                'header_size=%d, self._header_size=%d' % (header_size, self._header_size)
+        finally:
+            self._file.close()
+
+
+class NpyOpinionWriter(ColumnarOpinionWriter):
+    """
+    Writer for opinions to a folder ``target_path`` with one NumPy ``.npy``
+    file for each of the following columns:
+
+    * ``topic`` and ``rating``: ``int8`` codes (-1 = none) referring to the
+      names in ``topic_names`` and ``rating_names``
+    * ``document_index``, ``start`` and ``end``: ``int64`` document index and
+      character offsets of the text within the document (-1 = unknown, for
+      example because idioms have been replaced in the text before parsing)
+    * ``text_data`` and ``text_offsets``: the UTF-8 encoded texts of all
+      opinions concatenated to ``uint8`` and ``int64`` offsets to the start
+      of each text with one additional offset for the end of the last text
+    * ``key_<name>`` and ``key_<name>_values``: ``int32`` codes and distinct
+      values for each key column
+    * ``key_names``: the names of the key columns
+
+    Each batch is appended to the files right away, so memory does not grow
+    with the number of opinions, except for the distinct key values. All
+    arrays have fixed size types, so they can be memory mapped using
+    ``numpy.load(path, mmap_mode='r')``, see :py:func:`npy_column`. Use
+    :py:func:`read_npy_opinions` to read the opinions one by one.
+    """
+    def __init__(self, target_path: str, topic_type: Enum, rating_type: Enum=Rating,
+                 key_names: Sequence[str]=(), batch_size: int=DEFAULT_BATCH_SIZE):
+        super().__init__(target_path, topic_type, rating_type, key_names, batch_size)
+        os.makedirs(target_path, exist_ok=True)
+        self._column_files = []
+
+        def column_file(column_name: str, dtype) -> _NpyColumnFile:
+            result = _NpyColumnFile(_npy_column_path(target_path, column_name), dtype)
+            self._column_files.append(result)
+            return result
+
+        try:
+            self._topic_file = column_file('topic', np.int8)
+            self._rating_file = column_file('rating', np.int8)
+            self._document_index_file = column_file('document_index', np.int64)
+            self._start_file = column_file('start', np.int64)
+            self._end_file = column_file('end', np.int64)
+            self._text_data_file = column_file('text_data', np.uint8)
+            self._text_offsets_file = column_file('text_offsets', np.int64)
+            self._key_files = [column_file(_NPY_KEY_PREFIX + key_name, np.int32) for key_name in self.key_names]
+        except Exception:
+            self._close_column_files()
+            raise
+        self._text_offsets_file.append(np.zeros(1, dtype=np.int64))
+        self._key_value_to_code_maps = [{} for _ in self.key_names]
+
+    def _write_batch(self):
+        self._topic_file.append(np.frombuffer(self._topic_codes, dtype=np.int8))
+        self._rating_file.append(np.frombuffer(self._rating_codes, dtype=np.int8))
+        self._document_index_file.append(np.frombuffer(self._document_indices, dtype=np.int64))
+        self._start_file.append(np.frombuffer(self._starts, dtype=np.int64))
+        self._end_file.append(np.frombuffer(self._ends, dtype=np.int64))
+        encoded_texts = [text.encode(_NPY_TEXT_ENCODING) for text in self._texts]
+        text_lengths = np.fromiter(
+            (len(encoded_text) for encoded_text in encoded_texts), dtype=np.int64, count=len(encoded_texts))
+        self._text_offsets_file.append(self._text_data_file.value_count + np.cumsum(text_lengths))
+        self._text_data_file.append(np.frombuffer(b''.join(encoded_texts), dtype=np.uint8))
+        for key_column, key_value_to_code_map, key_file in zip(
+                self._key_columns, self._key_value_to_code_maps, self._key_files):
+            key_codes = array('l')
+            for key in key_column:
+                key_code = key_value_to_code_map.get(key)
+                if key_code is None:
+                    key_code = len(key_value_to_code_map)
+                    key_value_to_code_map[key] = key_code
+                key_codes.append(key_code)
+            key_file.append(np.array(key_codes, dtype=np.int32))
+
+    def flush(self):
+        super().flush()
+        for column_file in self._column_files:
+            column_file.flush()
+
+    def sync(self):
+        super().flush()
+        for column_file in self._column_files:
+            column_file.sync()
+
+    def _close_column_files(self):
+        for column_file in self._column_files:
+            column_file.close()
+
+    def _finish(self):
+        self._close_column_files()
+
+        def save(column_name: str, values: np.ndarray):
+            np.save(_npy_column_path(self.target_path, column_name), values)
+
+        save('topic_names', np.array(self.topic_names, dtype=str))
+        save('rating_names', np.array(self.rating_names, dtype=str))
+        save('key_names', np.array(self.key_names, dtype=str))
+        for key_name, key_value_to_code_map in zip(self.key_names, self._key_value_to_code_maps):
+            save(_NPY_KEY_PREFIX + key_name + _NPY_KEY_VALUES_SUFFIX,
+                 np.array(list(key_value_to_code_map.keys()), dtype=str))
+
+
+def _npy_column_path(folder: str, column_name: str) -> str:
+    return os.path.join(folder, column_name + _NPY_SUFFIX)
+
+
+def npy_column(source_folder: str, column_name: str) -> np.ndarray:
+    """
+    The column ``column_name`` of the opinions written to ``source_folder``
+    by :py:class:`NpyOpinionWriter`, memory mapped read only so its values
+    are only loaded from disk when accessed.
+    """
+    return np.load(_npy_column_path(source_folder, column_name), mmap_mode='r')
+
+
+def read_npy_opinions(source_folder: str) -> Generator[Dict[str, Any], None, None]:
+    """
+    Opinions stored in a folder written by :py:class:`NpyOpinionWriter` as a
+    ``dict`` for each opinion with the key names, ``topic``, ``rating``,
+    ``text``, ``document_index``, ``start`` and ``end`` as keys. Missing
+    values are ``None``.
+
+    This is mostly intended for testing and debugging. Analytics tools should
+    use the memory mapped arrays of :py:func:`npy_column` directly.
+    """
+    def value_or_none(value: int):
+        return int(value) if value != MISSING_CODE else None
+
+    topic_names = list(npy_column(source_folder, 'topic_names'))
+    rating_names = list(npy_column(source_folder, 'rating_names'))
+    key_names = list(npy_column(source_folder, 'key_names'))
+    key_columns = [
+        (
+            str(key_name),
+            npy_column(source_folder, _NPY_KEY_PREFIX + key_name),
+            npy_column(source_folder, _NPY_KEY_PREFIX + key_name + _NPY_KEY_VALUES_SUFFIX),
+        )
+        for key_name in key_names
+    ]
+    text_data = npy_column(source_folder, 'text_data')
+    text_offsets = npy_column(source_folder, 'text_offsets')
+    document_indices = npy_column(source_folder, 'document_index')
+    starts = npy_column(source_folder, 'start')
+    ends = npy_column(source_folder, 'end')
+    topic_codes = npy_column(source_folder, 'topic')
+    rating_codes = npy_column(source_folder, 'rating')
+    for opinion_index, (topic_code, rating_code) in enumerate(zip(topic_codes, rating_codes)):
+        result = {
+            key_name: str(key_values[key_codes[opinion_index]])
+            for key_name, key_codes, key_values in key_columns
+        }
+        result['topic'] = str(topic_names[topic_code]) if topic_code != MISSING_CODE else None
+        result['rating'] = str(rating_names[rating_code]) if rating_code != MISSING_CODE else None
+        text_start, text_end = text_offsets[opinion_index], text_offsets[opinion_index + 1]
+        result['text'] = text_data[text_start:text_end].tobytes().decode(_NPY_TEXT_ENCODING)
+        result['document_index'] = value_or_none(document_indices[opinion_index])
+        result['start'] = value_or_none(starts[opinion_index])
+        result['end'] = value_or_none(ends[opinion_index])
+        yield result
+
+
+def _pyarrow():
+    """
+    The ``pyarrow`` module, which is an optional dependency.
+    """
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise OpinionError(
+            'to write Apache Arrow files the package "pyarrow" must be installed '
+            '(alternatively use the npy format): %s' % error)
+    return pyarrow
+
+
+class ArrowOpinionWriter(ColumnarOpinionWriter):
+    """
+    Writer for opinions to an Apache Arrow IPC file with one record batch
+    for each ``batch_size`` opinions. The key columns and the text are
+    stored as strings; topic and rating are dictionary encoded with ``int8``
+    indices and missing values are null.
+
+    The result can be memory mapped with ``pyarrow.memory_map()`` and read
+    with ``pyarrow.ipc.open_file()``.
+    """
+    def __init__(self, target_path: str, topic_type: Enum, rating_type: Enum=Rating,
+                 key_names: Sequence[str]=(), batch_size: int=DEFAULT_BATCH_SIZE):
+        self._pa = _pyarrow()
+        super().__init__(target_path, topic_type, rating_type, key_names, batch_size)
+        pa = self._pa
+        self._topic_dictionary = pa.array(self.topic_names, type=pa.string())
+        self._rating_dictionary = pa.array(self.rating_names, type=pa.string())
+        dictionary_type = pa.dictionary(pa.int8(), pa.string())
+        self._schema = pa.schema(
+            [pa.field(key_name, pa.string()) for key_name in self.key_names] + [
+                pa.field('document_index', pa.int64()),
+                pa.field('start', pa.int64()),
+                pa.field('end', pa.int64()),
+                pa.field('topic', dictionary_type),
+                pa.field('rating', dictionary_type),
+                pa.field('text', pa.string()),
+            ])
+        self._target_file = pa.OSFile(target_path, 'wb')
+        try:
+            self._ipc_writer = pa.ipc.new_file(self._target_file, self._schema)
+        except Exception:
+            self._target_file.close()
+            raise
+
+    def _write_batch(self):
+        pa = self._pa
+
+        def arrow_array(values: array, dtype, arrow_type):
+            numpy_values = np.frombuffer(values, dtype=dtype)
+            return pa.array(numpy_values, type=arrow_type, mask=(numpy_values == MISSING_CODE))
+
+        def dictionary_array(codes: array, dictionary):
+            return pa.DictionaryArray.from_arrays(arrow_array(codes, np.int8, pa.int8()), dictionary)
+
+        columns = [pa.array(key_column, type=pa.string()) for key_column in self._key_columns] + [
+            arrow_array(self._document_indices, np.int64, pa.int64()),
+            arrow_array(self._starts, np.int64, pa.int64()),
+            arrow_array(self._ends, np.int64, pa.int64()),
+            dictionary_array(self._topic_codes, self._topic_dictionary),
+            dictionary_array(self._rating_codes, self._rating_dictionary),
+            pa.array(self._texts, type=pa.string()),
+        ]
+        self._ipc_writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self._schema))
+
+    def _finish(self):
+        try:
+            self._ipc_writer.close()
+        finally:
+            self._target_file.close()
@@ -1,20 +1,49 @@
 """
 The ``shapiro`` command line command.
+
+To start quickly, modules depending on spaCy are only imported by the
+commands that actually need them.
 """
 import argparse
 import logging
+import os
 import sys
-from typing import Sequence
-
-import spacy
-from shapiro import __version__, analysis, tools
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from shapiro import __version__, daemon, memory, models, profiling, tools
+from shapiro.aggregation import TIME_WINDOW_NAMES, AggregatingOpinionWriter, TimeWindow
+from shapiro.checkpoint import (DEFAULT_CHECKPOINT_INTERVAL, AnalysisCheckpoint, Checkpointer,
+                                documents_after_checkpoint, read_checkpoint, truncate_output_to_checkpoint)
 from shapiro.common import Rating, RestaurantTopic
+from shapiro.countstate import (LemmaCountState, merged_lemma_count_state, most_common_counts,
+                                read_lemma_count_state, write_lemma_count_state)
+from shapiro.detection import AUTO_LANGUAGE, LanguageDetector, detectable_language_codes, language_detector_for
+from shapiro.documents import (Document, csv_key_names, documents_from_csv_files,
+                               documents_from_text_files, documents_from_texts)
 from shapiro.language import language_sentiment_for
-from spacy.language import Language
+from shapiro.output import (OUTPUT_FORMAT_NAMES, STDOUT_PATH, OpinionWriter,
+                            OutputFormat, can_append, opinion_writer, output_format_for)
+from shapiro.pretokenized import (DOCUMENT_ID_KEY_NAME, PRETOKENIZED_FORMATS, PretokenizedDocument,
+                                  documents_from_pretokenized_files)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from shapiro.analysis import OpinionMiner, OpinionRecord
+    from spacy.language import Language
 
 _DEFAULT_ENCODING = 'utf-8'
 _DEFAULT_NUMBER_OF_LEMMAS_TO_PRINT = 20
 
+# NOTE: Same as shapiro.analysis.IDIOM_MATCHINGS, which cannot be imported here because it would import spaCy.
+_IDIOM_MATCHINGS = ('text', 'tokens')
+
+# Part of LEXICON-FILE to replace by the language code of the documents analyzed with it.
+_LANGUAGE_PLACEHOLDER = '{language}'
+
+# Number of documents to detect the language of and to parse at once with --language=auto.
+_AUTO_LANGUAGE_BATCH_SIZE = 1000
+
 _log = tools.log
 
 
@@ -28,17 +57,64 @@ def parsed_args(arguments: Sequence[str]):
 
     parser_analyze = subparsers.add_parser(
         'analyze', help='extract opinions from a text')
+    parser_analyze.add_argument(
+        '--aggregate', '-a', action='store_true',
+        help='instead of each opinion write the rating distribution for each combination of keys, '
+             'time window and topic')
+    parser_analyze.add_argument(
+        '--checkpoint', '-c', dest='checkpoint_path', metavar='CHECKPOINT-FILE',
+        help='regularly store the progress in CHECKPOINT-FILE so an interrupted analysis can continue using '
+             '--resume; requires --output with format csv or jsonl')
+    parser_analyze.add_argument(
+        '--checkpoint-interval', type=int, default=DEFAULT_CHECKPOINT_INTERVAL, metavar='NUMBER',
+        help='store the progress after each NUMBER documents; default: %(default)s')
     _add_debug_argument(parser_analyze)
     parser_analyze.add_argument(
         '--encoding', '-e', default=_DEFAULT_ENCODING,
         help='encoding of TEXT-FILE, default: %(default)s')
-    _add_language_argument(parser_analyze)
+    parser_analyze.add_argument(
+        '--format', '-f', dest='output_format', choices=OUTPUT_FORMAT_NAMES,
+        help='format of the output; default: derived from suffix of --output, otherwise csv')
+    parser_analyze.add_argument(
+        '--idiom-matching', choices=_IDIOM_MATCHINGS,
+        help='match idioms by replacing them in the text before parsing it or by comparing them with the tokens '
+             'of the parsed text, which keeps the text unchanged; default: text, with --pretokenized: tokens')
+    _add_language_argument(parser_analyze, can_detect=True)
     parser_analyze.add_argument(
         '--immediately', '-i', action='store_true',
         help='interpret TEXT-FILE as immediate text instead of path to file')
+    parser_analyze.add_argument(
+        '--key-columns', '-k', dest='key_column_numbers', type=_column_numbers, default=[], metavar='NUMBERS',
+        help='comma separated column NUMBERS (starting with 1) of CSV TEXT-FILE to pass through to the output; '
+             'requires --text-column')
+    parser_analyze.add_argument(
+        '--output', '-o', dest='output_path', default=STDOUT_PATH, metavar='OUTPUT-FILE',
+        help='file to write opinions to, "-"=standard output; '
+             'a suffix of ".gz" compresses the output; default: %(default)s')
+    parser_analyze.add_argument(
+        '--pretokenized', '-p', dest='pretokenized_format', choices=PRETOKENIZED_FORMATS,
+        help='interpret TEXT-FILE as already tokenized, lemmatized and tagged sentences in this format '
+             'and analyze them without parsing')
+    _add_profile_arguments(parser_analyze)
+    parser_analyze.add_argument(
+        '--resume', '-r', action='store_true',
+        help='continue the analysis from the progress stored in CHECKPOINT-FILE if it exists; '
+             'requires --checkpoint')
+    parser_analyze.add_argument(
+        '--text-column', '-t', dest='text_column_number', type=_column_number, metavar='NUMBER',
+        help='interpret TEXT-FILE as CSV file and analyze the text in column NUMBER (starting with 1) of each row')
+    parser_analyze.add_argument(
+        '--time-column', '-T', dest='time_column_number', type=_column_number, metavar='NUMBER',
+        help='column NUMBER (starting with 1) of CSV TEXT-FILE with an ISO 8601 time stamp to aggregate by '
+             'using --window; requires --aggregate and --text-column')
+    parser_analyze.add_argument(
+        '--window', '-w', dest='time_window', choices=TIME_WINDOW_NAMES, default=TimeWindow.DAY.value,
+        help='tumbling time window to aggregate by; default: %(default)s')
     parser_analyze.add_argument(
         'lexicon_csv_path', metavar='LEXICON-FILE',
-        help='CSV file with lexicon to use for analysis')
+        help='CSV file with lexicon to use for analysis; %s is replaced by the language code, which allows '
+             'to use a different lexicon for each language with --language=%s'
+             % (_LANGUAGE_PLACEHOLDER, AUTO_LANGUAGE))
     parser_analyze.add_argument(
         'text_to_analyze_paths', metavar='TEXT-FILE', nargs='+', help='text file(s) to analyze')
     parser_analyze.set_defaults(func=command_analyze)
@@ -49,6 +125,18 @@ def parsed_args(arguments: Sequence[str]):
     parser_count.add_argument(
         '--encoding', '-e', default=_DEFAULT_ENCODING,
         help='encoding of TEXT-FILE, default: %(default)s')
+    parser_count.add_argument(
+        '--jobs', '-j', type=int, default=1,
+        help='number of worker processes counting in parallel, 0=number of CPUs; default: %(default)s')
+    parser_count.add_argument(
+        '--load-state', '-L', dest='load_state_paths', action='append', default=[], metavar='STATE-FILE',
+        help='add the counts stored in STATE-FILE, for example by previous runs with --save-state; '
+             'can be specified multiple times')
+    parser_count.add_argument(
+        '--max-lemmas', '-m', dest='capacity', type=int, metavar='NUMBER',
+        help='keep at most NUMBER lemmas in memory and count approximately; '
+             'counts might be too high by at most the number of lemmas in TEXT-FILE divided by NUMBER; '
+             'default: count all lemmas exactly')
     parser_count.add_argument(
         '--number', '-n', type=int, default=_DEFAULT_NUMBER_OF_LEMMAS_TO_PRINT,
         help='number of most common lemmas to print, 0=all, default: %(default)s')
@@ -57,6 +145,10 @@ def parsed_args(arguments: Sequence[str]):
         help='enable to include part of speech tag in output; '
              'consequently words might show multiple time, '
              'e.g. "pretty" as ADJ and ADV')
+    _add_profile_arguments(parser_count)
+    parser_count.add_argument(
+        '--save-state', '-S', dest='save_state_path', metavar='STATE-FILE',
+        help='store the counts in STATE-FILE so they can be added to later using --load-state or merge-counts')
     parser_count.add_argument(
         '--stopwords', '-s', dest='count_stopwords', action='store_true',
         help='enable to also count stopwords')
@@ -64,9 +156,90 @@ def parsed_args(arguments: Sequence[str]):
         'text_to_analyze_path', metavar='TEXT-FILE')
     parser_count.set_defaults(func=command_count)
 
+    parser_merge_counts = subparsers.add_parser(
+        'merge-counts', help='print most common lemmas of multiple counts stored with "count --save-state"')
+    parser_merge_counts.add_argument(
+        '--number', '-n', type=int, default=_DEFAULT_NUMBER_OF_LEMMAS_TO_PRINT,
+        help='number of most common lemmas to print, 0=all, default: %(default)s')
+    parser_merge_counts.add_argument(
+        '--save-state', '-S', dest='save_state_path', metavar='STATE-FILE',
+        help='store the merged counts in STATE-FILE')
+    parser_merge_counts.add_argument(
+        'state_paths', metavar='STATE-FILE', nargs='+', help='file(s) with counts to merge')
+    parser_merge_counts.set_defaults(func=command_merge_counts)
+
+    parser_memory = subparsers.add_parser(
+        'memory', help='print how much memory lexicon, language model and other components need')
+    parser_memory.add_argument(
+        '--encoding', '-e', default=_DEFAULT_ENCODING,
+        help='encoding of LEXICON-FILE and TEXT-FILE, default: %(default)s')
+    parser_memory.add_argument(
+        '--interval', '-i', dest='rss_interval', type=int, default=memory.DEFAULT_RSS_INTERVAL, metavar='NUMBER',
+        help='print the peak memory after each NUMBER documents; default: %(default)s')
+    _add_language_argument(parser_memory)
+    parser_memory.add_argument(
+        '--top', '-t', dest='top_type_count', type=int, default=memory.DEFAULT_TOP_TYPE_COUNT, metavar='NUMBER',
+        help='number of types of objects to print for each component; default: %(default)s')
+    parser_memory.add_argument(
+        'lexicon_csv_path', metavar='LEXICON-FILE',
+        help='CSV file with lexicon to measure')
+    parser_memory.add_argument(
+        'text_to_analyze_paths', metavar='TEXT-FILE', nargs='*',
+        help='text file(s) with one document per line to analyze while tracking the peak memory')
+    parser_memory.set_defaults(func=command_memory)
+
+    parser_daemon = subparsers.add_parser(
+        'daemon', help='keep language models and lexicons loaded for "analyze" and "count" until interrupted')
+    parser_daemon.add_argument(
+        '--preload', '-P', dest='preloaded_languages', action='append', default=[], metavar='LANGUAGE',
+        help='two letter ISO-639-1 language code of a spaCy model to load in advance; can be used multiple times')
+    parser_daemon.add_argument(
+        '--socket', dest='socket_path', metavar='SOCKET-FILE',
+        help='Unix domain socket to wait for commands at; default: $%s, otherwise a socket in $%s or in %s'
+             % (daemon.SOCKET_PATH_ENVIRONMENT_VARIABLE, daemon.RUNTIME_FOLDER_ENVIRONMENT_VARIABLE,
+                daemon.private_temp_folder()))
+    parser_daemon.set_defaults(func=command_daemon)
+
     result = parser.parse_args(arguments)
     if 'func' not in result:
         parser.error('COMMAND must be specified')
+    if result.func in (command_count, command_merge_counts) and result.number < 0:
+        parser.error('--number must be at least 0 but is: %d' % result.number)
+    if result.func == command_count:
+        if result.jobs < 0:
+            parser.error('--jobs must be at least 0 but is: %d' % result.jobs)
+        if result.capacity is not None and result.capacity < 1:
+            parser.error('--max-lemmas must be at least 1 but is: %d' % result.capacity)
+    if result.func == command_memory:
+        if result.rss_interval < 1:
+            parser.error('--interval must be at least 1 but is: %d' % result.rss_interval)
+        if result.top_type_count < 0:
+            parser.error('--top must be at least 0 but is: %d' % result.top_type_count)
+    if result.func == command_analyze:
+        if result.key_column_numbers and result.text_column_number is None:
+            parser.error('--key-columns requires --text-column')
+        if result.immediately and result.text_column_number is not None:
+            parser.error('--immediately cannot be combined with --text-column')
+        if result.time_column_number is not None:
+            if not result.aggregate:
+                parser.error('--time-column requires --aggregate')
+            if result.text_column_number is None:
+                parser.error('--time-column requires --text-column')
+        if result.pretokenized_format is not None:
+            if result.immediately or result.text_column_number is not None:
+                parser.error('--pretokenized cannot be combined with --immediately or --text-column')
+            if result.idiom_matching == 'text':
+                parser.error('--pretokenized requires --idiom-matching=tokens')
+        if result.resume and result.checkpoint_path is None:
+            parser.error('--resume requires --checkpoint')
+        if result.checkpoint_path is not None:
+            if result.aggregate:
+                parser.error('--checkpoint cannot be combined with --aggregate')
+            output_format = OutputFormat(result.output_format) if result.output_format is not None else None
+            if not can_append(result.output_path, output_format):
+                parser.error('--checkpoint requires --output with an uncompressed csv or jsonl file')
+        if result.checkpoint_interval < 1:
+            parser.error('--checkpoint-interval must be at least 1 but is: %d' % result.checkpoint_interval)
 
     return result
 
@@ -78,14 +251,53 @@ def _add_debug_argument(parser: argparse.ArgumentParser):
     parser.add_argument('--debug', '-D', action='store_true', help='enable debug logging')
 
 
-def _add_language_argument(parser: argparse.ArgumentParser):
+def _add_language_argument(parser: argparse.ArgumentParser, can_detect: bool=False):
     """
     Add ``--language`` to an :class:`argparse.ArgumentParser` that refers to a
     2 letter `ISO-639-1 language code <https://en.wikipedia.org/wiki/List_of_ISO_639-1_codes>`_
     for witch spacy must provide a matching :class:`spacy.language.Language`.
+    If ``can_detect`` is set, ``auto`` detects the language of each document.
+    """
+    language_help = 'two letter ISO-639-1 language code for spaCy'
+    if can_detect:
+        language_help += ' or "%s" to detect the language of each document among: %s' % (
+            AUTO_LANGUAGE, ', '.join(detectable_language_codes()))
+    parser.add_argument('--language', '-l', default='en', help=language_help + '; default: %(default)s')
+
+
+def _add_profile_arguments(parser: argparse.ArgumentParser):
+    """
+    Add ``--profile`` and ``--profile-output`` to an
+    :class:`argparse.ArgumentParser` to measure where the time goes.
+    """
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='print the time spent in each stage of the analysis and each component of the spaCy pipeline '
+             'to standard error')
+    parser.add_argument(
+        '--profile-output', dest='profile_path', metavar='PROFILE-FILE',
+        help='store cProfile data in PROFILE-FILE and collapsed stacks for flame graphs in '
+             'PROFILE-FILE%s; implies --profile' % profiling.COLLAPSED_STACKS_SUFFIX)
+
+
+def _column_number(text: str) -> int:
+    """
+    Column number starting with 1 as used by ``--text-column``.
+    """
+    try:
+        result = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError('column number must be an integer but is: %r' % text)
+    if result < 1:
+        raise argparse.ArgumentTypeError('column number must be at least 1 but is: %d' % result)
+    return result
+
+
+def _column_numbers(text: str) -> List[int]:
     """
-    parser.add_argument('--language', '-l', default='en',
-                        help='two letter ISO-639-1 language code for spaCy; default: %(default)s')
+    Comma separated column numbers as used by ``--key-columns``.
+    """
+    return [_column_number(column_number_text.strip()) for column_number_text in text.split(',')]
 
 
 def _possibly_enable_debug_logging(args: argparse.Namespace):
@@ -93,64 +305,247 @@ def _possibly_enable_debug_logging(args: argparse.Namespace):
         _log.setLevel(logging.DEBUG)
 
 
+@contextmanager
+def _possibly_profiled(args: argparse.Namespace, stats: profiling.TimingStats):
+    """
+    Context that, depending on ``--profile`` and ``--profile-output``,
+    measures ``stats`` and the code within it and prints a report
+    afterwards.
+    """
+    stats.enabled = args.profile or args.profile_path is not None
+    start_wall_time = time.perf_counter()
+    start_cpu_time = profiling.cpu_time()
+    with profiling.profiled(args.profile_path):
+        yield
+    if stats.enabled:
+        stats.write_report(
+            sys.stderr, time.perf_counter() - start_wall_time, profiling.cpu_time() - start_cpu_time)
+
+
 def command_analyze(args: argparse.Namespace):
-    def analyze(text: str):
-        for topic, rating, sent in opinion_miner.opinions(text):
-            topic_text = topic.name.lower() if topic is not None else ''
-            rating_text = rating.name.lower() if rating is not None else ''
-            sent_text = str(sent).strip()
-            # TODO: Use proper csv.writer() instead of hacked together escaping.
-            csv_escaped_sent_text = '"' + sent_text.replace('"', '""') + '"'
-            print(f'{topic_text},{rating_text},{csv_escaped_sent_text}')
-
-    nlp = _nlp(args)
-    # FIXME: Use generic topics instead of hard coded RestaurantTopic.
-    lexicon = analysis.Lexicon(RestaurantTopic, Rating)
-    lexicon.read_from_csv(args.lexicon_csv_path, encoding=args.encoding)
-    language_sentiment = language_sentiment_for(args.language)
-    opinion_miner = analysis.OpinionMiner(nlp, lexicon, language_sentiment)
+    from shapiro import analysis
+
+    analysis.add_token_extension(force=True)
+    stats = profiling.TimingStats()
+    language_code_to_opinion_miner_map: Dict[str, 'OpinionMiner'] = {}
+
+    def opinion_miner_for(language_code: str) -> 'OpinionMiner':
+        # Obtain the language model and lexicon of a language only once its first document shows up.
+        result = language_code_to_opinion_miner_map.get(language_code)
+        if result is None:
+            result = _opinion_miner(args, language_code)
+            result.stats = stats
+            language_code_to_opinion_miner_map[language_code] = result
+        return result
+
+    is_auto_language = args.language == AUTO_LANGUAGE
+    if not is_auto_language:
+        # Fail early if the language model or lexicon cannot be loaded.
+        opinion_miner_for(args.language)
     _possibly_enable_debug_logging(args)
 
-    print('# topic,rating,text')
+    output_format = OutputFormat(args.output_format) if args.output_format is not None else None
+    key_names, time_key_name, documents = _key_names_time_key_name_and_documents_to_analyze(args)
+    checkpoint = _checkpoint_to_resume(args)
+    documents = documents_after_checkpoint(documents, checkpoint)
+    if args.aggregate:
+        writer = AggregatingOpinionWriter(
+            args.output_path, output_format or output_format_for(args.output_path),
+            key_names, time_key_name, TimeWindow(args.time_window))
+    else:
+        writer = opinion_writer(
+            args.output_path, output_format, key_names, topic_type=RestaurantTopic, append=checkpoint is not None)
+    with _possibly_profiled(args, stats), writer:
+        if args.checkpoint_path is not None:
+            checkpointer = Checkpointer(
+                args.checkpoint_path, writer,
+                checkpoint or AnalysisCheckpoint(args.text_to_analyze_paths, args.output_path),
+                args.checkpoint_interval)
+        else:
+            checkpointer = None
+        if is_auto_language:
+            document_and_opinion_records_pairs = _document_and_opinion_records_pairs_of_detected_languages(
+                documents, language_detector_for(), opinion_miner_for, stats, _AUTO_LANGUAGE_BATCH_SIZE)
+        else:
+            opinion_miner = opinion_miner_for(args.language)
+            document_and_opinion_records_pairs = (
+                (document, _opinion_records(opinion_miner, document)) for document in documents)
+        for document, opinion_records in document_and_opinion_records_pairs:
+            _write_opinion_records(writer, stats, document, opinion_records)
+            if checkpointer is not None:
+                checkpointer.document_written(document)
+        if checkpointer is not None:
+            checkpointer.save()
+
+
+def _checkpoint_to_resume(args: argparse.Namespace) -> Optional[AnalysisCheckpoint]:
+    """
+    The checkpoint to continue the analysis from with ``--resume``, or
+    ``None`` if the analysis starts from the beginning. The output is
+    truncated to the state the checkpoint refers to.
+    """
+    result = None
+    if args.resume:
+        if os.path.exists(args.checkpoint_path):
+            result = read_checkpoint(args.checkpoint_path)
+            result.check_can_resume(args.text_to_analyze_paths, args.output_path)
+            _log.info('resuming after %d documents and %d opinions from checkpoint "%s"',
+                      result.document_count, result.opinion_count, args.checkpoint_path)
+            truncate_output_to_checkpoint(result)
+        else:
+            _log.info('starting from the beginning because checkpoint "%s" does not exist yet', args.checkpoint_path)
+    return result
+
+
+def _opinion_miner(args: argparse.Namespace, language_code: str) -> 'OpinionMiner':
+    from shapiro import analysis
+
+    # Pretokenized documents need no language model, which saves the time to load it.
+    nlp = models.language_model(language_code) if args.pretokenized_format is None else None
+    lexicon_csv_path = args.lexicon_csv_path.replace(_LANGUAGE_PLACEHOLDER, language_code)
+    # FIXME: Use generic topics instead of hard coded RestaurantTopic.
+    lexicon = analysis.cached_lexicon(lexicon_csv_path, RestaurantTopic, Rating, args.encoding)
+    language_sentiment = language_sentiment_for(language_code)
+    return analysis.OpinionMiner(nlp, lexicon, language_sentiment, idiom_matching=args.idiom_matching)
+
+
+def _key_names_time_key_name_and_documents_to_analyze(args: argparse.Namespace) \
+        -> Tuple[List[str], Optional[str], Iterable[Document]]:
     text_to_analyze_paths = args.text_to_analyze_paths
-    if args.immediately:
-        text = ' '.join(text_to_analyze_paths)
-        analyze(text)
+    key_names = []
+    time_key_name = None
+    if args.pretokenized_format is not None:
+        key_names = [DOCUMENT_ID_KEY_NAME]
+        documents = documents_from_pretokenized_files(text_to_analyze_paths, args.pretokenized_format, args.encoding)
+    elif args.immediately:
+        documents = documents_from_texts([' '.join(text_to_analyze_paths)])
+    elif args.text_column_number is not None:
+        key_column_indices = [key_column_number - 1 for key_column_number in args.key_column_numbers]
+        time_column_index = args.time_column_number - 1 if args.time_column_number is not None else None
+        if time_column_index is not None and time_column_index not in key_column_indices:
+            key_column_indices.append(time_column_index)
+        key_names = csv_key_names(text_to_analyze_paths[0], key_column_indices, args.encoding)
+        if time_column_index is not None:
+            time_key_name = key_names[key_column_indices.index(time_column_index)]
+        documents = documents_from_csv_files(
+            text_to_analyze_paths, args.text_column_number - 1, key_column_indices, args.encoding)
     else:
-        for text_to_analyze_path in text_to_analyze_paths:
-            _log.info('reading text to analyze from "%s"', text_to_analyze_path)
-            with open(text_to_analyze_path, 'r', encoding=args.encoding) as text_to_analyze_file:
-                # NOTE: Memory wise it would generally be nicer to read the text line by line.
-                # However we cannot ensure that the end of a line also constitutes the end of
-                # a sentence, so we need to read the whole text and pass it to spaCy to split
-                # into sentences.
-                text = text_to_analyze_file.read()
-                analyze(text)
+        documents = documents_from_text_files(text_to_analyze_paths, args.encoding)
+    return key_names, time_key_name, documents
+
+
+def _opinion_records(opinion_miner: 'OpinionMiner', document: Document) -> Iterable['OpinionRecord']:
+    return opinion_miner.opinion_records_of_document(document.doc) if isinstance(document, PretokenizedDocument) \
+        else opinion_miner.opinion_records(document.text)
+
+
+def _write_opinion_records(
+        writer: OpinionWriter, stats: profiling.TimingStats, document: Document,
+        opinion_records: Iterable['OpinionRecord']):
+    for opinion_record in opinion_records:
+        with stats.measured('output'):
+            writer.write_opinion(
+                opinion_record.topic, opinion_record.rating, opinion_record.text, document.keys, document.index,
+                opinion_record.start, opinion_record.end)
+
+
+def _document_and_opinion_records_pairs_of_detected_languages(
+        documents: Iterable[Document], language_detector: LanguageDetector,
+        opinion_miner_for: Callable[[str], 'OpinionMiner'], stats: profiling.TimingStats, batch_size: int) \
+        -> Iterable[Tuple[Document, List['OpinionRecord']]]:
+    """
+    Each of ``documents`` and its opinions found by the miner for its
+    detected language, in the same order as ``documents``. To parse
+    efficiently, up to ``batch_size`` documents are routed at once, and the
+    texts of each language are parsed together.
+    """
+    for batch_documents in tools.chunked(documents, batch_size):
+        with stats.measured('detect_language'):
+            language_codes = [language_detector.language_code_of(document.text) for document in batch_documents]
+        batch_opinion_records: List[Optional[List['OpinionRecord']]] = [None] * len(batch_documents)
+        for language_code in sorted(set(language_codes)):
+            positions = [
+                position for position, document_language_code in enumerate(language_codes)
+                if document_language_code == language_code
+            ]
+            _log.info('analyzing %d documents in language "%s"', len(positions), language_code)
+            opinion_miner = opinion_miner_for(language_code)
+            language_documents = [batch_documents[position] for position in positions]
+            if opinion_miner.nlp is None:
+                parsed_documents = [document.doc for document in language_documents]
+            else:
+                parsed_documents = opinion_miner.parsed_documents(
+                    [document.text for document in language_documents], batch_size)
+            for position, parsed_document in zip(positions, parsed_documents):
+                # Keep only the detached records, so the parsed document can be freed.
+                batch_opinion_records[position] = list(opinion_miner.opinion_records_of_document(
+                    parsed_document, original_text=batch_documents[position].text))
+        yield from zip(batch_documents, batch_opinion_records)
 
 
 def command_count(args: argparse.Namespace):
-    nlp = _nlp(args)
-    number = args.number
-    count_stopwords = args.count_stopwords
-    use_pos = args.use_pos
-    with open(args.text_to_analyze_path, encoding=args.encoding) as text_file:
-        most_common_lemmas = analysis.most_common_lemmas(
-            nlp, text_file,
-            number=number, count_stopwords=count_stopwords, use_pos=use_pos)
-        for count, lemma, pos in most_common_lemmas:
-            row_to_write = [str(count), lemma]
-            if use_pos:
-                row_to_write.append(str(pos))
-            print('\t'.join(row_to_write))
+    from shapiro import analysis
+
+    nlp = _nlp(args, models.LEMMA_ONLY_DISABLED_PIPES)
+    counter = analysis.VectorizedLemmaCounter(
+        nlp, count_stopwords=args.count_stopwords, use_pos=args.use_pos, capacity=args.capacity)
+    for load_state_path in args.load_state_paths:
+        _log.info('reading lemma counts from "%s"', load_state_path)
+        counter.merge_state(read_lemma_count_state(load_state_path))
+    if args.jobs != 1 and (args.profile or args.profile_path is not None):
+        _log.warning('profiling only includes the main process but not the worker processes')
+    with _possibly_profiled(args, counter.stats):
+        with open(args.text_to_analyze_path, encoding=args.encoding) as text_file:
+            if args.jobs == 1:
+                counter.count_texts(text_file)
+            else:
+                counter.merge_state(LemmaCountState(
+                    args.use_pos, args.count_stopwords, args.capacity,
+                    analysis.parallel_lemma_pos_to_count_map(
+                        nlp, text_file, args.jobs, count_stopwords=args.count_stopwords, use_pos=args.use_pos,
+                        capacity=args.capacity)))
+        with counter.stats.measured('output'):
+            if args.save_state_path is not None:
+                _possibly_save_state(args, counter.state())
+            _print_most_common_lemmas(counter.most_common(args.number), args.use_pos)
+
+
+def command_merge_counts(args: argparse.Namespace):
+    state = merged_lemma_count_state(args.state_paths)
+    _possibly_save_state(args, state)
+    _print_most_common_lemmas(most_common_counts(state.lemma_pos_to_count_map, args.number), state.use_pos)
+
+
+def _possibly_save_state(args: argparse.Namespace, state: LemmaCountState):
+    if args.save_state_path is not None:
+        _log.info('writing lemma counts to "%s"', args.save_state_path)
+        write_lemma_count_state(args.save_state_path, state)
+
+
+def _print_most_common_lemmas(count_lemma_pos_tuples: Sequence[Tuple[int, str, str]], use_pos: bool):
+    for count, lemma, pos in count_lemma_pos_tuples:
+        row_to_write = [str(count), lemma]
+        if use_pos:
+            row_to_write.append(str(pos))
+        print('\t'.join(row_to_write))
+
+
+def command_memory(args: argparse.Namespace):
+    report = memory.memory_report(
+        args.lexicon_csv_path, args.language, args.text_to_analyze_paths, args.encoding, args.rss_interval)
+    report.write(sys.stdout, args.top_type_count)
+
+
+def command_daemon(args: argparse.Namespace):
+    daemon.serve(args.socket_path, args.preloaded_languages)
 
 
 def command_lexicon(args: argparse.Namespace):
     raise NotImplementedError('lexicon')
 
 
-def _nlp(args: argparse.Namespace) -> Language:
-    _log.info('loading language "%s"', args.language)
-    return spacy.load(args.language)
+def _nlp(args: argparse.Namespace, disable: Sequence[str]=()) -> 'Language':
+    return models.language_model(args.language, disable)
 
 
 def process(arguments: Sequence[str]=None):
@@ -171,8 +566,11 @@ def process(arguments: Sequence[str]=None):
 
 def main():  # pragma: no cover
     logging.basicConfig(level=logging.INFO)
-    analysis.add_token_extension()
-    sys.exit(process())
+    arguments = sys.argv[1:]
+    exit_code = daemon.forwarded_exit_code(arguments) if daemon.can_forward(arguments) else None
+    if exit_code is None:
+        exit_code = process(arguments)
+    sys.exit(exit_code)
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -4,9 +4,10 @@ Common structures and function used by multiple modules.
 import csv
 import os
 from enum import Enum
-from typing import Generator, List, Sequence
+from typing import TYPE_CHECKING, Generator, List, Sequence
 
-from spacy.tokens import Token
+if TYPE_CHECKING:  # pragma: no cover
+    from spacy.tokens import Token
 
 
 class OpinionError(Exception):
@@ -91,7 +92,7 @@ def ranged_rating(rating_value: int) -> Rating:
     return Rating(min(_MAX_RATING_VALUE, max(_MIN_RATING_VALUE, rating_value)))
 
 
-def debugged_token(token: Token) -> str:
+def debugged_token(token: 'Token') -> str:
     """
     Human readable string representation of ``token`` including shapiro
     specific extension attributes.
@@ -115,11 +116,11 @@ def lexicon_path(name: str) -> str:
     return os.path.join(LEXICONS_FOLDER, name)
 
 
-def csv_rows(source_csv_path: str) -> Generator[List[str], None, None]:
+def csv_rows(source_csv_path: str, encoding: str=CSV_ENCODING) -> Generator[List[str], None, None]:
     """
     Rows stored in a CSV file.
     """
-    with open(source_csv_path, encoding=CSV_ENCODING, newline='') as csv_file:
+    with open(source_csv_path, encoding=encoding, newline='') as csv_file:
         csv_reader = csv.reader(csv_file, delimiter=',', quotechar='"')
         for row in csv_reader:
             row = [cell.strip() for cell in row]
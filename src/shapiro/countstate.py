@@ -0,0 +1,188 @@
+"""
+Persistent state of lemma counts, which allows to count incrementally and
+to merge counts of different periods, for example daily counts into a rolling
+window of 30 days.
+
+The state is stored as gzip compressed JSON. Merging is associative, so
+states can be combined in any grouping. Exact counts are also commutative;
+approximate counts (see :py:class:`shapiro.sketch.SpaceSavingCounter`) keep
+their error guarantees after merging but might differ slightly depending on
+the order.
+"""
+import gzip
+import heapq
+import json
+import os
+import tempfile
+from collections import Counter
+from typing import Dict, Sequence, Tuple, Union
+
+from shapiro.common import OpinionError
+from shapiro.sketch import SpaceSavingCounter
+
+#: Value of the "format" field identifying a lemma count state.
+_STATE_FORMAT = 'shapiro-lemma-counts'
+
+#: Version of the state format.
+_STATE_VERSION = 1
+
+#: Encoding of the JSON stored in a state file.
+_STATE_ENCODING = 'utf-8'
+
+
+class LemmaCountState:
+    """
+    Counts for pairs of lemmas and part of speech tags together with the
+    options used to count them.
+    """
+    def __init__(self, use_pos: bool=False, count_stopwords: bool=False, capacity: int=None,
+                 lemma_pos_to_count_map: Union[Dict[Tuple[str, str], int], SpaceSavingCounter]=None):
+        assert capacity is None or capacity >= 1
+        assert lemma_pos_to_count_map is None \
+            or (capacity is None) == (not isinstance(lemma_pos_to_count_map, SpaceSavingCounter))
+
+        self.use_pos = use_pos
+        self.count_stopwords = count_stopwords
+        self.capacity = capacity
+        if lemma_pos_to_count_map is not None:
+            self.lemma_pos_to_count_map = lemma_pos_to_count_map
+        elif capacity is None:
+            self.lemma_pos_to_count_map = Counter()
+        else:
+            self.lemma_pos_to_count_map = SpaceSavingCounter(capacity)
+
+    def check_is_compatible_with(self, other: 'LemmaCountState'):
+        """
+        Raise :py:exc:`shapiro.common.OpinionError` if ``other`` was counted
+        with different options and consequently cannot be merged.
+        """
+        for name in ('use_pos', 'count_stopwords', 'capacity'):
+            value = getattr(self, name)
+            other_value = getattr(other, name)
+            if value != other_value:
+                raise OpinionError(
+                    'lemma counts to merge must have the same %s but are %r and %r' % (name, value, other_value))
+
+    def merge(self, other: 'LemmaCountState'):
+        """
+        Add the counts of ``other``.
+        """
+        self.check_is_compatible_with(other)
+        if self.capacity is None:
+            self.lemma_pos_to_count_map.update(other.lemma_pos_to_count_map)
+        else:
+            self.lemma_pos_to_count_map.merge(other.lemma_pos_to_count_map)
+
+
+def write_lemma_count_state(state_path: str, state: LemmaCountState):
+    """
+    Write ``state`` to ``state_path``. The file is stored on disk and then
+    replaced atomically, so ``state_path`` is either left unchanged or
+    contains the complete new state, even if the process is interrupted or
+    the system crashes.
+    """
+    assert state_path is not None
+    assert state is not None
+
+    state_map = {
+        'format': _STATE_FORMAT,
+        'version': _STATE_VERSION,
+        'use_pos': state.use_pos,
+        'count_stopwords': state.count_stopwords,
+        'capacity': state.capacity,
+    }
+    if state.capacity is None:
+        state_map['total'] = sum(state.lemma_pos_to_count_map.values())
+        state_map['counts'] = [
+            [lemma, pos, count] for (lemma, pos), count in state.lemma_pos_to_count_map.items()
+        ]
+    else:
+        state_map['total'] = state.lemma_pos_to_count_map.total
+        state_map['counts'] = [
+            [lemma, pos, count, error] for (lemma, pos), count, error
+            in state.lemma_pos_to_count_map.items_with_error()
+        ]
+    # Use a unique temporary file so concurrent writes to the same state do not clobber each other.
+    temp_state_file_descriptor, temp_state_path = tempfile.mkstemp(
+        prefix=os.path.basename(state_path) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(state_path)))
+    try:
+        with open(temp_state_file_descriptor, 'wb') as temp_state_file:
+            with gzip.open(temp_state_file, 'wt', encoding=_STATE_ENCODING) as state_file:
+                json.dump(state_map, state_file, ensure_ascii=False, separators=(',', ':'))
+            temp_state_file.flush()
+            os.fsync(temp_state_file.fileno())
+        os.replace(temp_state_path, state_path)
+    except BaseException:
+        if os.path.exists(temp_state_path):
+            os.remove(temp_state_path)
+        raise
+
+
+def read_lemma_count_state(state_path: str) -> LemmaCountState:
+    """
+    State previously written to ``state_path`` using
+    :py:func:`write_lemma_count_state`.
+    """
+    assert state_path is not None
+
+    with gzip.open(state_path, 'rt', encoding=_STATE_ENCODING) as state_file:
+        try:
+            state_map = json.load(state_file)
+        except ValueError as error:
+            raise OpinionError('%s: cannot read lemma counts: %s' % (state_path, error))
+    if not isinstance(state_map, dict) or state_map.get('format') != _STATE_FORMAT:
+        raise OpinionError('%s: file must contain lemma counts' % state_path)
+    version = state_map.get('version')
+    if version != _STATE_VERSION:
+        raise OpinionError('%s: version of lemma counts must be %d but is: %r' % (state_path, _STATE_VERSION, version))
+    capacity = state_map['capacity']
+    if capacity is None:
+        lemma_pos_to_count_map = Counter({
+            (lemma, pos): count for lemma, pos, count in state_map['counts']
+        })
+    else:
+        lemma_pos_to_count_map = SpaceSavingCounter.restored(capacity, state_map['total'], (
+            ((lemma, pos), count, error) for lemma, pos, count, error in state_map['counts']
+        ))
+    return LemmaCountState(state_map['use_pos'], state_map['count_stopwords'], capacity, lemma_pos_to_count_map)
+
+
+def merged_lemma_count_state(state_paths: Sequence[str]) -> LemmaCountState:
+    """
+    State combining all the states stored in ``state_paths``.
+    """
+    assert len(state_paths) >= 1
+
+    result = None
+    for state_path in state_paths:
+        state = read_lemma_count_state(state_path)
+        if result is None:
+            result = state
+        else:
+            try:
+                result.merge(state)
+            except OpinionError as error:
+                raise OpinionError('%s: %s' % (state_path, error))
+    return result
+
+
+def most_common_counts(
+        lemma_pos_to_count_map: Union[Dict[Tuple[str, str], int], SpaceSavingCounter], number: int=0) \
+        -> Sequence[Tuple[int, str, str]]:
+    """
+    The ``number`` highest counts in ``lemma_pos_to_count_map`` as tuples
+    ``(count, lemma, pos)`` in descending order. If ``number`` is 0, all
+    counts are included. Otherwise a heap is used to find them, which is
+    faster than sorting all counts.
+    """
+    assert number >= 0
+
+    count_lemma_pos_tuples = (
+        (count, lemma, pos)
+        for (lemma, pos), count in lemma_pos_to_count_map.items()
+    )
+    if number == 0:
+        result = sorted(count_lemma_pos_tuples, reverse=True)
+    else:
+        result = heapq.nlargest(number, count_lemma_pos_tuples)
+    return result
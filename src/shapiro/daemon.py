@@ -0,0 +1,308 @@
+"""
+Optional local daemon that keeps language models and lexicons loaded
+between runs of the ``shapiro`` command line interface.
+
+Once started with ``shapiro daemon``, the command line interface forwards
+commands that need a language model to the daemon using a Unix domain
+socket and writes the output the daemon sends back. If no daemon is
+running, commands are executed in the current process as usual. Either
+way the output is the same.
+
+The daemon executes one command at a time in its own process, temporarily
+changing to the working folder of the client and redirecting standard
+output and error.
+"""
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+from typing import Optional, Sequence, Tuple
+
+from shapiro import tools
+from shapiro.common import OpinionError
+
+_log = tools.log
+
+#: Environment variable to specify the path of the daemon's socket.
+SOCKET_PATH_ENVIRONMENT_VARIABLE = 'SHAPIRO_SOCKET'
+
+#: Environment variable that, if set to a non empty value, prevents the command line interface from using the daemon.
+NO_DAEMON_ENVIRONMENT_VARIABLE = 'SHAPIRO_NO_DAEMON'
+
+#: Environment variable with the folder for runtime files of the current user, for example sockets.
+RUNTIME_FOLDER_ENVIRONMENT_VARIABLE = 'XDG_RUNTIME_DIR'
+
+#: Name of the socket file in the default socket folder.
+_SOCKET_NAME = 'shapiro.sock'
+
+#: Names of commands the command line interface forwards to the daemon.
+FORWARDED_COMMAND_NAMES = ('analyze', 'count')
+
+#: Version of the protocol between client and daemon.
+_PROTOCOL_VERSION = 1
+
+#: Encoding of the JSON header lines exchanged between client and daemon.
+_HEADER_ENCODING = 'utf-8'
+
+#: Maximum length in bytes of a request or response header.
+_MAX_HEADER_SIZE = 1024 * 1024
+
+
+def is_supported() -> bool:
+    """
+    ``True`` if the platform supports Unix domain sockets.
+    """
+    return hasattr(socket, 'AF_UNIX')
+
+
+def default_socket_path() -> str:
+    """
+    Path of the socket as specified with the environment variable
+    ``SHAPIRO_SOCKET``. Otherwise the socket is located in the folder for
+    runtime files of the current user specified by ``XDG_RUNTIME_DIR`` or,
+    if there is none, in :py:func:`private_temp_folder`.
+    """
+    result = os.environ.get(SOCKET_PATH_ENVIRONMENT_VARIABLE)
+    if not result:
+        runtime_folder = os.environ.get(RUNTIME_FOLDER_ENVIRONMENT_VARIABLE)
+        socket_folder = runtime_folder if runtime_folder and os.path.isdir(runtime_folder) \
+            else private_temp_folder()
+        result = os.path.join(socket_folder, _SOCKET_NAME)
+    return result
+
+
+def private_temp_folder() -> str:
+    """
+    Folder within the folder for temporary files that only the current user
+    can access. The daemon creates it when needed.
+    """
+    return os.path.join(tempfile.gettempdir(), 'shapiro-%d' % os.getuid())
+
+
+def _make_private_folder(folder: str):
+    """
+    Create ``folder`` unless it already exists and check that only the
+    current user can access it, so other users cannot place a socket there.
+    """
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    folder_stat = os.lstat(folder)
+    if not stat.S_ISDIR(folder_stat.st_mode) or folder_stat.st_uid != os.getuid() \
+            or stat.S_IMODE(folder_stat.st_mode) & 0o077 != 0:
+        raise OpinionError('folder for daemon socket must be a directory only the current user can access: "%s"'
+                           % folder)
+
+
+def can_forward(arguments: Sequence[str]) -> bool:
+    """
+    ``True`` if the command line ``arguments`` should be forwarded to a
+    daemon if one is running.
+    """
+    return is_supported() \
+        and not os.environ.get(NO_DAEMON_ENVIRONMENT_VARIABLE) \
+        and len(arguments) >= 1 \
+        and arguments[0] in FORWARDED_COMMAND_NAMES
+
+
+def forwarded_exit_code(arguments: Sequence[str], socket_path: str=None) -> Optional[int]:
+    """
+    Exit code after the daemon listening on ``socket_path`` executed the
+    command line ``arguments`` and its output has been written to standard
+    output and error, or ``None`` if no daemon could be reached.
+
+    To not pass arguments and texts to a daemon of another user, the socket
+    must belong to the current user.
+    """
+    actual_socket_path = socket_path if socket_path is not None else default_socket_path()
+    try:
+        socket_user_id = os.stat(actual_socket_path).st_uid
+    except OSError as error:
+        _log.debug('cannot use daemon at "%s", executing in current process: %s', actual_socket_path, error)
+        return None
+    if socket_user_id != os.getuid():
+        _log.warning('ignoring daemon at "%s" because its socket belongs to another user, executing in current process',
+                     actual_socket_path)
+        return None
+    request = {
+        'version': _PROTOCOL_VERSION,
+        'arguments': list(arguments),
+        'working_folder': os.getcwd(),
+        'stdout_encoding': _encoding_of(sys.stdout),
+        'stderr_encoding': _encoding_of(sys.stderr),
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+            client_socket.connect(actual_socket_path)
+            with client_socket.makefile('rwb') as client_file:
+                _write_header(client_file, request)
+                client_file.flush()
+                response = _read_header(client_file)
+                stdout_data = _read_exactly(client_file, response['stdout_size'])
+                stderr_data = _read_exactly(client_file, response['stderr_size'])
+    except (OSError, ValueError) as error:
+        _log.debug('cannot use daemon at "%s", executing in current process: %s', actual_socket_path, error)
+        return None
+    _write_data(sys.stdout, stdout_data)
+    _write_data(sys.stderr, stderr_data)
+    return response['exit_code']
+
+
+def _encoding_of(text_file) -> str:
+    return getattr(text_file, 'encoding', None) or 'utf-8'
+
+
+def _write_data(text_file, data: bytes):
+    if len(data) != 0:
+        text_file.flush()
+        text_file.buffer.write(data)
+        text_file.buffer.flush()
+
+
+def _write_header(target_file, header: dict):
+    target_file.write(json.dumps(header).encode(_HEADER_ENCODING) + b'\n')
+
+
+def _read_header(source_file) -> dict:
+    header_line = source_file.readline(_MAX_HEADER_SIZE)
+    if not header_line.endswith(b'\n'):
+        raise ValueError('header must be a complete line')
+    return json.loads(header_line.decode(_HEADER_ENCODING))
+
+
+def _read_exactly(source_file, size: int) -> bytes:
+    result = source_file.read(size)
+    if len(result) != size:
+        raise ValueError('data must have %d bytes but has only %d' % (size, len(result)))
+    return result
+
+
+def executed_exit_code_stdout_and_stderr(
+        arguments: Sequence[str], working_folder: str, stdout_encoding: str, stderr_encoding: str) \
+        -> Tuple[int, bytes, bytes]:
+    """
+    Exit code, standard output and standard error after executing the
+    command line ``arguments`` in ``working_folder``.
+    """
+    from shapiro import commandline
+
+    stdout_data = io.BytesIO()
+    stderr_data = io.BytesIO()
+    stdout = io.TextIOWrapper(stdout_data, encoding=stdout_encoding, write_through=True)
+    stderr = io.TextIOWrapper(stderr_data, encoding=stderr_encoding, write_through=True)
+    # Mimic the logging configured by commandline.main() for the client.
+    log_handler = logging.StreamHandler(stderr)
+    log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    root_logger = logging.getLogger()
+    original_log_level = _log.level
+    original_working_folder = os.getcwd()
+    original_stdout = sys.stdout
+    original_stderr = sys.stderr
+    try:
+        os.chdir(working_folder)
+        sys.stdout = stdout
+        sys.stderr = stderr
+        root_logger.addHandler(log_handler)
+        try:
+            exit_code = commandline.process(arguments)
+        except SystemExit as error:
+            # For example from argparse for --help or invalid arguments.
+            if error.code is None:
+                exit_code = 0
+            elif isinstance(error.code, int):
+                exit_code = error.code
+            else:
+                stderr.write('%s\n' % error.code)
+                exit_code = 1
+    finally:
+        root_logger.removeHandler(log_handler)
+        sys.stdout = original_stdout
+        sys.stderr = original_stderr
+        _log.setLevel(original_log_level)
+        os.chdir(original_working_folder)
+    stdout.flush()
+    stderr.flush()
+    return exit_code, stdout_data.getvalue(), stderr_data.getvalue()
+
+
+class _DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = _read_header(self.rfile)
+            version = request.get('version')
+            if version != _PROTOCOL_VERSION:
+                raise ValueError('protocol version must be %d but is: %r' % (_PROTOCOL_VERSION, version))
+        except ValueError as error:
+            _log.warning('ignoring invalid request: %s', error)
+            return
+        arguments = request['arguments']
+        _log.info('executing: %s', ' '.join(arguments))
+        exit_code, stdout_data, stderr_data = executed_exit_code_stdout_and_stderr(
+            arguments, request['working_folder'], request['stdout_encoding'], request['stderr_encoding'])
+        _write_header(self.wfile, {
+            'exit_code': exit_code,
+            'stdout_size': len(stdout_data),
+            'stderr_size': len(stderr_data),
+        })
+        self.wfile.write(stdout_data)
+        self.wfile.write(stderr_data)
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Server that executes commands forwarded by :py:func:`forwarded_exit_code`
+    one at a time.
+    """
+    def __init__(self, socket_path: str):
+        assert socket_path is not None
+
+        socket_folder = os.path.dirname(os.path.abspath(socket_path))
+        if socket_folder == private_temp_folder():
+            _make_private_folder(socket_folder)
+        if os.path.exists(socket_path):
+            if _is_daemon_listening(socket_path):
+                raise OpinionError('daemon must not already be running at "%s"' % socket_path)
+            _log.info('removing stale socket "%s"', socket_path)
+            os.remove(socket_path)
+        # Only the current user may connect to the socket.
+        original_umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, _DaemonRequestHandler)
+        finally:
+            os.umask(original_umask)
+        self.socket_path = socket_path
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def _is_daemon_listening(socket_path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+            client_socket.connect(socket_path)
+        result = True
+    except OSError:
+        result = False
+    return result
+
+
+def serve(socket_path: str=None, preloaded_languages: Sequence[str]=()):
+    """
+    Execute commands forwarded to ``socket_path`` until interrupted. The
+    language models ``preloaded_languages`` are loaded in advance so even
+    the first forwarded command runs quickly.
+    """
+    from shapiro import models
+
+    for language in preloaded_languages:
+        models.preload_models([language])
+        models.preload_models([language], models.LEMMA_ONLY_DISABLED_PIPES)
+    actual_socket_path = socket_path if socket_path is not None else default_socket_path()
+    with DaemonServer(actual_socket_path) as server:
+        _log.info('waiting for commands at "%s"', actual_socket_path)
+        server.serve_forever()
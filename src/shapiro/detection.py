@@ -0,0 +1,176 @@
+"""
+Detect the language of documents using character n-gram profiles.
+
+The profile of a language holds the relative frequencies of the character
+n-grams in the package data file ``lexicons/language_sample_<language
+code>.txt``. A text is assigned the language whose profile makes the n-grams
+of the text most likely. This needs no additional packages and is fast
+enough to classify each document before parsing it, even for short texts
+like restaurant feedback.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Generator, List, Optional, Sequence, Tuple
+
+from shapiro import common, tools
+
+_log = tools.log
+
+#: Pseudo language code to detect the language of each document.
+AUTO_LANGUAGE = 'auto'
+
+#: Number of characters in an n-gram.
+DEFAULT_NGRAM_SIZE = 3
+
+_LANGUAGE_SAMPLE_PREFIX = 'language_sample_'
+_LANGUAGE_SAMPLE_SUFFIX = '.txt'
+
+# Everything except letters separates words.
+_NON_LETTERS_REGEX = re.compile(r'[\W\d_]+')
+
+
+def language_sample_path(language_code: str) -> str:
+    """
+    Path to the package data file with the sample text for ``language_code``.
+    """
+    assert language_code is not None
+    return common.lexicon_path(_LANGUAGE_SAMPLE_PREFIX + language_code + _LANGUAGE_SAMPLE_SUFFIX)
+
+
+def detectable_language_codes() -> List[str]:
+    """
+    Sorted codes of the languages that have a sample text in the package
+    data and consequently can be detected.
+    """
+    return sorted(
+        name[len(_LANGUAGE_SAMPLE_PREFIX):-len(_LANGUAGE_SAMPLE_SUFFIX)]
+        for name in os.listdir(common.LEXICONS_FOLDER)
+        if name.startswith(_LANGUAGE_SAMPLE_PREFIX) and name.endswith(_LANGUAGE_SAMPLE_SUFFIX)
+    )
+
+
+def ngrams(text: str, ngram_size: int=DEFAULT_NGRAM_SIZE) -> Generator[str, None, None]:
+    """
+    Character n-grams of the lower case words in ``text``. Each word is
+    padded with a space on both sides, so n-grams at the start and end of
+    words differ from those within words, for example "the" yields " th",
+    "the" and "he ".
+    """
+    assert ngram_size >= 1
+    for word in _NON_LETTERS_REGEX.split(text.lower()):
+        if word != '':
+            padded_word = ' ' + word + ' '
+            for ngram_start in range(len(padded_word) - ngram_size + 1):
+                yield padded_word[ngram_start:ngram_start + ngram_size]
+
+
+class LanguageProfile:
+    """
+    Logarithmic probabilities of the character n-grams in a language,
+    obtained from the n-grams of a ``sample_text``. N-grams that do not
+    occur in the sample get a small probability, so a single unusual word
+    does not rule out a language.
+    """
+    def __init__(self, language_code: str, sample_text: str, ngram_size: int=DEFAULT_NGRAM_SIZE):
+        assert language_code is not None
+        assert sample_text is not None
+        self.language_code = language_code
+        self.ngram_size = ngram_size
+        ngram_to_count_map = Counter(ngrams(sample_text, ngram_size))
+        # Use additive smoothing to get a probability for n-grams missing in the sample.
+        smoothed_total_count = sum(ngram_to_count_map.values()) + len(ngram_to_count_map) + 1
+        self._ngram_to_log_probability_map: Dict[str, float] = {
+            ngram: math.log((count + 1) / smoothed_total_count)
+            for ngram, count in ngram_to_count_map.items()
+        }
+        self.unknown_ngram_log_probability = math.log(1 / smoothed_total_count)
+
+    def log_probability(self, text_ngrams: Sequence[str]) -> float:
+        """
+        Logarithmic probability of ``text_ngrams`` in this language.
+        """
+        ngram_to_log_probability_map = self._ngram_to_log_probability_map
+        unknown_ngram_log_probability = self.unknown_ngram_log_probability
+        return sum(ngram_to_log_probability_map.get(ngram, unknown_ngram_log_probability) for ngram in text_ngrams)
+
+    def __str__(self) -> str:
+        return 'LanguageProfile(%s, ngrams=%d)' % (self.language_code, len(self._ngram_to_log_probability_map))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class LanguageDetector:
+    """
+    Detector for the language of texts among the languages of ``profiles``.
+    Texts without any letters, for example just an emoticon, are assigned
+    the language of the first profile.
+    """
+    def __init__(self, profiles: Sequence[LanguageProfile]):
+        assert len(profiles) >= 1
+        ngram_sizes = {profile.ngram_size for profile in profiles}
+        assert len(ngram_sizes) == 1, 'all profiles must use the same n-gram size: %s' % sorted(ngram_sizes)
+        self.profiles = list(profiles)
+        self.ngram_size = ngram_sizes.pop()
+
+    @property
+    def language_codes(self) -> List[str]:
+        return [profile.language_code for profile in self.profiles]
+
+    def language_code_and_log_probability_pairs(self, text: str) -> List[Tuple[str, float]]:
+        """
+        Code and logarithmic probability of each language for ``text``,
+        most likely language first.
+        """
+        assert text is not None
+        text_ngrams = list(ngrams(text, self.ngram_size))
+        return sorted(
+            ((profile.language_code, profile.log_probability(text_ngrams)) for profile in self.profiles),
+            key=lambda language_code_and_log_probability: -language_code_and_log_probability[1])
+
+    def language_code_of(self, text: str) -> str:
+        """
+        Code of the language ``text`` is most likely written in.
+        """
+        return self.language_code_and_log_probability_pairs(text)[0][0]
+
+
+def language_profile_from_sample(language_code: str, ngram_size: int=DEFAULT_NGRAM_SIZE) -> LanguageProfile:
+    """
+    The :py:class:`LanguageProfile` for the package data sample text of
+    ``language_code``.
+    """
+    sample_path = language_sample_path(language_code)
+    if not os.path.exists(sample_path):
+        raise common.OpinionError(
+            'cannot detect language "%s" because there is no sample text for it; available languages are: %s'
+            % (language_code, ', '.join(detectable_language_codes())))
+    _log.info('reading language sample from "%s"', sample_path)
+    with open(sample_path, encoding='utf-8') as sample_file:
+        return LanguageProfile(language_code, sample_file.read(), ngram_size)
+
+
+_language_codes_to_detector_map: Dict[Tuple[str, ...], LanguageDetector] = {}
+_cache_lock = threading.Lock()
+
+
+def language_detector_for(language_codes: Optional[Sequence[str]]=None) -> LanguageDetector:
+    """
+    The :py:class:`LanguageDetector` for ``language_codes`` or all
+    :py:func:`detectable_language_codes` if ``language_codes`` is ``None``.
+    Each detector is built only once per process and shared by all later
+    calls, also across threads.
+    """
+    key = tuple(language_codes) if language_codes is not None else tuple(detectable_language_codes())
+    result = _language_codes_to_detector_map.get(key)
+    if result is None:
+        with _cache_lock:
+            # Check again in case another thread built the detector while this one was waiting for the lock.
+            result = _language_codes_to_detector_map.get(key)
+            if result is None:
+                result = LanguageDetector([language_profile_from_sample(language_code) for language_code in key])
+                _language_codes_to_detector_map[key] = result
+    return result
@@ -0,0 +1,116 @@
+"""
+Documents to analyze and functions to read them from various sources.
+"""
+import csv
+from typing import Generator, List, Sequence
+
+from shapiro import common, tools
+
+_log = tools.log
+
+#: Prefix of the column name for CSV columns without a name in the header.
+_UNNAMED_COLUMN_PREFIX = 'column_'
+
+
+class Document:
+    """
+    Text to analyze together with an ``index`` that is unique within an
+    analysis and possibly some ``keys`` identifying it, for example the ID of
+    a restaurant or a time stamp.
+    """
+    def __init__(self, index: int, text: str, keys: Sequence[str]=()):
+        assert index >= 0
+        assert text is not None
+        assert keys is not None
+        self.index = index
+        self.text = text
+        self.keys = tuple(keys)
+
+    def __str__(self) -> str:
+        return 'Document(%d, keys=%s, text=%r)' % (self.index, list(self.keys), self.text)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def documents_from_texts(texts: Sequence[str], first_index: int=0) -> Generator[Document, None, None]:
+    """
+    Documents for each text in ``texts``.
+    """
+    for index, text in enumerate(texts, first_index):
+        yield Document(index, text)
+
+
+def documents_from_text_files(
+        text_paths: Sequence[str], encoding: str=common.CSV_ENCODING, first_index: int=0) \
+        -> Generator[Document, None, None]:
+    """
+    Documents for each text file in ``text_paths``.
+    """
+    for index, text_path in enumerate(text_paths, first_index):
+        _log.info('reading text to analyze from "%s"', text_path)
+        with open(text_path, 'r', encoding=encoding) as text_file:
+            # NOTE: Memory wise it would generally be nicer to read the text line by line.
+            # However we cannot ensure that the end of a line also constitutes the end of
+            # a sentence, so we need to read the whole text and pass it to spaCy to split
+            # into sentences.
+            yield Document(index, text_file.read())
+
+
+def csv_column_names(csv_path: str, encoding: str=common.CSV_ENCODING) -> List[str]:
+    """
+    Names of the columns in ``csv_path`` as specified in an initial comment
+    row, for example ``# Timestamp,Restaurant-ID,Feedback``. If there is no
+    such row, the result is empty.
+    """
+    result = []
+    with open(csv_path, encoding=encoding, newline='') as csv_file:
+        for row in csv.reader(csv_file, delimiter=',', quotechar='"'):
+            row = [cell.strip() for cell in row]
+            if ''.join(row) != '':
+                if row[0].startswith('#'):
+                    result = [row[0][1:].strip()] + row[1:]
+                break
+    return result
+
+
+def csv_key_names(
+        csv_path: str, key_column_indices: Sequence[int], encoding: str=common.CSV_ENCODING) -> List[str]:
+    """
+    Names for the key columns at ``key_column_indices`` in ``csv_path``
+    using :py:func:`csv_column_names` and ``column_<number>`` for columns
+    without a name.
+    """
+    column_names = csv_column_names(csv_path, encoding)
+    result = []
+    for key_column_index in key_column_indices:
+        key_name = column_names[key_column_index] if key_column_index < len(column_names) else ''
+        if key_name == '':
+            key_name = _UNNAMED_COLUMN_PREFIX + str(key_column_index + 1)
+        result.append(key_name)
+    return result
+
+
+def documents_from_csv_files(
+        csv_paths: Sequence[str], text_column_index: int, key_column_indices: Sequence[int]=(),
+        encoding: str=common.CSV_ENCODING, first_index: int=0) -> Generator[Document, None, None]:
+    """
+    Documents for each data row in the CSV files ``csv_paths`` with the text
+    in column ``text_column_index`` and the keys in ``key_column_indices``.
+    Comment rows starting with '#' and empty rows are skipped.
+    """
+    assert text_column_index >= 0
+    assert key_column_indices is not None
+
+    required_column_count = max([text_column_index] + list(key_column_indices)) + 1
+    index = first_index
+    for csv_path in csv_paths:
+        _log.info('reading texts to analyze from "%s"', csv_path)
+        for row_index, row in enumerate(common.csv_rows(csv_path, encoding)):
+            if len(row) < required_column_count:
+                raise common.OpinionCsvError(
+                    f'row must have at least {required_column_count} items but has {len(row)}',
+                    csv_path, row_index)
+            keys = [row[key_column_index] for key_column_index in key_column_indices]
+            yield Document(index, row[text_column_index], keys)
+            index += 1
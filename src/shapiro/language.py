@@ -1,27 +1,155 @@
 """
 Language specific settings
+
+The words and idioms of each language are stored in the package data file
+``lexicons/sentiment_<language code>.csv``, so further languages can be
+added without changing the code. :py:func:`language_sentiment_for` reads
+each file only once per process.
 """
-from typing import Dict, Set
+import os
+import re
+import threading
+from types import MappingProxyType
+from typing import (TYPE_CHECKING, Any, Dict, FrozenSet, Generator, List, Mapping, Optional, Pattern, Sequence, Set,
+                    Tuple, Type)
 
+from shapiro import common
 from shapiro.common import Rating, ranged_rating
+from shapiro.preprocess import compiled_idiom_to_localized_rating_text_map
 from shapiro.tools import log, signum
-from spacy.tokens import Token
+
+if TYPE_CHECKING:  # pragma: no cover
+    from spacy.tokens import Token
 
 _log = log
 
+#: Kind of modifier that makes a rating stronger, for example "very".
+INTENSIFIER = 'intensifier'
+
+#: Kind of modifier that makes a rating weaker, for example "a little bit".
+DIMINISHER = 'diminisher'
+
+#: Kind of modifier that reverses a rating, for example "not".
+NEGATION = 'negation'
+
+#: Kinds of modifiers in the order they take precedence if a text is of multiple kinds.
+MODIFIER_KINDS = (INTENSIFIER, DIMINISHER, NEGATION)
+
+#: Words of a text; hyphens are separate words because spaCy splits them into a token of their own.
+_WORD_REGEX = re.compile(r'[^\s-]+|-')
+
+#: Key in a node of a :py:class:`WordTrie` for the value of the text ending at this node.
+_VALUE_KEY = None
+
+#: Kinds of rows in a sentiment CSV that consist of a text only.
+_KIND_TO_TEXT_SET_NAME_MAP = {
+    DIMINISHER: 'diminishers',
+    INTENSIFIER: 'intensifiers',
+    NEGATION: 'negations',
+}
+
+#: Kinds of rows in a sentiment CSV that map a text to a rating.
+_KIND_TO_TEXT_TO_RATING_MAP_NAME_MAP = {
+    'idiom': 'idioms',
+    'negative': 'negatives',
+    'positive': 'positives',
+}
+
+#: Kind of rows in a sentiment CSV that hold the localized text of a rating.
+_RATING_TEXT_KIND = 'rating text'
+
+_VALID_KINDS = ', '.join(sorted(
+    list(_KIND_TO_TEXT_SET_NAME_MAP) + list(_KIND_TO_TEXT_TO_RATING_MAP_NAME_MAP) + [_RATING_TEXT_KIND]))
+
+
+def lower_words(text: str) -> List[str]:
+    """
+    Lower case words of ``text`` split at white space and hyphens, which
+    roughly matches the tokens of spaCy's tokenizer.
+    """
+    assert text is not None
+    return _WORD_REGEX.findall(text.lower())
+
+
+def sentiment_csv_path(language_code: str) -> str:
+    """
+    Path to the package data file with the sentiment for ``language_code``.
+    """
+    assert language_code is not None
+    return common.lexicon_path('sentiment_%s.csv' % language_code)
+
 
 class LanguageSentiment:
-    def __init__(self, language_code: str):
+    """
+    Words and idioms that express sentiment in a certain language, read
+    from ``sentiment_csv_path`` with the columns kind, text and rating.
+
+    Instances are shared between threads and opinion miners, so all
+    attributes are immutable.
+    """
+    def __init__(self, language_code: str, sentiment_csv_path: Optional[str]=None):
         assert language_code is not None
         assert len(language_code) == 2, 'language code must have exactly 2 characters but is: %r' % language_code
         self.language_code = language_code
-        self.diminishers: Set[str] = set()
-        self.intensifiers: Set[str] = set()
-        self.negatives: Dict[str, Rating] = {}
-        self.positives: Dict[str, Rating] = {}
-        self.idioms: Dict[str, Rating] = {}
-        self.negations: Set[str] = set()
-        self.rating_to_localized_text_map: Dict[Rating, str] = {}
+        kind_to_texts_map: Dict[str, Set[str]] = {kind: set() for kind in _KIND_TO_TEXT_SET_NAME_MAP}
+        kind_to_text_to_rating_map: Dict[str, Dict[str, Rating]] = {
+            kind: {} for kind in list(_KIND_TO_TEXT_TO_RATING_MAP_NAME_MAP) + [_RATING_TEXT_KIND]
+        }
+        if sentiment_csv_path is not None:
+            _log.info('reading %s sentiment from "%s"', language_code, sentiment_csv_path)
+            for row_index, row in enumerate(common.csv_rows(sentiment_csv_path)):
+                _add_sentiment_from_csv_row(
+                    sentiment_csv_path, row_index, row, kind_to_texts_map, kind_to_text_to_rating_map)
+        self.diminishers: FrozenSet[str] = frozenset(kind_to_texts_map[DIMINISHER])
+        self.intensifiers: FrozenSet[str] = frozenset(kind_to_texts_map[INTENSIFIER])
+        self.negations: FrozenSet[str] = frozenset(kind_to_texts_map[NEGATION])
+        self.negatives: Mapping[str, Rating] = MappingProxyType(kind_to_text_to_rating_map['negative'])
+        self.positives: Mapping[str, Rating] = MappingProxyType(kind_to_text_to_rating_map['positive'])
+        self.idioms: Mapping[str, Rating] = MappingProxyType(kind_to_text_to_rating_map['idiom'])
+        self.rating_to_localized_text_map: Mapping[Rating, str] = MappingProxyType({
+            rating: localized_text for localized_text, rating in kind_to_text_to_rating_map[_RATING_TEXT_KIND].items()
+        })
+        self._compiled_idiom_to_localized_rating_text_map: Optional[Mapping[Pattern, str]] = None
+        self._modifier_trie: Optional[ModifierTrie] = None
+
+    @property
+    def compiled_idiom_to_localized_rating_text_map(self) -> Mapping[Pattern, str]:
+        """
+        The :py:attr:`idioms` compiled to regular expressions mapped to the
+        localized text of their rating, see
+        :py:func:`shapiro.preprocess.replaced_idioms`. They are compiled on
+        first access only.
+        """
+        if self._compiled_idiom_to_localized_rating_text_map is None:
+            # NOTE: If multiple threads get here at the same time, they all compile the same idioms and one of them
+            # wins, which is harmless.
+            self._compiled_idiom_to_localized_rating_text_map = MappingProxyType(
+                compiled_idiom_to_localized_rating_text_map(self.idioms, self.rating_to_localized_text_map))
+        return self._compiled_idiom_to_localized_rating_text_map
+
+    @property
+    def modifier_trie(self) -> 'ModifierTrie':
+        """
+        :py:class:`ModifierTrie` with all :py:attr:`intensifiers`,
+        :py:attr:`diminishers` and :py:attr:`negations`, built on first
+        access only.
+        """
+        if self._modifier_trie is None:
+            modifier_trie = ModifierTrie()
+            for kind, modifiers in zip(MODIFIER_KINDS, (self.intensifiers, self.diminishers, self.negations)):
+                for modifier in sorted(modifiers):
+                    modifier_trie.add(modifier, kind)
+            self._modifier_trie = modifier_trie
+        return self._modifier_trie
+
+    def modifier_spans(self, tokens: Sequence['Token']) -> Generator[Tuple[int, int, str], None, None]:
+        """
+        Tuples ``(start, end, kind)`` of the modifiers in ``tokens``
+        including modifiers consisting of multiple tokens like "a little
+        bit". Modifiers do not extend across sentences.
+        """
+        lower_lemmas = [token.lemma_.lower() for token in tokens]
+        return self.modifier_trie.sentence_spans(tokens, lower_lemmas)
 
     def diminished(self, rating: Rating) -> Rating:
         if abs(rating.value) > 1:
@@ -35,353 +163,175 @@ class LanguageSentiment:
         else:
             return rating
 
-    def is_intensifier(self, token: Token) -> bool:
+    # NOTE: The following only find modifiers consisting of a single token, see modifier_spans().
+
+    def is_intensifier(self, token: 'Token') -> bool:
         return token.lemma_.lower() in self.intensifiers
 
-    def is_diminisher(self, token: Token) -> bool:
+    def is_diminisher(self, token: 'Token') -> bool:
         return token.lemma_.lower() in self.diminishers
 
-    def is_negation(self, token: Token) -> bool:
+    def is_negation(self, token: 'Token') -> bool:
         return token.lemma_.lower() in self.negations
 
 
+class WordTrie:
+    """
+    Trie of texts consisting of one or more words, each mapped to a value,
+    that finds the longest of these texts in a sequence of words in a
+    single pass.
+    """
+    def __init__(self):
+        # Each node maps the next word to the node following it and _VALUE_KEY to the value of the text
+        # ending there, if any.
+        self._root: Dict[Optional[str], Any] = {}
+
+    def add_words(self, words: Sequence[str], value: Any):
+        """
+        Add the text consisting of ``words`` mapped to ``value``. If the
+        text has already been added, the value added first remains.
+        """
+        assert words is not None
+        assert value is not None
+
+        if len(words) >= 1:
+            node = self._root
+            for word in words:
+                node = node.setdefault(word, {})
+            node.setdefault(_VALUE_KEY, value)
+
+    def spans(self, words: Sequence[str], start: int=0, end: int=None) \
+            -> Generator[Tuple[int, int, Any], None, None]:
+        """
+        Tuples ``(start, end, value)`` of the longest texts in
+        ``words[start:end]``. Texts do not overlap.
+        """
+        actual_end = end if end is not None else len(words)
+        root = self._root
+        word_index = start
+        while word_index < actual_end:
+            node = root
+            span_end = None
+            span_value = None
+            next_word_index = word_index
+            while next_word_index < actual_end:
+                node = node.get(words[next_word_index])
+                if node is None:
+                    break
+                next_word_index += 1
+                value = node.get(_VALUE_KEY)
+                if value is not None:
+                    span_end = next_word_index
+                    span_value = value
+            if span_end is not None:
+                yield word_index, span_end, span_value
+                word_index = span_end
+            else:
+                word_index += 1
+
+    def sentence_spans(self, tokens: Sequence['Token'], words: Sequence[str]) \
+            -> Generator[Tuple[int, int, Any], None, None]:
+        """
+        Same as :py:meth:`spans` for the ``words`` of ``tokens``, but texts
+        do not extend across sentences.
+        """
+        assert len(tokens) == len(words)
+        sentence_start = 0
+        for token_index in range(1, len(tokens) + 1):
+            if token_index == len(tokens) or tokens[token_index].is_sent_start:
+                yield from self.spans(words, sentence_start, token_index)
+                sentence_start = token_index
+
+
+class ModifierTrie(WordTrie):
+    """
+    :py:class:`WordTrie` of modifiers like "very" or "a little bit"
+    mapped to their kind, for example :py:data:`DIMINISHER`.
+    """
+    def add(self, modifier: str, kind: str):
+        assert modifier is not None
+        assert kind in MODIFIER_KINDS, 'kind=%r' % kind
+        self.add_words(lower_words(modifier), kind)
+
+
+def _add_sentiment_from_csv_row(
+        sentiment_csv_path: str, row_index: int, row: list, kind_to_texts_map: Dict[str, Set[str]],
+        kind_to_text_to_rating_map: Dict[str, Dict[str, Rating]]):
+    row = row + 3 * ['']  # Ensure we have at least 3 cells.
+    kind, text, rating_name = row[:3]
+    if text == '':
+        raise common.OpinionCsvError('text must not be empty', sentiment_csv_path, row_index, 1)
+    texts = kind_to_texts_map.get(kind)
+    if texts is not None:
+        if rating_name != '':
+            raise common.OpinionCsvError(
+                f'rating of {kind} "{text}" must be empty but is: "{rating_name}"', sentiment_csv_path, row_index, 2)
+        texts.add(text)
+    else:
+        text_to_rating_map = kind_to_text_to_rating_map.get(kind)
+        if text_to_rating_map is None:
+            raise common.OpinionCsvError(
+                f'kind "{kind}" must be one of: {_VALID_KINDS}', sentiment_csv_path, row_index, 0)
+        mappable_rating_name = rating_name.replace(' ', '_').upper()
+        try:
+            rating = Rating[mappable_rating_name]
+        except KeyError:
+            raise common.OpinionCsvError(
+                f'rating "{mappable_rating_name}" (transformed from "{rating_name}") '
+                f'must be one of {common.VALID_RATING_NAMES}',
+                sentiment_csv_path, row_index, 2)
+        if text in text_to_rating_map:
+            raise common.OpinionCsvError(
+                f'{kind} "{text}" must be unique but has already been defined', sentiment_csv_path, row_index, 1)
+        text_to_rating_map[text] = rating
+
+
 class EnglishSentiment(LanguageSentiment):
     def __init__(self):
-        super().__init__('en')
-        self.diminishers = {
-            'a little bit',
-            'a little',
-            'almost',
-            'barely',
-            'fairly',
-            'hardly',
-            'just enough',
-            'kind of',
-            'kind-of',
-            'kinda',
-            'kindof',
-            'less',
-            'marginally',
-            'minimally',
-            'mostly',
-            'occasionally',
-            'partly',
-            'pretty',
-            'scarcely',
-            'slightly',
-            'somewhat',
-            'sort of',
-            'sort-of',
-            'sorta',
-            'sortof',
-        }
-        self.intensifiers = {
-            'absolutely',
-            'amazingly',
-            'awfully',
-            'completely',
-            'considerably',
-            'decidedly',
-            'deeply',
-            'dreadfully',
-            'effing',
-            'enormously',
-            'entirely',
-            'especially',
-            'exceptionally',
-            'extremely',
-            'fabulously',
-            'flippin',
-            'flipping',
-            'frickin',
-            'fricking',
-            'friggin',
-            'frigging',
-            'fucking',
-            'fully',
-            'greatly',
-            'hella',
-            'highly',
-            'hugely',
-            'incredibly',
-            'intensely',
-            'majorly',
-            'more',
-            'most',
-            'particularly',
-            'purely',
-            'quite',
-            'really',
-            'remarkably',
-            'so',
-            'substantially',
-            'terribly',
-            'thoroughly',
-            'totally',
-            'tremendously',
-            'uber',
-            'unbelievably',
-            'unusually',
-            'utterly',
-            'very',
-        }
-        self.negatives = {
-            'appalling': Rating.VERY_BAD,
-            'awful': Rating.VERY_BAD,
-            'bad': Rating.BAD,
-            'disgusting': Rating.VERY_BAD,
-            'dreadful': Rating.VERY_BAD,
-            'foul': Rating.VERY_BAD,
-            'poor': Rating.BAD,
-            'subpar': Rating.BAD,
-            'terrible': Rating.VERY_BAD,
-            'unusual': Rating.BAD,
-        }
-        self.positives = {
-            'amazing': Rating.VERY_GOOD,
-            'awesome': Rating.VERY_GOOD,
-            'excellent': Rating.VERY_GOOD,
-            'exceptional': Rating.VERY_GOOD,
-            'fabulous': Rating.VERY_GOOD,
-            'good': Rating.GOOD,
-            'great': Rating.VERY_GOOD,
-            'incredible': Rating.VERY_GOOD,
-            'nice': Rating.GOOD,
-            'remarkable': Rating.VERY_GOOD,
-            'special': Rating.GOOD,
-            'thorough': Rating.VERY_GOOD,
-            'tremendous': Rating.VERY_GOOD,
-            'wonderful': Rating.VERY_GOOD,
-        }
-        self.idioms = {
-            "don't give up your day job": Rating.VERY_BAD,
-            'add insult to injury': Rating.VERY_BAD,
-            'back handed': Rating.VERY_BAD,
-            'back to the drawing board': Rating.VERY_BAD,
-            'barking up the wrong tree': Rating.BAD,
-            'benefit of the doubt': Rating.BAD,
-            'better late than never': Rating.BAD,
-            'bite the bullet': Rating.BAD,
-            'blessing in disguise': Rating.GOOD,
-            'cooking with gas': Rating.VERY_GOOD,
-            'cost an arm and a leg': Rating.VERY_BAD,
-            'cut corners': Rating.VERY_BAD,
-            'cut the mustard': Rating.GOOD,
-            'cutting corners': Rating.VERY_BAD,
-            'elephant in the room': Rating.BAD,
-            'far cry from': Rating.VERY_BAD,
-            'get your act together': Rating.VERY_BAD,
-            'hit the nail on the head': Rating.VERY_GOOD,
-            'kiss of death': Rating.VERY_BAD,
-            'last straw': Rating.VERY_BAD,
-            'missed the boat': Rating.VERY_BAD,
-            'not rocket science': Rating.BAD,
-            'nothing better than': Rating.VERY_GOOD,
-            'old fashioned': Rating.BAD,
-            'on the ball': Rating.VERY_GOOD,
-            'out of hand': Rating.VERY_BAD,
-            'pull your socks up': Rating.VERY_BAD,
-            'the bomb': Rating.VERY_GOOD,
-            'the cold shoulder': Rating.VERY_BAD,
-            'under the weather': Rating.BAD,
-            'up to par': Rating.GOOD,
-            'wild goose chase': Rating.BAD,
-            'yeah right': Rating.BAD,
-        }
-        self.negations = {
-            'ain\'t',
-            'aint',
-            'aren\'t',
-            'arent',
-            'can\'t',
-            'cannot',
-            'cant',
-            'couldn\'t',
-            'couldnt',
-            'daren\'t',
-            'darent',
-            'despite',
-            'didn\'t',
-            'didnt',
-            'doesn\'t',
-            'doesnt',
-            'don\'t',
-            'dont',
-            'hadn\'t',
-            'hadnt',
-            'hasn\'t',
-            'hasnt',
-            'haven\'t',
-            'havent',
-            'isn\'t',
-            'isnt',
-            'mightn\'t',
-            'mightnt',
-            'mustn\'t',
-            'mustnt',
-            'needn\'t',
-            'neednt',
-            'neither',
-            'never',
-            'no',
-            'none',
-            'nope',
-            'nor',
-            'not',
-            'not',
-            'nothing',
-            'nowhere',
-            'oughtn\'t',
-            'oughtnt',
-            'rarely',
-            'seldom',
-            'shan\'t',
-            'shant',
-            'shouldn\'t',
-            'shouldnt',
-            'uh-uh',
-            'wasn\'t',
-            'wasnt',
-            'weren\'t',
-            'werent',
-            'without',
-            'won\'t',
-            'wont',
-            'wouldn\'t',
-            'wouldnt',
-        }
-        self.rating_to_localized_text_map = {
-            rating: rating.name.lower().replace('_', ' ') for rating in Rating
-        }
+        super().__init__('en', sentiment_csv_path('en'))
 
 
 class GermanSentiment(LanguageSentiment):
     def __init__(self):
-        super().__init__('de')
-        self.diminishers = {
-            'eher',
-            'bisschen',
-            'ein wenig',
-            'einigermaßen',
-            'etwas',
-        }
-        self.intensifiers = {
-            'absolut',
-            'besonders',
-            'extrem',
-            'sehr',
-            'total',
-            'voll',
-            'vollkommen',
-            'wirklich',
-            'ziemlich',
-            'zu',
-        }
-        self.negatives = {
-            'ausbaufähig': Rating.BAD,
-            'Bedenken': Rating.SOMEWHAT_BAD,
-            'beschissen': Rating.VERY_BAD,
-            'durchschnittlich': Rating.SOMEWHAT_BAD,
-            'furchtbar': Rating.VERY_BAD,
-            'ineffizient': Rating.BAD,
-            'mau': Rating.SOMEWHAT_BAD,
-            'mühsam': Rating.SOMEWHAT_BAD,
-            'obwohl': Rating.BAD,
-            'schal': Rating.BAD,
-            'schlecht': Rating.BAD,
-            'uncharmant': Rating.BAD,
-            'uneffektiv': Rating.BAD,
-            'ungut': Rating.BAD,
-            'unschön': Rating.SOMEWHAT_BAD,
-            'übel': Rating.BAD,
-            'unterdurchschnittlich': Rating.BAD,
-            'verbesserungsfähig': Rating.BAD,
-            'verbesserungswürdig': Rating.BAD,
-            'wünschenswert': Rating.BAD,
-
-            # TODO: Add special logic for modals.
-            'können': Rating.SOMEWHAT_BAD,
-            'müssen': Rating.SOMEWHAT_BAD,
-            'sollen': Rating.SOMEWHAT_BAD,
-            'wär': Rating.SOMEWHAT_BAD,
-            'wäre': Rating.SOMEWHAT_BAD,
-            'wären': Rating.SOMEWHAT_BAD,
-            'wärn': Rating.SOMEWHAT_BAD,
-        }
-        self.positives = {
-            'ausgezeichnet': Rating.VERY_GOOD,
-            'bestens': Rating.VERY_GOOD,
-            'Charme': Rating.GOOD,
-            'charmant': Rating.GOOD,
-            'cool': Rating.GOOD,
-            'entzückend': Rating.VERY_GOOD,
-            'effektiv': Rating.GOOD,
-            'effizient': Rating.GOOD,
-            'exzellent': Rating.VERY_GOOD,
-            'fantastisch': Rating.VERY_GOOD,
-            'geil': Rating.GOOD,
-            'gern': Rating.GOOD,
-            'gut': Rating.GOOD,
-            'kompetent': Rating.GOOD,
-            'lässig': Rating.GOOD,
-            'leiwand': Rating.GOOD,
-            'nett': Rating.GOOD,
-            'ok': Rating.SOMEWHAT_GOOD,
-            'okay': Rating.SOMEWHAT_GOOD,
-            'passen': Rating.GOOD,
-            'perfekt': Rating.VERY_GOOD,
-            'prima': Rating.VERY_GOOD,
-            'reichhaltig': Rating.GOOD,
-            'reizend': Rating.GOOD,
-            'super': Rating.VERY_GOOD,
-            'toll': Rating.VERY_GOOD,
-            'top': Rating.VERY_GOOD,
-            'überdurchschnittlich': Rating.SOMEWHAT_GOOD,
-            'überzeugend': Rating.SOMEWHAT_GOOD,
-            'vorzüglich': Rating.VERY_GOOD,
-            'weiterempfehlen': Rating.VERY_GOOD,
-            'wunderbar': Rating.VERY_GOOD,
-            'zufrieden': Rating.SOMEWHAT_GOOD
-        }
-        self.idioms = {
-            'gerne wieder': Rating.GOOD,
-            'Gold wert': Rating.VERY_GOOD,
-            'ist spitze': Rating.VERY_GOOD,
-            'könnte etwas Liebe vertragen': Rating.SOMEWHAT_BAD,
-            'luft nach oben': Rating.SOMEWHAT_GOOD,
-            'vom Hocker gerissen': Rating.VERY_GOOD,
-            'weiter so!': Rating.GOOD,
-            'wenig berauschend': Rating.SOMEWHAT_BAD,
-            'würde wieder': Rating.GOOD,
-        }
-        self.negations = {
-            'kein',
-            'keine',
-            'keiner',
-            'keines',
-            'nicht',
-        }
-        self.rating_to_localized_text_map = {
-            Rating.VERY_GOOD: 'sehr gut',
-            Rating.GOOD: 'gut',
-            Rating.SOMEWHAT_GOOD: 'eher gut',
-            Rating.SOMEWHAT_BAD: 'eher schlecht',
-            Rating.BAD: 'schlecht',
-            Rating.VERY_BAD: 'sehr schlecht',
-        }
+        super().__init__('de', sentiment_csv_path('de'))
+
+
+_LANGUAGE_CODE_TO_SENTIMENT_TYPE_MAP: Dict[str, Type[LanguageSentiment]] = {
+    'de': GermanSentiment,
+    'en': EnglishSentiment,
+}
+
+_language_code_to_sentiment_map: Dict[str, LanguageSentiment] = {}
+_cache_lock = threading.Lock()
 
 
 def language_sentiment_for(language_code: str) -> LanguageSentiment:
+    """
+    The :py:class:`LanguageSentiment` for the base language of
+    ``language_code``, for example ``'en_US'`` yields the sentiment for
+    ``'en'``. Each sentiment is read on first use and then shared by all
+    later calls, also across threads.
+    """
     base_code = language_code.split('_')[0]
     if len(base_code) != 2:
         raise ValueError(
             'language base code must be exactly 2 letters but is: %r (derived from %r)'
             % (base_code, language_code))
-    if base_code == 'en':
-        result = EnglishSentiment()
-    elif base_code == 'de':
-        result = GermanSentiment()
-    else:
-        _log.warning('cannot find language sentiment for %r, using empty default sentiment')
-        result = LanguageSentiment(base_code)
+    result = _language_code_to_sentiment_map.get(base_code)
+    if result is None:
+        with _cache_lock:
+            # Check again in case another thread read the sentiment while this one was waiting for the lock.
+            result = _language_code_to_sentiment_map.get(base_code)
+            if result is None:
+                sentiment_type = _LANGUAGE_CODE_TO_SENTIMENT_TYPE_MAP.get(base_code)
+                if sentiment_type is not None:
+                    result = sentiment_type()
+                else:
+                    base_sentiment_csv_path = sentiment_csv_path(base_code)
+                    if os.path.exists(base_sentiment_csv_path):
+                        result = LanguageSentiment(base_code, base_sentiment_csv_path)
+                    else:
+                        _log.warning('cannot find language sentiment for %r, using empty default sentiment', base_code)
+                        result = LanguageSentiment(base_code)
+                _language_code_to_sentiment_map[base_code] = result
     return result
@@ -0,0 +1,317 @@
+"""
+Measure how much memory the components of an analysis need, for example a
+lexicon or a spaCy model, and how memory grows while analyzing documents.
+
+The memory of a component is measured in two ways: the memory Python
+allocated while loading it according to :py:mod:`tracemalloc`, and the
+growth of the resident set size (RSS) of the process, which also includes
+memory allocated outside of Python. For components consisting of plain
+Python objects, :py:func:`type_memory_breakdown` additionally shows which
+kinds of objects take how much memory.
+"""
+import enum
+import gc
+import os
+import sys
+import tracemalloc
+import types
+from typing import Any, Callable, Iterable, List, Optional, TextIO, Tuple
+
+from shapiro import tools
+
+_log = tools.log
+
+#: Default number of documents after which the peak RSS is sampled.
+DEFAULT_RSS_INTERVAL = 10000
+
+#: Default number of types shown for each component.
+DEFAULT_TOP_TYPE_COUNT = 10
+
+#: Objects of these types are shared with other components and consequently not part of the size of a component.
+_SHARED_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, enum.Enum,
+    bool, type(None),
+)
+
+_BYTES_PER_MIB = 1024 * 1024
+
+
+def current_rss() -> Optional[int]:
+    """
+    Current resident set size of the process in bytes or ``None`` if it
+    cannot be determined on this platform.
+    """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as statm_file:
+            resident_page_count = int(statm_file.read().split()[1])
+        result = resident_page_count * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        result = None
+    return result
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Highest resident set size of the process so far in bytes or ``None`` if
+    it cannot be determined on this platform.
+    """
+    try:
+        import resource
+    except ImportError:  # pragma: no cover
+        result = None
+    else:
+        # NOTE: ru_maxrss is in KiB on Linux but in bytes on macOS.
+        bytes_per_unit = 1 if sys.platform == 'darwin' else 1024
+        result = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * bytes_per_unit
+    return result
+
+
+class ComponentMemory:
+    """
+    Memory needed by the component ``name``: the ``traced_size`` in bytes and
+    number of memory blocks ``traced_block_count`` Python allocated for it
+    and the growth of the resident set size ``rss_growth`` in bytes (or
+    ``None`` if unknown).
+    """
+    def __init__(self, name: str, traced_size: int, traced_block_count: int, rss_growth: Optional[int]):
+        assert name is not None
+        self.name = name
+        self.traced_size = traced_size
+        self.traced_block_count = traced_block_count
+        self.rss_growth = rss_growth
+
+    def __str__(self) -> str:
+        return 'ComponentMemory(%s, traced_size=%d, traced_block_count=%d, rss_growth=%s)' % (
+            self.name, self.traced_size, self.traced_block_count, self.rss_growth)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def loaded_with_component_memory(name: str, load: Callable[[], Any]) -> Tuple[Any, ComponentMemory]:
+    """
+    The result of ``load()`` and the memory Python allocated for it
+    according to :py:mod:`tracemalloc` snapshots taken before and after
+    calling it. If :py:mod:`tracemalloc` is not tracing yet, it is started
+    and stopped again afterwards.
+    """
+    is_tracing = tracemalloc.is_tracing()
+    if not is_tracing:
+        tracemalloc.start()
+    try:
+        gc.collect()
+        rss_before = current_rss()
+        snapshot_before = tracemalloc.take_snapshot()
+        result = load()
+        gc.collect()
+        snapshot_after = tracemalloc.take_snapshot()
+        rss_after = current_rss()
+    finally:
+        if not is_tracing:
+            tracemalloc.stop()
+    statistic_diffs = snapshot_after.compare_to(snapshot_before, 'filename')
+    traced_size = sum(statistic_diff.size_diff for statistic_diff in statistic_diffs)
+    traced_block_count = sum(statistic_diff.count_diff for statistic_diff in statistic_diffs)
+    rss_growth = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    return result, ComponentMemory(name, traced_size, traced_block_count, rss_growth)
+
+
+def reachable_objects(root: Any) -> Iterable[Any]:
+    """
+    ``root`` and all objects reachable from it except for objects shared
+    with other components such as classes, modules, functions and enums.
+    """
+    visited_object_ids = set()
+    pending_objects = [root]
+    while len(pending_objects) != 0:
+        some_object = pending_objects.pop()
+        if id(some_object) not in visited_object_ids and not isinstance(some_object, _SHARED_TYPES):
+            visited_object_ids.add(id(some_object))
+            yield some_object
+            pending_objects.extend(gc.get_referents(some_object))
+
+
+def deep_size(root: Any) -> int:
+    """
+    Size in bytes of ``root`` and all :py:func:`reachable_objects`.
+    """
+    return sum(sys.getsizeof(some_object) for some_object in reachable_objects(root))
+
+
+class TypeMemory:
+    """
+    Number of objects of the type ``type_name`` and their total size in
+    bytes.
+    """
+    def __init__(self, type_name: str, object_count: int=0, size: int=0):
+        self.type_name = type_name
+        self.object_count = object_count
+        self.size = size
+
+    def __str__(self) -> str:
+        return 'TypeMemory(%s, object_count=%d, size=%d)' % (self.type_name, self.object_count, self.size)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def type_memory_breakdown(root: Any) -> List[TypeMemory]:
+    """
+    Number and size of :py:func:`reachable_objects` of ``root`` for each
+    type, for example :py:class:`shapiro.analysis.LexiconEntry` or
+    compiled regular expressions, ordered by descending size.
+    """
+    type_name_to_memory_map = {}
+    for some_object in reachable_objects(root):
+        object_type = type(some_object)
+        type_name = object_type.__qualname__ if object_type.__module__ == 'builtins' \
+            else '%s.%s' % (object_type.__module__, object_type.__qualname__)
+        type_memory = type_name_to_memory_map.get(type_name)
+        if type_memory is None:
+            type_memory = TypeMemory(type_name)
+            type_name_to_memory_map[type_name] = type_memory
+        type_memory.object_count += 1
+        type_memory.size += sys.getsizeof(some_object)
+    return sorted(type_name_to_memory_map.values(), key=lambda type_memory: (-type_memory.size, type_memory.type_name))
+
+
+class RssTracker:
+    """
+    Tracker for the peak resident set size every ``interval`` documents, so
+    memory leaks show up as steady growth.
+    """
+    def __init__(self, interval: int=DEFAULT_RSS_INTERVAL):
+        assert interval >= 1
+        self.interval = interval
+        self.document_count = 0
+        #: Pairs of the number of documents processed so far and the peak RSS at that time.
+        self.document_count_and_peak_rss_pairs: List[Tuple[int, Optional[int]]] = [(0, peak_rss())]
+
+    def add_document(self):
+        self.document_count += 1
+        if self.document_count % self.interval == 0:
+            self.document_count_and_peak_rss_pairs.append((self.document_count, peak_rss()))
+
+    def finish(self):
+        """
+        Sample the peak RSS after the last document unless it has just been
+        sampled anyway.
+        """
+        if self.document_count_and_peak_rss_pairs[-1][0] != self.document_count:
+            self.document_count_and_peak_rss_pairs.append((self.document_count, peak_rss()))
+
+
+class MemoryReport:
+    """
+    Memory needed by the components of an analysis, the types of objects
+    they consist of and the peak RSS while processing documents.
+    """
+    def __init__(self):
+        self.component_memories: List[ComponentMemory] = []
+        self.component_name_to_type_memories_map = {}
+        self.rss_tracker: Optional[RssTracker] = None
+
+    def loaded(self, name: str, load: Callable[[], Any], with_type_breakdown: bool=True) -> Any:
+        """
+        The result of ``load()`` while adding the memory needed for it as
+        component ``name``.
+        """
+        _log.info('measuring memory for %s', name)
+        result, component_memory = loaded_with_component_memory(name, load)
+        self.component_memories.append(component_memory)
+        if with_type_breakdown:
+            self.component_name_to_type_memories_map[name] = type_memory_breakdown(result)
+        return result
+
+    def write(self, target_file: TextIO, top_type_count: int=DEFAULT_TOP_TYPE_COUNT):
+        """
+        Write the report as text, showing the ``top_type_count`` types with
+        the most memory for each component.
+        """
+        component_width = max([len('component')] + [
+            len(component_memory.name) for component_memory in self.component_memories])
+        component_format = '%-' + str(component_width) + 's %12s %12s %12s\n'
+        target_file.write(component_format % ('component', 'traced MiB', 'blocks', 'RSS MiB'))
+        for component_memory in self.component_memories:
+            target_file.write(component_format % (
+                component_memory.name,
+                _mib_text(component_memory.traced_size),
+                component_memory.traced_block_count,
+                _mib_text(component_memory.rss_growth),
+            ))
+        for name, type_memories in self.component_name_to_type_memories_map.items():
+            object_count = sum(type_memory.object_count for type_memory in type_memories)
+            size = sum(type_memory.size for type_memory in type_memories)
+            target_file.write('\n%s: %d objects with a deep size of %s MiB\n' % (name, object_count, _mib_text(size)))
+            type_width = max([len('type')] + [len(type_memory.type_name) for type_memory in type_memories])
+            type_format = '  %-' + str(type_width) + 's %10s %12s\n'
+            target_file.write(type_format % ('type', 'objects', 'MiB'))
+            for type_memory in type_memories[:top_type_count]:
+                target_file.write(type_format % (
+                    type_memory.type_name, type_memory.object_count, _mib_text(type_memory.size)))
+        if self.rss_tracker is not None:
+            target_file.write('\n%10s %14s %12s\n' % ('documents', 'peak RSS MiB', 'growth MiB'))
+            previous_peak_rss = None
+            for document_count, document_peak_rss in self.rss_tracker.document_count_and_peak_rss_pairs:
+                growth = document_peak_rss - previous_peak_rss \
+                    if document_peak_rss is not None and previous_peak_rss is not None else None
+                target_file.write(('%10d %14s %12s' % (
+                    document_count, _mib_text(document_peak_rss), _mib_text(growth, '+') if growth is not None else '',
+                )).rstrip() + '\n')
+                previous_peak_rss = document_peak_rss
+
+
+def _mib_text(size: Optional[int], sign: str='') -> str:
+    return ('%' + sign + '.3f') % (size / _BYTES_PER_MIB) if size is not None else '?'
+
+
+def memory_report(
+        lexicon_path: str, language_code: str, text_paths: Iterable[str]=(), encoding: str='utf-8',
+        rss_interval: int=DEFAULT_RSS_INTERVAL) -> MemoryReport:
+    """
+    :py:class:`MemoryReport` for analyzing texts in ``language_code`` with
+    the lexicon stored in ``lexicon_path``. If ``text_paths`` are specified,
+    each of their non empty lines is analyzed as document while tracking
+    the peak RSS every ``rss_interval`` documents.
+    """
+    from shapiro import analysis, models
+    from shapiro.common import Rating, RestaurantTopic
+    from shapiro.language import language_sentiment_for
+    from shapiro.preprocess import create_emoticon_to_name_and_rating_map
+    from shapiro.shalex import texts_from_files
+
+    result = MemoryReport()
+
+    def loaded_lexicon():
+        lexicon = analysis.Lexicon(RestaurantTopic, Rating)
+        lexicon.read_from_csv(lexicon_path, encoding=encoding)
+        # Build the index for lookups in advance so its memory counts towards the lexicon.
+        lexicon.lexicon_entry_for(_NoToken())
+        return lexicon
+
+    lexicon = result.loaded('lexicon', loaded_lexicon)
+    language_sentiment = result.loaded('language sentiment', lambda: language_sentiment_for(language_code))
+    result.loaded('compiled idioms', lambda: language_sentiment.compiled_idiom_to_localized_rating_text_map)
+    result.loaded('emoticons', create_emoticon_to_name_and_rating_map)
+    # The objects of a spaCy model are mostly implemented in Cython and cannot be broken down by type.
+    nlp = result.loaded(
+        'model %s' % language_code, lambda: models.language_model(language_code), with_type_breakdown=False)
+    text_paths = list(text_paths)
+    if len(text_paths) != 0:
+        analysis.add_token_extension(force=True)
+        opinion_miner = analysis.OpinionMiner(nlp, lexicon, language_sentiment)
+        result.rss_tracker = RssTracker(rss_interval)
+        for text in texts_from_files(text_paths, encoding):
+            for _ in opinion_miner.opinions(text):
+                pass
+            result.rss_tracker.add_document()
+        result.rss_tracker.finish()
+    return result
+
+
+class _NoToken:
+    """
+    Token that matches no lexicon entry.
+    """
+    text = ''
+    lemma_ = ''
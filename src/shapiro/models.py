@@ -0,0 +1,108 @@
+"""
+Process wide registry of spaCy language models.
+
+Loading a model takes long and needs a lot of memory, so each model is
+loaded only once per process and shared by everything that asks for it
+using :py:func:`language_model`.
+"""
+import gc
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple
+
+from shapiro import tools
+
+if TYPE_CHECKING:  # pragma: no cover
+    from spacy.language import Language
+
+_log = tools.log
+
+#: Key of a model in the registry: the name of the model and the names of the disabled pipes.
+ModelKey = Tuple[str, Tuple[str, ...]]
+
+#: Pipes that are not needed to obtain lemmas and part of speech tags.
+LEMMA_ONLY_DISABLED_PIPES = ('ner', 'parser')
+
+_model_key_to_language_map: Dict[ModelKey, 'Language'] = {}
+_registry_lock = threading.Lock()
+
+
+def model_key(name: str, disable: Sequence[str]=()) -> ModelKey:
+    assert name is not None
+    assert disable is not None
+    return name, tuple(sorted(set(disable)))
+
+
+def language_model(name: str, disable: Sequence[str]=()) -> 'Language':
+    """
+    The spaCy language model ``name`` with the pipes in ``disable``
+    disabled, for example ``language_model('en', disable=['ner'])``. The
+    model is loaded on first use and shared by all later calls with the same
+    arguments, also across threads.
+
+    Because the model is shared, callers must not modify its pipeline.
+    """
+    key = model_key(name, disable)
+    result = _model_key_to_language_map.get(key)
+    if result is None:
+        with _registry_lock:
+            # Check again in case another thread loaded the model while this one was waiting for the lock.
+            result = _model_key_to_language_map.get(key)
+            if result is None:
+                import spacy
+
+                _log.info('loading language model "%s"', name)
+                result = spacy.load(name, disable=list(key[1]))
+                _model_key_to_language_map[key] = result
+    return result
+
+
+def loaded_model_keys() -> List[ModelKey]:
+    """
+    Keys of the models that have been loaded so far.
+    """
+    with _registry_lock:
+        return list(_model_key_to_language_map.keys())
+
+
+def unload_models():
+    """
+    Remove all models from the registry, so the next call to
+    :py:func:`language_model` loads them again.
+    """
+    with _registry_lock:
+        _model_key_to_language_map.clear()
+
+
+def preload_models(names: Iterable[str], disable: Sequence[str]=()):
+    """
+    Load the models ``names`` before forking worker processes, so the
+    workers can use them without having to load them again, see
+    :py:func:`prepared_fork`.
+    """
+    for name in names:
+        language_model(name, disable)
+
+
+@contextmanager
+def prepared_fork():
+    """
+    Context in which to fork worker processes that share the models loaded
+    so far with the current process.
+
+    Forked processes share the memory pages of their parent until either
+    of them writes to a page. Python's garbage collector writes to every
+    object it tracks, which would copy the pages of the models for each
+    worker. To prevent this, all current objects are moved to a generation
+    the garbage collector ignores (on Python 3.7 and later) until the
+    context is left.
+    """
+    can_freeze = hasattr(gc, 'freeze')
+    if can_freeze:
+        gc.collect()
+        gc.freeze()
+    try:
+        yield
+    finally:
+        if can_freeze:
+            gc.unfreeze()
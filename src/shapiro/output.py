@@ -0,0 +1,338 @@
+"""
+Writers for opinions found during analysis.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from enum import Enum
+from typing import Sequence, TextIO, Tuple
+
+from shapiro.common import CSV_ENCODING, Rating
+
+#: Number of characters collected before they are written to the target file.
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+#: Names of the fields written for each opinion after the key fields.
+OPINION_FIELD_NAMES = ('topic', 'rating', 'text')
+
+#: Path that refers to standard output.
+STDOUT_PATH = '-'
+
+#: Suffix for gzip compressed files.
+GZIP_SUFFIX = '.gz'
+
+
+class OutputFormat(Enum):
+    ARROW = 'arrow'
+    CSV = 'csv'
+    JSON_LINES = 'jsonl'
+    NPY = 'npy'
+
+
+#: Formats that store opinions in binary columns, see :py:mod:`shapiro.columnar`.
+COLUMNAR_OUTPUT_FORMATS = (OutputFormat.ARROW, OutputFormat.NPY)
+
+
+#: Names of valid output formats (to be used for command line options and error messages).
+OUTPUT_FORMAT_NAMES = [output_format.value for output_format in OutputFormat]
+
+
+def enum_text(value: Enum) -> str:
+    """
+    Lower case name of enum ``value`` or an empty string if it is ``None``.
+    """
+    return value.name.lower() if value is not None else ''
+
+
+class OpinionWriter:
+    """
+    Writer for opinions found in documents.
+
+    Use :py:func:`opinion_writer` to obtain a writer for a certain format and
+    path.
+    """
+    def __init__(self, key_names: Sequence[str]=()):
+        assert key_names is not None
+
+        self.key_names = list(key_names)
+        self.field_names = self.key_names + list(OPINION_FIELD_NAMES)
+        self.opinion_count = 0
+
+    def write_header(self):
+        """
+        Write a header describing the fields (if the format supports it).
+        """
+        pass
+
+    def write_opinion(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str]=(),
+                      document_index: int=None, start: int=None, end: int=None):
+        """
+        Write an opinion on ``topic`` with ``rating`` found in ``text``. If
+        the writer has ``key_names``, ``keys`` must contain a value for each
+        of them.
+
+        Optionally ``document_index`` refers to the
+        :py:class:`shapiro.documents.Document` the opinion was found in, and
+        ``start`` and ``end`` are the character offsets of ``text`` within
+        it or ``None`` if unknown. Not all formats store this information.
+        """
+        assert text is not None
+        assert len(keys) == len(self.key_names), \
+            'keys=%r must match key_names=%r' % (keys, self.key_names)
+
+        self._write_opinion(topic, rating, text, keys, document_index, start, end)
+        self.opinion_count += 1
+
+    def _write_opinion(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str],
+                       document_index: int, start: int, end: int):
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Write all buffered opinions to the target.
+        """
+        pass
+
+    def sync(self):
+        """
+        Flush all buffered opinions and, if the target is a file, make sure
+        they have actually been stored on disk.
+        """
+        self.flush()
+
+    def close(self):
+        """
+        Flush all buffered opinions and release the target.
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class BufferedTextOpinionWriter(OpinionWriter):
+    """
+    Writer for opinions to a text file. Rows are collected in a buffer of
+    about ``buffer_size`` characters and written to ``target_file`` in large
+    chunks, which avoids a system call for each opinion.
+    """
+    def __init__(self, target_file: TextIO, key_names: Sequence[str]=(),
+                 buffer_size: int=DEFAULT_BUFFER_SIZE, owns_target_file: bool=False):
+        assert target_file is not None
+        assert buffer_size >= 0
+
+        super().__init__(key_names)
+        self._target_file = target_file
+        self._buffer = io.StringIO()
+        self._buffer_size = buffer_size
+        self._owns_target_file = owns_target_file
+
+    def _write_opinion(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str],
+                       document_index: int, start: int, end: int):
+        self._write_opinion_to_buffer(topic, rating, text, keys)
+        if self._buffer.tell() >= self._buffer_size:
+            self.flush()
+
+    def _write_opinion_to_buffer(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str]):
+        raise NotImplementedError()
+
+    def flush(self):
+        buffered_text = self._buffer.getvalue()
+        if buffered_text:
+            self._target_file.write(buffered_text)
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        self._target_file.flush()
+
+    def sync(self):
+        self.flush()
+        if self._owns_target_file:
+            os.fsync(self._target_file.fileno())
+
+    def close(self):
+        """
+        Flush the buffer and close the target file unless it was provided by
+        the caller.
+        """
+        if self._target_file is not None:
+            try:
+                self.flush()
+            finally:
+                if self._owns_target_file:
+                    self._target_file.close()
+                self._target_file = None
+
+
+class CsvOpinionWriter(BufferedTextOpinionWriter):
+    """
+    Writer for opinions as CSV with an initial comment line describing the
+    fields, for example::
+
+        # topic,rating,text
+        service,very_good,The waiter was very polite.
+    """
+    def __init__(self, target_file: TextIO, key_names: Sequence[str]=(),
+                 buffer_size: int=DEFAULT_BUFFER_SIZE, owns_target_file: bool=False):
+        super().__init__(target_file, key_names, buffer_size, owns_target_file)
+        self._csv_writer = csv.writer(self._buffer, delimiter=',', quotechar='"', lineterminator='\n')
+
+    def write_header(self):
+        header_row = list(self.field_names)
+        header_row[0] = '# ' + header_row[0]
+        self._csv_writer.writerow(header_row)
+
+    def _write_opinion_to_buffer(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str]):
+        self._csv_writer.writerow(list(keys) + [enum_text(topic), enum_text(rating), text])
+
+
+class JsonLinesOpinionWriter(BufferedTextOpinionWriter):
+    """
+    Writer for opinions as `JSON Lines <http://jsonlines.org/>`_ with one
+    object per opinion, for example::
+
+        {"topic": "service", "rating": "very_good", "text": "The waiter was very polite."}
+
+    Missing topics and ratings are written as ``null``.
+    """
+    def _write_opinion_to_buffer(self, topic: Enum, rating: Rating, text: str, keys: Sequence[str]):
+        opinion_map = dict(zip(self.key_names, keys))
+        opinion_map['topic'] = topic.name.lower() if topic is not None else None
+        opinion_map['rating'] = rating.name.lower() if rating is not None else None
+        opinion_map['text'] = text
+        self._buffer.write(json.dumps(opinion_map, ensure_ascii=False))
+        self._buffer.write('\n')
+
+
+_OUTPUT_FORMAT_TO_WRITER_CLASS_MAP = {
+    OutputFormat.CSV: CsvOpinionWriter,
+    OutputFormat.JSON_LINES: JsonLinesOpinionWriter,
+}
+
+
+def output_format_for(output_path: str) -> OutputFormat:
+    """
+    The :py:class:`OutputFormat` derived from the suffix of ``output_path``
+    ignoring a possible trailing ``.gz``. If the suffix is unknown, the result
+    is :py:attr:`OutputFormat.CSV`.
+    """
+    assert output_path is not None
+
+    lower_output_path = output_path.lower()
+    if lower_output_path.endswith(GZIP_SUFFIX):
+        lower_output_path = lower_output_path[:-len(GZIP_SUFFIX)]
+    result = OutputFormat.CSV
+    for output_format in OutputFormat:
+        if lower_output_path.endswith('.' + output_format.value):
+            result = output_format
+            break
+    return result
+
+
+def opinion_writer(
+        output_path: str=STDOUT_PATH, output_format: OutputFormat=None, key_names: Sequence[str]=(),
+        encoding: str=CSV_ENCODING, buffer_size: int=DEFAULT_BUFFER_SIZE, topic_type: Enum=None,
+        append: bool=False) -> OpinionWriter:
+    """
+    :py:class:`OpinionWriter` for ``output_format`` writing to
+    ``output_path``. If ``output_path`` is ``'-'``, the writer uses standard
+    output. If ``output_path`` ends with ``.gz``, the output is compressed
+    using gzip. If no ``output_format`` is specified, it is derived from the
+    suffix of ``output_path``.
+
+    Columnar formats store topics as codes and consequently need the
+    ``topic_type``. They cannot be written to standard output or compressed.
+
+    The header is already written, so the caller only has to add the
+    opinions and close the writer eventually.
+
+    If ``append`` is set, the opinions are added to the end of the existing
+    file ``output_path`` without writing the header again. This only works
+    for text formats written to an uncompressed regular file.
+    """
+    assert output_path is not None
+
+    if output_format is None:
+        output_format = output_format_for(output_path)
+    if append and not can_append(output_path, output_format):
+        raise ValueError('output for format %s cannot be appended to: %r' % (output_format.value, output_path))
+    if output_format in COLUMNAR_OUTPUT_FORMATS:
+        result = _columnar_opinion_writer(output_path, output_format, key_names, topic_type)
+    else:
+        result = _text_opinion_writer(output_path, output_format, key_names, encoding, buffer_size, append)
+    return result
+
+
+def can_append(output_path: str, output_format: OutputFormat=None) -> bool:
+    """
+    ``True`` if opinions in ``output_format`` can be appended to the
+    existing ``output_path``, see :py:func:`opinion_writer`.
+    """
+    assert output_path is not None
+
+    if output_format is None:
+        output_format = output_format_for(output_path)
+    return output_format not in COLUMNAR_OUTPUT_FORMATS \
+        and output_path != STDOUT_PATH \
+        and not output_path.lower().endswith(GZIP_SUFFIX)
+
+
+def _columnar_opinion_writer(
+        output_path: str, output_format: OutputFormat, key_names: Sequence[str], topic_type: Enum) -> OpinionWriter:
+    assert topic_type is not None, 'topic_type must be specified for output_format=%s' % output_format
+
+    if output_path == STDOUT_PATH or output_path.lower().endswith(GZIP_SUFFIX):
+        raise ValueError('output path for format %s must be a regular file or folder but is: %r'
+                         % (output_format.value, output_path))
+    # NOTE: Import here so NumPy and pyarrow are only loaded when actually needed.
+    from shapiro import columnar
+
+    if output_format == OutputFormat.ARROW:
+        writer_class = columnar.ArrowOpinionWriter
+    else:
+        assert output_format == OutputFormat.NPY, 'output_format=%r' % output_format
+        writer_class = columnar.NpyOpinionWriter
+    return writer_class(output_path, topic_type, key_names=key_names)
+
+
+def opened_text_target(output_path: str, encoding: str=CSV_ENCODING, append: bool=False) -> Tuple[TextIO, bool]:
+    """
+    A tuple with the text file to write to ``output_path`` and a flag whether
+    the caller owns it and consequently has to close it. If ``output_path``
+    is ``'-'``, the result refers to standard output. If ``output_path`` ends
+    with ``.gz``, the output is compressed using gzip. If ``append`` is set,
+    an existing file is not replaced but added to.
+    """
+    assert output_path is not None
+
+    if output_path == STDOUT_PATH:
+        target_file = sys.stdout
+        owns_target_file = False
+    elif output_path.lower().endswith(GZIP_SUFFIX):
+        target_file = gzip.open(output_path, 'at' if append else 'wt', encoding=encoding, newline='')
+        owns_target_file = True
+    else:
+        target_file = open(output_path, 'a' if append else 'w', encoding=encoding, newline='')
+        owns_target_file = True
+    return target_file, owns_target_file
+
+
+def _text_opinion_writer(
+        output_path: str, output_format: OutputFormat, key_names: Sequence[str],
+        encoding: str, buffer_size: int, append: bool) -> OpinionWriter:
+    writer_class = _OUTPUT_FORMAT_TO_WRITER_CLASS_MAP[output_format]
+    target_file, owns_target_file = opened_text_target(output_path, encoding, append)
+    try:
+        result = writer_class(target_file, key_names, buffer_size, owns_target_file)
+        if not append:
+            result.write_header()
+    except Exception:
+        if owns_target_file:
+            target_file.close()
+        raise
+    return result
@@ -0,0 +1,289 @@
+"""
+Documents that have already been tokenized, lemmatized and tagged, for
+example by an upstream system, so they can be analyzed without spaCy.
+
+:py:class:`PretokenizedDoc` provides the parts of :py:class:`spacy.tokens.Doc`
+that :py:meth:`shapiro.analysis.OpinionMiner.opinions_of_document` needs.
+Documents can be read from CoNLL-U using :py:func:`documents_from_conllu`
+and from JSON Lines using :py:func:`documents_from_jsonl`.
+"""
+import json
+from typing import Generator, Iterable, List, Optional, Sequence, TextIO, Tuple, Union
+
+from shapiro import common, tools
+from shapiro.documents import Document
+
+_log = tools.log
+
+#: Name of the key with the ID of a pretokenized document.
+DOCUMENT_ID_KEY_NAME = 'document_id'
+
+#: Formats pretokenized documents can be read from.
+PRETOKENIZED_FORMATS = ('conllu', 'jsonl')
+
+#: Text, lemma, part of speech and whether the token is followed by a space.
+TokenTuple = Tuple[str, str, str, bool]
+
+_CONLLU_COLUMN_COUNT = 10
+_CONLLU_NEWDOC_COMMENT = 'newdoc'
+_CONLLU_NEWDOC_ID_COMMENT_PREFIX = 'newdoc id ='
+_CONLLU_NO_SPACE_AFTER = 'SpaceAfter=No'
+
+
+class PretokenizedTokenExtension:
+    """
+    Same as the attributes :py:func:`shapiro.analysis.add_token_extension`
+    adds to spaCy tokens.
+    """
+    __slots__ = (
+        'topic', 'rating', 'is_negation', 'is_intensifier', 'is_diminisher', 'is_modifier_continuation')
+
+    def __init__(self):
+        self.topic = None
+        self.rating = None
+        self.is_negation = False
+        self.is_intensifier = False
+        self.is_diminisher = False
+        self.is_modifier_continuation = False
+
+
+class PretokenizedToken:
+    """
+    Token with the attributes of :py:class:`spacy.tokens.Token` that shapiro
+    uses.
+    """
+    __slots__ = ('text', 'lemma_', 'pos_', 'whitespace_', 'i', 'idx', 'is_sent_start', '_')
+
+    def __init__(self, text: str, lemma: str, pos: str, whitespace: str, i: int, idx: int, is_sent_start: bool):
+        assert text is not None
+        assert lemma is not None
+        assert pos is not None
+        assert whitespace in ('', ' ')
+        self.text = text
+        self.lemma_ = lemma
+        self.pos_ = pos
+        self.whitespace_ = whitespace
+        self.i = i
+        self.idx = idx
+        self.is_sent_start = is_sent_start
+        self._ = PretokenizedTokenExtension()
+
+    @property
+    def lower_(self) -> str:
+        return self.text.lower()
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return 'PretokenizedToken(%r, lemma=%r, pos=%r)' % (self.text, self.lemma_, self.pos_)
+
+
+class PretokenizedSpan:
+    """
+    Sentence in a :py:class:`PretokenizedDoc` similar to
+    :py:class:`spacy.tokens.Span`.
+    """
+    def __init__(self, tokens: Sequence[PretokenizedToken]):
+        assert len(tokens) >= 1
+        self._tokens = tokens
+        self.start_char = tokens[0].idx
+
+    @property
+    def text(self) -> str:
+        return str(self).rstrip()
+
+    def __iter__(self):
+        return iter(self._tokens)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __getitem__(self, index: Union[int, slice]):
+        return self._tokens[index]
+
+    def __str__(self) -> str:
+        # Like spaCy, include the white space after the last token.
+        return ''.join(token.text + token.whitespace_ for token in self._tokens)
+
+
+class PretokenizedDoc:
+    """
+    Tokens of already tokenized, lemmatized and tagged ``sentences``, each
+    consisting of :py:data:`TokenTuple`, similar to
+    :py:class:`spacy.tokens.Doc`. The text of the document consists of the
+    tokens separated by a space unless a token is not followed by one.
+    """
+    def __init__(self, sentences: Iterable[Iterable[TokenTuple]]):
+        assert sentences is not None
+        self._tokens: List[PretokenizedToken] = []
+        self._sentence_starts: List[int] = []
+        idx = 0
+        for sentence in sentences:
+            is_sent_start = True
+            for text, lemma, pos, has_space_after in sentence:
+                if is_sent_start:
+                    self._sentence_starts.append(len(self._tokens))
+                whitespace = ' ' if has_space_after else ''
+                self._tokens.append(
+                    PretokenizedToken(text, lemma, pos, whitespace, len(self._tokens), idx, is_sent_start))
+                idx += len(text) + len(whitespace)
+                is_sent_start = False
+            if not is_sent_start and self._tokens[-1].whitespace_ == '':
+                # Separate sentences even if the last token has no space after it.
+                self._tokens[-1].whitespace_ = ' '
+                idx += 1
+
+    @property
+    def text(self) -> str:
+        return ''.join(token.text + token.whitespace_ for token in self._tokens).rstrip()
+
+    @property
+    def sents(self) -> Generator[PretokenizedSpan, None, None]:
+        sentence_ends = self._sentence_starts[1:] + [len(self._tokens)]
+        for sentence_start, sentence_end in zip(self._sentence_starts, sentence_ends):
+            yield PretokenizedSpan(self._tokens[sentence_start:sentence_end])
+
+    def __iter__(self):
+        return iter(self._tokens)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __getitem__(self, index: Union[int, slice]):
+        return self._tokens[index]
+
+
+class PretokenizedDocument(Document):
+    """
+    :py:class:`shapiro.documents.Document` whose text is already available
+    as :py:class:`PretokenizedDoc`.
+    """
+    def __init__(self, index: int, doc: PretokenizedDoc, keys: Sequence[str]=()):
+        assert doc is not None
+        super().__init__(index, doc.text, keys)
+        self.doc = doc
+
+
+def documents_from_conllu(conllu_file: TextIO, first_index: int=0) \
+        -> Generator[PretokenizedDocument, None, None]:
+    """
+    Documents read from ``conllu_file`` in
+    `CoNLL-U format <https://universaldependencies.org/format.html>`_. A
+    comment ``# newdoc`` starts a new document; without such comments all
+    sentences form a single document. The only key is the ID from
+    ``# newdoc id = ...`` or an empty string. Multiword tokens like
+    "Don't" are represented by their words "Do" and "n't" while empty nodes
+    are ignored.
+    """
+    assert conllu_file is not None
+
+    conllu_name = getattr(conllu_file, 'name', '<io>')
+    index = first_index
+    document_id = ''
+    sentences: List[List[TokenTuple]] = []
+    sentence: List[TokenTuple] = []
+    multiword_last_id: Optional[str] = None
+    multiword_has_space_after = True
+    for line_number, line in enumerate(conllu_file, 1):
+        line = line.rstrip('\n')
+        if line.strip() == '':
+            if len(sentence) >= 1:
+                sentences.append(sentence)
+                sentence = []
+            multiword_last_id = None
+        elif line.startswith('#'):
+            comment = line[1:].strip()
+            if comment == _CONLLU_NEWDOC_COMMENT or comment.startswith(_CONLLU_NEWDOC_ID_COMMENT_PREFIX):
+                if len(sentence) >= 1:
+                    sentences.append(sentence)
+                    sentence = []
+                if len(sentences) >= 1:
+                    yield PretokenizedDocument(index, PretokenizedDoc(sentences), (document_id,))
+                    index += 1
+                    sentences = []
+                document_id = comment[len(_CONLLU_NEWDOC_ID_COMMENT_PREFIX):].strip() \
+                    if comment.startswith(_CONLLU_NEWDOC_ID_COMMENT_PREFIX) else ''
+        else:
+            columns = line.split('\t')
+            if len(columns) != _CONLLU_COLUMN_COUNT:
+                raise common.OpinionError('%s:%d: CoNLL-U token line must have %d tab separated columns but has %d'
+                                          % (conllu_name, line_number, _CONLLU_COLUMN_COUNT, len(columns)))
+            token_id, text, lemma, pos = columns[:4]
+            has_space_after = _CONLLU_NO_SPACE_AFTER not in columns[9].split('|')
+            if '-' in token_id:
+                # Multiword token like "Don't" for the words "Do" and "n't", which keep its spacing.
+                multiword_last_id = token_id.split('-')[1]
+                multiword_has_space_after = has_space_after
+            elif '.' not in token_id:
+                if multiword_last_id is not None:
+                    has_space_after = multiword_has_space_after if token_id == multiword_last_id else False
+                    if token_id == multiword_last_id:
+                        multiword_last_id = None
+                sentence.append((text, lemma if lemma != '_' else text, pos, has_space_after))
+    if len(sentence) >= 1:
+        sentences.append(sentence)
+    if len(sentences) >= 1:
+        yield PretokenizedDocument(index, PretokenizedDoc(sentences), (document_id,))
+
+
+def documents_from_jsonl(jsonl_file: TextIO, first_index: int=0) -> Generator[PretokenizedDocument, None, None]:
+    """
+    Documents read from ``jsonl_file`` with one JSON object per line, for
+    example::
+
+        {"id": "1", "sentences": [[{"text": "Tasty", "lemma": "tasty", "pos": "ADJ", "space_after": false},
+                                   {"text": "!", "lemma": "!", "pos": "PUNCT"}]]}
+
+    The ``id`` is optional and used as only key. If ``lemma`` is missing,
+    the ``text`` is used; ``pos`` and ``space_after`` default to an empty
+    string and ``true``.
+    """
+    assert jsonl_file is not None
+
+    jsonl_name = getattr(jsonl_file, 'name', '<io>')
+    index = first_index
+    for line_number, line in enumerate(jsonl_file, 1):
+        if line.strip() != '':
+            try:
+                document_object = json.loads(line)
+                sentences = [
+                    [_token_tuple_from_json(token_object) for token_object in sentence_object]
+                    for sentence_object in document_object['sentences']
+                ]
+                document_id = document_object.get('id')
+            except (AttributeError, KeyError, TypeError, ValueError) as error:
+                raise common.OpinionError('%s:%d: cannot read pretokenized document: %s'
+                                          % (jsonl_name, line_number, error))
+            yield PretokenizedDocument(
+                index, PretokenizedDoc(sentences), (str(document_id) if document_id is not None else '',))
+            index += 1
+
+
+def _token_tuple_from_json(token_object: dict) -> TokenTuple:
+    text = token_object['text']
+    if not isinstance(text, str):
+        raise TypeError('text of token must be a string but is: %r' % text)
+    lemma: Optional[str] = token_object.get('lemma')
+    return text, lemma if lemma is not None else text, token_object.get('pos', ''), \
+        bool(token_object.get('space_after', True))
+
+
+def documents_from_pretokenized_files(
+        pretokenized_paths: Sequence[str], pretokenized_format: str, encoding: str=common.CSV_ENCODING) \
+        -> Generator[PretokenizedDocument, None, None]:
+    """
+    Documents read one after another from ``pretokenized_paths`` in
+    ``pretokenized_format``, which is one of
+    :py:data:`PRETOKENIZED_FORMATS`.
+    """
+    assert pretokenized_format in PRETOKENIZED_FORMATS, 'pretokenized_format=%r' % pretokenized_format
+
+    documents_from = documents_from_conllu if pretokenized_format == 'conllu' else documents_from_jsonl
+    index = 0
+    for pretokenized_path in pretokenized_paths:
+        _log.info('reading pretokenized documents from "%s"', pretokenized_path)
+        with open(pretokenized_path, encoding=encoding) as pretokenized_file:
+            for document in documents_from(pretokenized_file, index):
+                yield document
+                index = document.index + 1
@@ -0,0 +1,292 @@
+"""
+Measure where the time goes when analyzing texts.
+
+:py:class:`TimingStats` keeps the cumulative wall and CPU time of each stage,
+for example preprocessing or a certain component of the spaCy pipeline.
+:py:func:`profiled` additionally collects detailed data using
+:py:mod:`cProfile` and stores it as collapsed stacks for flame graphs.
+"""
+import cProfile
+import os
+import pstats
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Generator, Iterable, List, Optional, TextIO, Tuple
+
+from shapiro import tools
+
+if TYPE_CHECKING:  # pragma: no cover
+    from spacy.language import Language
+    from spacy.tokens import Doc
+
+_log = tools.log
+
+#: Prefix of the stages for the components of the spaCy pipeline.
+SPACY_STAGE_PREFIX = 'spacy.'
+
+#: Stage for the tokenizer, which is not part of the pipeline.
+TOKENIZER_STAGE = SPACY_STAGE_PREFIX + 'tokenizer'
+
+#: Suffix of the file the collapsed stacks are written to by :py:func:`profiled`.
+COLLAPSED_STACKS_SUFFIX = '.collapsed'
+
+#: Maximum depth of collapsed stacks; deeper calls are attributed to the stack at this depth.
+_MAX_STACK_DEPTH = 200
+
+#: Collapsed stacks with less time are omitted.
+_MIN_COLLAPSED_STACK_MICROSECONDS = 1
+
+
+def cpu_time() -> float:
+    """
+    CPU time of the current process in seconds, including the time of all
+    its threads, for example those spaCy and numpy use for a single stage.
+    Stages and the total of :py:meth:`TimingStats.write_report` must use
+    this same clock, otherwise the time reported as ``other`` is
+    meaningless.
+    """
+    return time.process_time()
+
+
+class StageTiming:
+    """
+    Cumulative wall and CPU time in seconds and number of calls of a stage.
+    """
+    def __init__(self, wall_time: float=0.0, cpu_time: float=0.0, call_count: int=0):
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.call_count = call_count
+
+    def add(self, wall_time: float, cpu_time: float, call_count: int=1):
+        self.wall_time += wall_time
+        self.cpu_time += cpu_time
+        self.call_count += call_count
+
+    def __str__(self) -> str:
+        return 'StageTiming(wall_time=%f, cpu_time=%f, call_count=%d)' % (
+            self.wall_time, self.cpu_time, self.call_count)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class TimingStats:
+    """
+    Cumulative timing of the stages of an analysis, for example
+    ``'preprocess'`` or ``'spacy.parser'``, in the order the stages were
+    first measured.
+
+    Unless ``enabled``, measuring does nothing, so code can always call
+    :py:meth:`measured` without slowing down.
+    """
+    def __init__(self, enabled: bool=False):
+        self.enabled = enabled
+        self._stage_to_timing_map: Dict[str, StageTiming] = {}
+
+    def reset(self):
+        """
+        Discard all timings measured so far.
+        """
+        self._stage_to_timing_map.clear()
+
+    @contextmanager
+    def measured(self, stage: str):
+        """
+        Context that adds the time it took to the timing of ``stage``.
+        """
+        if self.enabled:
+            start_wall_time = time.perf_counter()
+            start_cpu_time = cpu_time()
+            try:
+                yield
+            finally:
+                self.add(stage, time.perf_counter() - start_wall_time, cpu_time() - start_cpu_time)
+        else:
+            yield
+
+    def add(self, stage: str, wall_time: float, cpu_time: float, call_count: int=1):
+        assert stage is not None
+
+        timing = self._stage_to_timing_map.get(stage)
+        if timing is None:
+            timing = StageTiming()
+            self._stage_to_timing_map[stage] = timing
+        timing.add(wall_time, cpu_time, call_count)
+
+    def merge(self, other: 'TimingStats'):
+        """
+        Add the timings of ``other``, for example from a worker process.
+        """
+        for stage, timing in other.stage_and_timing_pairs():
+            self.add(stage, timing.wall_time, timing.cpu_time, timing.call_count)
+
+    def timing(self, stage: str) -> Optional[StageTiming]:
+        return self._stage_to_timing_map.get(stage)
+
+    def stage_and_timing_pairs(self) -> List[Tuple[str, StageTiming]]:
+        return list(self._stage_to_timing_map.items())
+
+    def write_report(self, target_file: TextIO, total_wall_time: float=None, total_cpu_time: float=None):
+        """
+        Write a table with the timing of each stage and its share of the
+        total wall time. If ``total_wall_time`` is specified, the time not
+        spent in any stage is reported as ``other``.
+        """
+        stage_and_timing_pairs = self.stage_and_timing_pairs()
+        stage_wall_time = sum(timing.wall_time for _, timing in stage_and_timing_pairs)
+        stage_cpu_time = sum(timing.cpu_time for _, timing in stage_and_timing_pairs)
+        if total_wall_time is not None:
+            other_timing = StageTiming(
+                max(0.0, total_wall_time - stage_wall_time),
+                max(0.0, total_cpu_time - stage_cpu_time) if total_cpu_time is not None else 0.0)
+            stage_and_timing_pairs.append(('other', other_timing))
+            total_timing = StageTiming(total_wall_time, total_cpu_time if total_cpu_time is not None else 0.0)
+        else:
+            total_timing = StageTiming(stage_wall_time, stage_cpu_time)
+        stage_width = max([len('total')] + [len(stage) for stage, _ in stage_and_timing_pairs])
+        line_format = '%-' + str(stage_width) + 's %10s %10s %10s %7s %12s'
+        target_file.write((line_format % ('stage', 'calls', 'wall s', 'cpu s', 'wall %', 'wall ms/call')) + '\n')
+        for stage, timing in stage_and_timing_pairs + [('total', total_timing)]:
+            wall_share = 100.0 * timing.wall_time / total_timing.wall_time if total_timing.wall_time > 0 else 0.0
+            wall_time_per_call = 1000.0 * timing.wall_time / timing.call_count if timing.call_count != 0 else None
+            target_file.write((line_format % (
+                stage,
+                timing.call_count if timing.call_count != 0 else '',
+                '%.3f' % timing.wall_time,
+                '%.3f' % timing.cpu_time,
+                '%.1f' % wall_share,
+                '%.3f' % wall_time_per_call if wall_time_per_call is not None else '',
+            )).rstrip() + '\n')
+
+
+def parsed_document(nlp: 'Language', text: str, stats: TimingStats) -> 'Doc':
+    """
+    Same as ``nlp(text)`` but if ``stats`` are enabled, measuring the
+    tokenizer and each component of the pipeline as separate stage.
+    """
+    if stats.enabled:
+        with stats.measured(TOKENIZER_STAGE):
+            result = nlp.make_doc(text)
+        for name, component in nlp.pipeline:
+            with stats.measured(SPACY_STAGE_PREFIX + name):
+                result = component(result)
+    else:
+        result = nlp(text)
+    return result
+
+
+def parsed_documents(nlp: 'Language', texts: Iterable[str], stats: TimingStats, batch_size: int) \
+        -> Iterable['Doc']:
+    """
+    Same as ``nlp.pipe(texts, batch_size=batch_size)`` but if ``stats`` are
+    enabled, measuring the tokenizer and each component of the pipeline as
+    separate stage. Each batch counts as one call.
+    """
+    return _measured_parsed_documents(nlp, texts, stats, batch_size) if stats.enabled \
+        else nlp.pipe(texts, batch_size=batch_size)
+
+
+def _measured_parsed_documents(nlp: 'Language', texts: Iterable[str], stats: TimingStats, batch_size: int) \
+        -> Generator['Doc', None, None]:
+    for batch_texts in tools.chunked(texts, batch_size):
+        with stats.measured(TOKENIZER_STAGE):
+            documents = [nlp.make_doc(text) for text in batch_texts]
+        for name, component in nlp.pipeline:
+            with stats.measured(SPACY_STAGE_PREFIX + name):
+                if hasattr(component, 'pipe'):
+                    documents = list(component.pipe(documents, batch_size=batch_size))
+                else:
+                    documents = [component(document) for document in documents]
+        yield from documents
+
+
+@contextmanager
+def profiled(profile_path: Optional[str]):
+    """
+    Context that, if ``profile_path`` is not ``None``, profiles all code
+    run within it using :py:mod:`cProfile`. The data are written to
+    ``profile_path``, which can be examined using :py:mod:`pstats` or tools
+    like snakeviz, and as collapsed stacks to ``profile_path`` with the
+    suffix ``.collapsed``, which can be turned into flame graphs.
+    """
+    if profile_path is None:
+        yield
+    else:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            _log.info('writing profile to "%s"', profile_path)
+            profile.dump_stats(profile_path)
+            collapsed_stacks_path = profile_path + COLLAPSED_STACKS_SUFFIX
+            _log.info('writing collapsed stacks to "%s"', collapsed_stacks_path)
+            write_collapsed_stacks(collapsed_stacks_path, pstats.Stats(profile))
+
+
+def collapsed_stacks(stats: pstats.Stats) -> Counter:
+    """
+    Map of stacks of function names separated by semicolons to the time in
+    microseconds spent in the last function of the stack.
+
+    :py:mod:`cProfile` only records which function called which other
+    function but not the whole stack. The stacks are therefore derived
+    from the call graph: the time of a function called from different
+    places is split among its callers in proportion to the time it took
+    when called from each of them.
+    """
+    # Each value is a tuple (primitive_call_count, call_count, total_time, cumulative_time, callers).
+    function_to_stats_map = stats.stats
+    caller_to_callee_time_map: Dict[tuple, Dict[tuple, float]] = {}
+    for function, (_, _, _, _, callers) in function_to_stats_map.items():
+        for caller, caller_stats in callers.items():
+            # NOTE: Depending on the Python version caller_stats is a tuple or just a call count.
+            cumulative_time = caller_stats[3] if isinstance(caller_stats, tuple) else 0.0
+            caller_to_callee_time_map.setdefault(caller, {})[function] = cumulative_time
+    result = Counter()
+
+    def add_stack(function: tuple, stack: List[str], stack_functions: set, time_in_stack: float):
+        _, _, total_time, cumulative_time, _ = function_to_stats_map[function]
+        if cumulative_time > 0:
+            share = min(1.0, time_in_stack / cumulative_time)
+            self_microseconds = int(round(total_time * share * 1000000))
+            if self_microseconds >= _MIN_COLLAPSED_STACK_MICROSECONDS:
+                result[';'.join(stack)] += self_microseconds
+            if len(stack) < _MAX_STACK_DEPTH:
+                for callee, callee_time in caller_to_callee_time_map.get(function, {}).items():
+                    callee_time_in_stack = callee_time * share
+                    is_recursion = callee in stack_functions
+                    if not is_recursion and callee_time_in_stack * 1000000 >= _MIN_COLLAPSED_STACK_MICROSECONDS:
+                        stack_functions.add(callee)
+                        stack.append(_function_name(callee))
+                        add_stack(callee, stack, stack_functions, callee_time_in_stack)
+                        stack.pop()
+                        stack_functions.remove(callee)
+
+    for function, (_, _, _, cumulative_time, callers) in function_to_stats_map.items():
+        if len(callers) == 0:
+            add_stack(function, [_function_name(function)], {function}, cumulative_time)
+    return result
+
+
+def _function_name(function: tuple) -> str:
+    path, line_number, name = function
+    if path == '~':
+        # Built in function, for example "<built-in method builtins.len>".
+        result = name
+    else:
+        result = '%s (%s:%d)' % (name, os.path.basename(path), line_number)
+    # Semicolons separate the functions of a collapsed stack.
+    return result.replace(';', ',')
+
+
+def write_collapsed_stacks(target_path: str, stats: pstats.Stats):
+    """
+    Write the :py:func:`collapsed_stacks` of ``stats`` to ``target_path``
+    in the format used by ``flamegraph.pl`` and speedscope.
+    """
+    with open(target_path, 'w', encoding='utf-8') as target_file:
+        for stack, microseconds in sorted(collapsed_stacks(stats).items()):
+            target_file.write('%s %d\n' % (stack, microseconds))
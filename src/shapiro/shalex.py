@@ -1,43 +1,96 @@
 """
-Show lemmas found in a text file that are not already part of a lexicon.
+Show lemmas found in text files that are not already part of a lexicon.
 """
 import argparse
+import csv
+import heapq
 import logging
 import sys
-from typing import List
+from collections import Counter
+from typing import Dict, Generator, Iterable, List, Sequence, TextIO, Tuple
 
-import spacy
-from spacy.tokens import Token
+from spacy.language import Language
+from spacy.tokens import Doc, Token
 
-from shapiro import tools
-from shapiro.analysis import Lexicon, LexiconEntry
-from shapiro.common import RestaurantTopic
+from shapiro import __version__, models, tools
+from shapiro.analysis import DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, Lexicon, parallel_counts
+from shapiro.common import CSV_ENCODING, RestaurantTopic
+from shapiro.output import STDOUT_PATH, opened_text_target
 
 _log = tools.log
 
+#: Header row of the unknown lemmas, which uses the columns of a lexicon followed by the count.
+UNKNOWN_LEMMA_HEADER_ROW = ['# Lemma', 'POS', 'Topic', 'Rating', 'Count']
+
 
 def _parsed_args(arguments: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description=__doc__.strip()
     )
     parser.add_argument(
-        "lexicon_path", metavar="LEXICON", help="existing lexicon file"
+        "--encoding", "-e", default=CSV_ENCODING,
+        help="encoding of LEXICON and TEXT; default: %(default)s"
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1,
+        help="number of worker processes analyzing in parallel, 0=number of CPUs; default: %(default)s"
+    )
+    parser.add_argument(
+        "--language", "-l", default="en",
+        help="two letter ISO-639-1 language code for spaCy; default: %(default)s"
     )
     parser.add_argument(
-        "text_path", metavar="TEXT", help="text file"
+        "--min-count", "-c", type=int, default=2, metavar="NUMBER",
+        help="only include lemmas found at least NUMBER times; default: %(default)s"
     )
     parser.add_argument(
-        "--version", action="version", version="TODO"
+        "--number", "-n", type=int, default=0,
+        help="number of most common unknown lemmas to write, 0=all; default: %(default)s"
     )
-    return parser.parse_args(arguments)
+    parser.add_argument(
+        "--output", "-o", dest="output_path", default=STDOUT_PATH, metavar="OUTPUT",
+        help='CSV file to write unknown lemmas to, "-"=standard output; default: %(default)s'
+    )
+    parser.add_argument(
+        "--stopwords", "-s", dest="count_stopwords", action="store_true",
+        help="enable to also include stopwords"
+    )
+    parser.add_argument(
+        "--version", action="version", version="%(prog)s " + __version__
+    )
+    parser.add_argument(
+        "lexicon_path", metavar="LEXICON", help="existing lexicon file"
+    )
+    parser.add_argument(
+        "text_paths", metavar="TEXT", nargs="+", help="text file(s) with one or more texts per line"
+    )
+    result = parser.parse_args(arguments)
+    if result.jobs < 0:
+        parser.error('--jobs must be at least 0 but is: %d' % result.jobs)
+    if result.min_count < 1:
+        parser.error('--min-count must be at least 1 but is: %d' % result.min_count)
+    if result.number < 0:
+        parser.error('--number must be at least 0 but is: %d' % result.number)
+    return result
 
 
 def process(arguments=None):
     result = 1
     try:
-        arguments = _parsed_args(arguments)
-        print(arguments.lexicon_path)
-        unknown_lexicon_lemma_from(arguments.lexicon_path, arguments.text_path)
+        args = _parsed_args(arguments)
+        lexicon = Lexicon(RestaurantTopic)
+        lexicon.read_from_csv(args.lexicon_path, encoding=args.encoding)
+        nlp = models.language_model(args.language, disable=models.LEMMA_ONLY_DISABLED_PIPES)
+        lemma_pos_to_count_map = unknown_lemma_pos_to_count_map(
+            nlp, lexicon, texts_from_files(args.text_paths, args.encoding), args.jobs,
+            count_stopwords=args.count_stopwords)
+        target_file, owns_target_file = opened_text_target(args.output_path, args.encoding)
+        try:
+            write_unknown_lemmas(
+                target_file, ranked_unknown_lemmas(lemma_pos_to_count_map, args.min_count, args.number))
+        finally:
+            if owns_target_file:
+                target_file.close()
         result = 0
     except KeyboardInterrupt:  # pragma: no cover
         _log.error('interrupted as requested by user')
@@ -49,19 +102,123 @@ def process(arguments=None):
     return result
 
 
-def unknown_lexicon_lemma_from(en_restauranteering_csv_path: str, restaurant_feedback_txt_path: str):
-    # shalex.process([en_restauranteering_csv_path, restaurant_feedback_txt_path])
-    lexicon = Lexicon(RestaurantTopic)
-    lexicon.read_from_csv(en_restauranteering_csv_path)
-
-    with open(restaurant_feedback_txt_path, "r", encoding="utf-8") as restaurant_feedback_txt_file:
-        feedback_text = restaurant_feedback_txt_file.read()
+def texts_from_files(text_paths: Sequence[str], encoding: str=CSV_ENCODING) -> Generator[str, None, None]:
+    """
+    Non empty lines of all ``text_paths`` without reading the whole files
+    into memory.
+    """
+    for text_path in text_paths:
+        _log.info('reading texts from "%s"', text_path)
+        with open(text_path, encoding=encoding) as text_file:
+            for line in text_file:
+                text = line.strip()
+                if text != '':
+                    yield text
+
+
+class UnknownLemmaCounter:
+    """
+    Counter for pairs of lemmas and part of speech tags of tokens that do
+    not match any entry of ``lexicon``. Like with
+    :py:class:`shapiro.analysis.LemmaCounter` only tokens with a lemma that
+    starts with a (Unicode) letter are considered.
+    """
+    def __init__(self, nlp: Language, lexicon: Lexicon, count_stopwords: bool=False):
+        assert nlp is not None
+        assert lexicon is not None
+
+        self._nlp = nlp
+        self._lexicon = lexicon
+        self._count_stopwords = count_stopwords
+        self._stopwords = nlp.Defaults.stop_words
+        # Cache for whether tokens with a certain text and lemma are unknown
+        # (as long as the token itself is not a stop word).
+        self._text_lemma_to_is_unknown_map: Dict[Tuple[str, str], bool] = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all counts.
+        """
+        self.lemma_pos_to_count_map = Counter()
+
+    def count_texts(self, texts: Iterable[str], batch_size: int=DEFAULT_BATCH_SIZE):
+        """
+        Count unknown lemmas in all ``texts`` while letting spaCy process
+        ``batch_size`` of them at once.
+        """
+        for document in self._nlp.pipe(texts, batch_size=batch_size):
+            self.count_document(document)
+
+    def count_document(self, document: Doc):
+        self.lemma_pos_to_count_map.update(self._unknown_lemma_pos_pairs(document))
+
+    def _unknown_lemma_pos_pairs(self, document: Doc) -> Generator[Tuple[str, str], None, None]:
+        for token in document:
+            lemma = token.lemma_
+            text_lemma_pair = (token.text, lemma)
+            is_unknown = self._text_lemma_to_is_unknown_map.get(text_lemma_pair)
+            if is_unknown is None:
+                is_proper_word = (len(lemma) >= 1) and lemma[0].isalpha()
+                is_unknown = is_proper_word \
+                    and (self._count_stopwords or lemma.lower() not in self._stopwords) \
+                    and self._lexicon.lexicon_entry_for(token) is None
+                self._text_lemma_to_is_unknown_map[text_lemma_pair] = is_unknown
+            if is_unknown and (self._count_stopwords or not token.is_stop):
+                yield lemma, token.pos_
+
+
+def unknown_lemma_pos_to_count_map(
+        nlp: Language, lexicon: Lexicon, texts: Iterable[str], jobs: int=1, count_stopwords: bool=False,
+        batch_size: int=DEFAULT_BATCH_SIZE, chunk_size: int=DEFAULT_CHUNK_SIZE) -> Counter:
+    """
+    Counts of pairs of lemma and part of speech tag in ``texts`` that are
+    not part of ``lexicon``. If ``jobs`` is not 1, worker processes forked
+    from the current process count ``chunk_size`` texts each in parallel,
+    with 0 meaning the number of CPUs available, see
+    :py:func:`shapiro.analysis.parallel_counts`.
+    """
+    counter = UnknownLemmaCounter(nlp, lexicon, count_stopwords=count_stopwords)
+    return parallel_counts(counter, texts, jobs, batch_size, chunk_size, Counter.update)
+
+
+def ranked_unknown_lemmas(
+        lemma_pos_to_count_map: Dict[Tuple[str, str], int], min_count: int=1, number: int=0) \
+        -> List[Tuple[int, str, str]]:
+    """
+    Tuples ``(count, lemma, pos)`` for the ``number`` most common lemmas
+    (0 = all) found at least ``min_count`` times, ordered by descending
+    count and then by lemma and part of speech.
+    """
+    assert min_count >= 1
+    assert number >= 0
+
+    def rank_key(count_lemma_pos: Tuple[int, str, str]):
+        count, lemma, pos = count_lemma_pos
+        return -count, lemma, pos
+
+    count_lemma_pos_tuples = (
+        (count, lemma, pos)
+        for (lemma, pos), count in lemma_pos_to_count_map.items()
+        if count >= min_count
+    )
+    if number == 0:
+        result = sorted(count_lemma_pos_tuples, key=rank_key)
+    else:
+        result = heapq.nsmallest(number, count_lemma_pos_tuples, key=rank_key)
+    return result
 
-    nlp_en = spacy.load("en")
 
-    document = nlp_en(feedback_text)
-    for sentence in document.sents:
-        yield from unknown_lexicon_lemmas(lexicon, sentence)
+def write_unknown_lemmas(target_file: TextIO, count_lemma_pos_tuples: Iterable[Tuple[int, str, str]]):
+    """
+    Write ``count_lemma_pos_tuples`` as CSV with the columns of a lexicon
+    and the count as additional column, so rows can be pasted into a
+    lexicon and completed with a topic and rating.
+    """
+    csv_writer = csv.writer(target_file, delimiter=',', quotechar='"', lineterminator='\n')
+    csv_writer.writerow(UNKNOWN_LEMMA_HEADER_ROW)
+    for count, lemma, pos in count_lemma_pos_tuples:
+        csv_writer.writerow([lemma, pos, '', '', count])
 
 
 def unknown_lexicon_lemmas(lexicon: Lexicon, tokens: List[Token]):
@@ -0,0 +1,195 @@
+"""
+Approximate counting with bounded memory.
+"""
+import heapq
+from typing import Any, Dict, Hashable, Iterable, List, Tuple
+
+
+class SpaceSavingCounter:
+    """
+    Approximate counter that keeps at most ``capacity`` keys in memory using
+    the Space-Saving algorithm by Metwally, Agrawal and El Abbadi (2005),
+    "Efficient Computation of Frequent and Top-k Elements in Data Streams".
+
+    If all keys fit into memory, the counts are exact. Otherwise the key with
+    the lowest count is replaced by the new key, which inherits this count
+    as possible error. This guarantees that:
+
+    * the true count of a key is between ``count - error`` and ``count``;
+    * each error is at most :py:attr:`max_error`, which is at most
+      ``total / capacity``;
+    * every key whose true count exceeds ``total / capacity`` is retained.
+    """
+    def __init__(self, capacity: int):
+        assert capacity >= 1
+
+        self.capacity = capacity
+        #: Total of all counts added, including those of keys no longer retained.
+        self.total = 0
+        self._key_to_count_map: Dict[Hashable, int] = {}
+        self._key_to_error_map: Dict[Hashable, int] = {}
+        # Min heap of (count, key) to find the key to replace. Entries are
+        # updated lazily, so a count can be lower than the actual one.
+        self._count_and_key_heap: List[Tuple[int, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._key_to_count_map)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._key_to_count_map
+
+    def __getitem__(self, key: Hashable) -> int:
+        return self._key_to_count_map.get(key, 0)
+
+    def __eq__(self, other) -> bool:
+        return dict(self.items()) == dict(other.items())
+
+    def items(self) -> Iterable[Tuple[Hashable, int]]:
+        return self._key_to_count_map.items()
+
+    def items_with_error(self) -> Iterable[Tuple[Hashable, int, int]]:
+        """
+        Tuples ``(key, count, error)`` for each retained key.
+        """
+        for key, count in self._key_to_count_map.items():
+            yield key, count, self._key_to_error_map.get(key, 0)
+
+    @staticmethod
+    def restored(capacity: int, total: int, keys_counts_and_errors: Iterable[Tuple[Hashable, int, int]]) \
+            -> 'SpaceSavingCounter':
+        """
+        Counter with the state of a counter that provided
+        ``keys_counts_and_errors`` using :py:meth:`items_with_error`.
+        """
+        result = SpaceSavingCounter(capacity)
+        for key, count, error in keys_counts_and_errors:
+            assert count >= 1
+            assert 0 <= error <= count
+            result._key_to_count_map[key] = count
+            if error != 0:
+                result._key_to_error_map[key] = error
+        if len(result) > capacity:
+            raise ValueError('number of keys to restore must be at most %d but is %d' % (capacity, len(result)))
+        result.total = total
+        result._rebuild_heap()
+        return result
+
+    def error(self, key: Hashable) -> int:
+        """
+        Maximum amount by which the count of ``key`` might be too high.
+        """
+        return self._key_to_error_map.get(key, 0)
+
+    @property
+    def is_exact(self) -> bool:
+        """
+        ``True`` as long as no key has been replaced.
+        """
+        return self.max_error == 0
+
+    @property
+    def max_error(self) -> int:
+        return max(self._key_to_error_map.values(), default=0)
+
+    def add(self, key: Hashable, count: int=1):
+        assert count >= 1
+
+        self.total += count
+        key_to_count_map = self._key_to_count_map
+        if key in key_to_count_map:
+            key_to_count_map[key] += count
+        elif len(key_to_count_map) < self.capacity:
+            key_to_count_map[key] = count
+            heapq.heappush(self._count_and_key_heap, (count, key))
+        else:
+            min_count, min_key = self._popped_min_count_and_key()
+            del key_to_count_map[min_key]
+            self._key_to_error_map.pop(min_key, None)
+            key_to_count_map[key] = min_count + count
+            self._key_to_error_map[key] = min_count
+            heapq.heappush(self._count_and_key_heap, (min_count + count, key))
+
+    def update(self, keys: Iterable[Hashable]):
+        """
+        Add 1 for each key in ``keys``.
+        """
+        add = self.add
+        for key in keys:
+            add(key)
+
+    def _popped_min_count_and_key(self) -> Tuple[int, Hashable]:
+        if len(self._count_and_key_heap) > 2 * self.capacity:
+            self._rebuild_heap()
+        count_and_key_heap = self._count_and_key_heap
+        key_to_count_map = self._key_to_count_map
+        while True:
+            count, key = heapq.heappop(count_and_key_heap)
+            actual_count = key_to_count_map.get(key)
+            if actual_count == count:
+                return count, key
+            if actual_count is not None:
+                # Outdated entry of a key that has been counted since, try again with its actual count.
+                heapq.heappush(count_and_key_heap, (actual_count, key))
+
+    def _rebuild_heap(self):
+        self._count_and_key_heap = [(count, key) for key, count in self._key_to_count_map.items()]
+        heapq.heapify(self._count_and_key_heap)
+
+    def merge(self, other: 'SpaceSavingCounter'):
+        """
+        Add the counts of ``other``, for example the partial result of a
+        parallel worker, and keep the ``capacity`` keys with the highest
+        counts. This follows "Mergeable Summaries" by Agarwal et al. (2012),
+        so the guarantees still hold for the combined total.
+        """
+        assert other is not None
+
+        def count_of_missing_key(counter: 'SpaceSavingCounter') -> int:
+            # A key not retained in a full counter might have been counted up to its lowest count.
+            return min(counter._key_to_count_map.values()) \
+                if len(counter._key_to_count_map) >= counter.capacity else 0
+
+        self_missing_count = count_of_missing_key(self)
+        other_missing_count = count_of_missing_key(other)
+        merged_key_to_count_and_error_map = {}
+        # NOTE: Use a dict instead of a set to keep the order of keys deterministic.
+        keys_to_merge = dict.fromkeys(self._key_to_count_map.keys())
+        keys_to_merge.update(dict.fromkeys(other._key_to_count_map.keys()))
+        for key in keys_to_merge:
+            count = 0
+            error = 0
+            for counter, missing_count in ((self, self_missing_count), (other, other_missing_count)):
+                key_count = counter._key_to_count_map.get(key)
+                if key_count is None:
+                    count += missing_count
+                    error += missing_count
+                else:
+                    count += key_count
+                    error += counter._key_to_error_map.get(key, 0)
+            merged_key_to_count_and_error_map[key] = (count, error)
+        retained_keys = heapq.nlargest(
+            self.capacity, merged_key_to_count_and_error_map.keys(),
+            key=lambda key: merged_key_to_count_and_error_map[key][0])
+        self.total += other.total
+        self._key_to_count_map = {}
+        self._key_to_error_map = {}
+        for key in retained_keys:
+            count, error = merged_key_to_count_and_error_map[key]
+            self._key_to_count_map[key] = count
+            if error != 0:
+                self._key_to_error_map[key] = error
+        self._rebuild_heap()
+
+    def most_common(self, number: int=0) -> List[Tuple[Hashable, int]]:
+        """
+        The ``number`` keys with the highest count and their count (0 = all
+        retained keys) using a heap instead of sorting all keys.
+        """
+        assert number >= 0
+
+        items = self._key_to_count_map.items()
+        if number == 0:
+            result = sorted(items, key=lambda item: item[1], reverse=True)
+        else:
+            result = heapq.nlargest(number, items, key=lambda item: item[1])
+        return result
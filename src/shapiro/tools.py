@@ -2,6 +2,9 @@
 Various tools to make life easier.
 """
 import logging
+import queue
+from multiprocessing.pool import Pool
+from typing import Any, Callable, Generator, Iterable, List
 
 #: The general logger used by all modules.
 log = logging.getLogger('shapiro')
@@ -21,3 +24,58 @@ def signum(value) -> int:
         return -1
     else:
         return 0
+
+
+def chunked(items: Iterable, chunk_size: int) -> Generator[List, None, None]:
+    """
+    Lists with up to ``chunk_size`` consecutive elements of ``items``.
+    """
+    assert chunk_size >= 1
+
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) != 0:
+        yield chunk
+
+
+def bounded_imap_unordered(pool: Pool, function: Callable[[Any], Any], items: Iterable, max_pending_count: int) \
+        -> Generator[Any, None, None]:
+    """
+    Same as ``pool.imap_unordered(function, items)`` but with at most
+    ``max_pending_count`` items passed to the workers whose result has not
+    been yielded yet. Other than with ``imap_unordered()``, whose feeder
+    thread takes ``items`` as fast as it can, only a few of them are held
+    in memory even if they are produced faster than the workers can
+    process them.
+    """
+    assert max_pending_count >= 1
+
+    # Tuples (is_error, result_or_error) of finished items.
+    finished_queue = queue.Queue()
+
+    def put_result(result):
+        finished_queue.put((False, result))
+
+    def put_error(error: BaseException):
+        finished_queue.put((True, error))
+
+    def next_result():
+        is_error, result_or_error = finished_queue.get()
+        if is_error:
+            raise result_or_error
+        return result_or_error
+
+    pending_count = 0
+    for item in items:
+        if pending_count >= max_pending_count:
+            pending_count -= 1
+            yield next_result()
+        pool.apply_async(function, (item,), callback=put_result, error_callback=put_error)
+        pending_count += 1
+    while pending_count > 0:
+        pending_count -= 1
+        yield next_result()
@@ -0,0 +1,110 @@
+"""
+Tests for :py:mod:`shapiro.aggregation`.
+"""
+import datetime
+import io
+
+import pytest
+from shapiro import aggregation
+from shapiro.aggregation import OpinionAggregator, TimeWindow
+from shapiro.common import Rating, RestaurantTopic
+
+
+def test_can_parse_timestamp():
+    utc = datetime.timezone.utc
+    assert aggregation.parsed_timestamp('2018-07-28T08:23:48Z') == datetime.datetime(2018, 7, 28, 8, 23, 48, tzinfo=utc)
+    assert aggregation.parsed_timestamp('2018-07-28 08:23+02:00') == datetime.datetime(2018, 7, 28, 6, 23, tzinfo=utc)
+    assert aggregation.parsed_timestamp('2018-07-28T23:30-0530') == datetime.datetime(2018, 7, 29, 5, 0, tzinfo=utc)
+    assert aggregation.parsed_timestamp('2018-07-28') == datetime.datetime(2018, 7, 28)
+
+
+def test_fails_on_broken_timestamp():
+    with pytest.raises(ValueError) as error:
+        aggregation.parsed_timestamp('28.07.2018')
+    assert error.match(r"^time stamp must match .+ but is: '28.07.2018'$")
+
+
+def test_can_compute_window_start():
+    timestamp = datetime.datetime(2018, 7, 28, 8, 23, 48)  # A Saturday
+    assert aggregation.window_start(timestamp, TimeWindow.HOUR) == '2018-07-28T08:00'
+    assert aggregation.window_start(timestamp, TimeWindow.DAY) == '2018-07-28'
+    assert aggregation.window_start(timestamp, TimeWindow.WEEK) == '2018-07-23'
+    assert aggregation.window_start(timestamp, TimeWindow.MONTH) == '2018-07-01'
+
+
+def _some_aggregator() -> OpinionAggregator:
+    return OpinionAggregator(['time', 'restaurant'], 'time', TimeWindow.DAY)
+
+
+def test_can_aggregate_opinions():
+    aggregator = _some_aggregator()
+    aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-28T08:23:48Z', 'brauhof'])
+    aggregator.add(RestaurantTopic.FOOD, Rating.VERY_BAD, ['2018-07-28T20:00:00Z', 'brauhof'])
+    aggregator.add(RestaurantTopic.FOOD, None, ['2018-07-28T21:00:00Z', 'brauhof'])
+    aggregator.add(None, None, ['2018-07-29T08:00:00Z', 'brauhof'])
+    assert aggregator.group_count == 2
+    aggregates = list(aggregator.aggregates())
+    assert aggregates[0]['time'] == '2018-07-28'
+    assert aggregates[0]['topic'] == 'food'
+    assert aggregates[0]['opinion_count'] == 3
+    assert aggregates[0]['rated_count'] == 2
+    assert aggregates[0]['mean_rating'] == -0.5
+    assert aggregates[0]['count_good'] == 1
+    assert aggregates[0]['count_very_bad'] == 1
+    assert aggregates[1]['topic'] is None
+    assert aggregates[1]['coverage'] == 0.0
+    assert aggregates[1]['mean_rating'] is None
+
+
+def test_can_aggregate_timestamps_with_different_offsets_in_same_window():
+    aggregator = _some_aggregator()
+    aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-28T23:30-05:00', 'brauhof'])
+    aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-29T04:30Z', 'brauhof'])
+    aggregates = list(aggregator.aggregates())
+    assert [(aggregate['time'], aggregate['opinion_count']) for aggregate in aggregates] == [('2018-07-29', 2)]
+
+
+def test_fails_on_mixing_timestamps_with_and_without_time_zone():
+    aggregator = _some_aggregator()
+    aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-28T08:23:48Z', 'brauhof'])
+    with pytest.raises(ValueError) as error:
+        aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-28T08:23:48', 'brauhof'])
+    assert error.match(r"^time stamps must either all have a time zone or none of them "
+                       r"but the time stamp is '2018-07-28T08:23:48' without time zone$")
+    naive_aggregator = _some_aggregator()
+    naive_aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-28', 'brauhof'])
+    with pytest.raises(ValueError) as error:
+        naive_aggregator.merge(aggregator)
+    assert error.match(r'but the aggregator to merge has time stamps with time zone$')
+
+
+def test_can_merge_aggregators():
+    aggregator = _some_aggregator()
+    aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-28T08:23:48Z', 'brauhof'])
+    other_aggregator = _some_aggregator()
+    other_aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['2018-07-28T10:00:00Z', 'brauhof'])
+    other_aggregator.add(RestaurantTopic.SERVICE, Rating.BAD, ['2018-07-28T10:00:00Z', 'brauhof'])
+    aggregator.merge(other_aggregator)
+    aggregates = list(aggregator.aggregates())
+    assert [(aggregate['topic'], aggregate['count_good'], aggregate['count_bad']) for aggregate in aggregates] == [
+        ('food', 2, 0),
+        ('service', 0, 1),
+    ]
+
+
+def test_fails_on_merging_different_aggregators():
+    with pytest.raises(ValueError):
+        _some_aggregator().merge(OpinionAggregator(['restaurant']))
+
+
+def test_can_write_csv_aggregates():
+    aggregator = OpinionAggregator(['restaurant'])
+    aggregator.add(RestaurantTopic.FOOD, Rating.GOOD, ['brauhof'])
+    aggregator.add(RestaurantTopic.FOOD, None, ['brauhof'])
+    target_file = io.StringIO()
+    aggregation.write_csv_aggregates(target_file, aggregator)
+    assert target_file.getvalue() == (
+        '# restaurant,topic,opinion_count,rated_count,coverage,mean_rating,'
+        'count_very_bad,count_bad,count_somewhat_bad,count_somewhat_good,count_good,count_very_good\n'
+        'brauhof,food,2,1,0.5000,2.0000,0,0,0,0,1,0\n'
+    )
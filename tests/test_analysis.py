@@ -1,6 +1,7 @@
 """
 Tests for :py:mod:`shapiro.analysis`.
 """
+from collections import Counter
 from enum import Enum
 
 import pytest
@@ -11,6 +12,8 @@ from shapiro.language import EnglishSentiment
 from spacy.language import Language
 from spacy.tokens import Token
 
+from conftest import data_path
+
 _CHICKEN = 'chicken'
 
 
@@ -67,6 +70,57 @@ def test_fails_on_duplicate_topic():
     assert error.match(r"^case insensitive name 'SOME' for enum _BrokenTopic must be unique but clashes with 'some'$")
 
 
+def test_can_find_best_and_first_lexicon_entry(nlp_en: Language):
+    lexicon = Lexicon(RestaurantTopic)
+    lexicon.entries.append(analysis.LexiconEntry('tast.*', RestaurantTopic.FOOD))
+    lexicon.entries.append(analysis.LexiconEntry('waiter', RestaurantTopic.SERVICE, Rating.GOOD))
+    lexicon.entries.append(analysis.LexiconEntry('waiter', RestaurantTopic.SERVICE, Rating.BAD))
+    waiter_token, _, tasty_token = nlp_en('Waiters were tasty')
+    assert lexicon.lexicon_entry_for(waiter_token).rating == Rating.GOOD
+    assert lexicon.lexicon_entry_for(tasty_token).topic == RestaurantTopic.FOOD
+    lexicon.entries.append(analysis.LexiconEntry('Waiters', RestaurantTopic.SERVICE, Rating.VERY_BAD))
+    assert lexicon.lexicon_entry_for(waiter_token).rating == Rating.VERY_BAD
+
+
+def test_can_share_interned_lemmas_of_lexicon_entries():
+    lemma = ''.join(['wai', 'ter'])
+    lexicon_entry = analysis.LexiconEntry(lemma, RestaurantTopic.SERVICE)
+    other_lexicon_entry = analysis.LexiconEntry(''.join(['wait', 'er']), RestaurantTopic.SERVICE)
+    assert lexicon_entry.lemma is other_lexicon_entry.lemma
+    assert not hasattr(lexicon_entry, '__dict__')
+
+
+def test_can_access_lexicon_entries():
+    lexicon_entries = analysis.LexiconEntries([
+        analysis.LexiconEntry('waiter', RestaurantTopic.SERVICE, Rating.GOOD),
+        analysis.LexiconEntry('tast.*', RestaurantTopic.FOOD),
+    ])
+    lexicon_entries.extend(analysis.LexiconEntries([analysis.LexiconEntry('noisy.*', RestaurantTopic.AMBIENCE)]))
+    assert len(lexicon_entries) == 3
+    assert [repr(lexicon_entry) for lexicon_entry in lexicon_entries] == [
+        'LexiconEntry(waiter, topic=SERVICE, rating=GOOD)',
+        'LexiconEntry(tast.*, topic=FOOD, is_regex=True)',
+        'LexiconEntry(noisy.*, topic=AMBIENCE, is_regex=True)',
+    ]
+    assert lexicon_entries[-1].is_regex
+    assert [lexicon_entry.lemma for lexicon_entry in lexicon_entries[1:]] == ['tast.*', 'noisy.*']
+    with pytest.raises(IndexError):
+        _ = lexicon_entries[3]
+
+
+def test_can_keep_compiled_regex_with_lexicon_entries():
+    lexicon_entries = analysis.LexiconEntries([
+        analysis.LexiconEntry('waiter', RestaurantTopic.SERVICE),
+        analysis.LexiconEntry('tast.*', RestaurantTopic.FOOD),
+    ])
+    tasty_regex = lexicon_entries[1].regex
+    assert tasty_regex.pattern == 'tast.*'
+    assert lexicon_entries[0].regex is None
+    # All entries restored from the same lexicon share its compiled regex.
+    assert [lexicon_entry.regex for lexicon_entry in lexicon_entries] == [None, tasty_regex]
+    assert lexicon_entries[1].regex is tasty_regex
+
+
 def test_can_convert_lexicon_entry_to_repr():
     lexicon_entry = analysis.LexiconEntry('tasty', RestaurantTopic.FOOD, analysis.Rating.GOOD)
     assert 'LexiconEntry(tasty, topic=FOOD, rating=GOOD)' == repr(lexicon_entry)
@@ -111,6 +165,105 @@ def test_can_count_stopwords(nlp_en):
     }
 
 
+def test_can_count_lemmas_in_batches(nlp_en):
+    counter = analysis.LemmaCounter(nlp_en, use_pos=False)
+    counter.count_texts(['hello!', 'hello 1!', 'hello world!'], batch_size=2)
+    assert counter.lemma_pos_to_count_map == {
+        ('hello', None): 3,
+        ('world', None): 1
+    }
+
+
+def test_can_count_lemmas_approximately(nlp_en):
+    counter = analysis.LemmaCounter(nlp_en, use_pos=False, capacity=2)
+    counter.count_texts(['hello!', 'hello 1!', 'hello world!', 'hello soap!'])
+    assert len(counter.lemma_pos_to_count_map) == 2
+    assert analysis.most_common_counts(counter.lemma_pos_to_count_map, 1) == [(4, 'hello', None)]
+
+
+def test_can_count_lemmas_in_parallel(nlp_en):
+    with open(data_path('en_restauranteering_data.csv'), encoding='utf-8') as feedback_csv_file:
+        texts = feedback_csv_file.readlines()
+    serial_counter = analysis.LemmaCounter(nlp_en, use_pos=True)
+    serial_counter.count_texts(texts)
+    parallel_lemma_pos_to_count_map = analysis.parallel_lemma_pos_to_count_map(
+        nlp_en, texts, jobs=2, use_pos=True, chunk_size=3)
+    assert len(parallel_lemma_pos_to_count_map) >= 1
+    assert parallel_lemma_pos_to_count_map == serial_counter.lemma_pos_to_count_map
+    assert analysis.most_common_lemmas(nlp_en, texts, jobs=2) == analysis.most_common_lemmas(nlp_en, texts)
+
+
+class _CharacterCounter:
+    """
+    Counter for the characters in texts that works without a language model.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.lemma_pos_to_count_map = Counter()
+
+    def count_texts(self, texts, batch_size):
+        for text in texts:
+            self.lemma_pos_to_count_map.update(text)
+
+
+def test_can_count_in_parallel_with_any_counter():
+    texts = ['abc', 'bcd', 'cde'] * 10
+    for jobs in (1, 2):
+        assert analysis.parallel_counts(
+            _CharacterCounter(), texts, jobs, batch_size=2, chunk_size=4, merge=Counter.update) == \
+            Counter({'c': 30, 'b': 20, 'd': 20, 'a': 10, 'e': 10})
+
+
+def test_can_count_in_parallel_from_lazily_generated_texts():
+    jobs = 2
+    chunk_size = 3
+    generated_text_count = 0
+    merged_chunk_count = 0
+
+    def texts():
+        nonlocal generated_text_count
+        for _ in range(100):
+            generated_text_count += 1
+            yield 'ab'
+
+    def merge(target: Counter, source: Counter):
+        nonlocal merged_chunk_count
+        merged_chunk_count += 1
+        # Only a few chunks must have been generated ahead of the counted ones.
+        assert generated_text_count <= (merged_chunk_count + 2 * jobs) * chunk_size
+        target.update(source)
+
+    assert analysis.parallel_counts(_CharacterCounter(), texts(), jobs, 1, chunk_size, merge) == \
+        Counter({'a': 100, 'b': 100})
+    assert merged_chunk_count == 34
+
+
+def test_can_count_lemmas_vectorized(nlp_en):
+    with open(data_path('en_restauranteering_data.csv'), encoding='utf-8') as feedback_csv_file:
+        texts = feedback_csv_file.readlines()
+    for use_pos in (False, True):
+        for count_stopwords in (False, True):
+            counter = analysis.LemmaCounter(nlp_en, count_stopwords=count_stopwords, use_pos=use_pos)
+            counter.count_texts(texts)
+            vectorized_counter = analysis.VectorizedLemmaCounter(
+                nlp_en, count_stopwords=count_stopwords, use_pos=use_pos)
+            vectorized_counter.count_texts(texts, batch_size=4)
+            assert vectorized_counter.lemma_pos_to_count_map == counter.lemma_pos_to_count_map
+            for number in (0, 1, 5):
+                assert vectorized_counter.most_common(number) == counter.most_common(number)
+
+
+def test_can_merge_state_into_vectorized_lemma_counter(nlp_en):
+    counter = analysis.LemmaCounter(nlp_en)
+    counter.count('hello world!')
+    vectorized_counter = analysis.VectorizedLemmaCounter(nlp_en)
+    vectorized_counter.count('hello!')
+    vectorized_counter.merge_state(counter.state())
+    assert vectorized_counter.most_common() == [(2, 'hello', None), (1, 'world', None)]
+
+
 def test_can_find_opinions(nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
     feedback_text = """The schnitzel was not very tasty.
         The waiter was polite.
@@ -128,6 +281,65 @@ def test_can_find_opinions(nlp_en: Language, lexicon_restauranteering: Lexicon,
     ]
 
 
+def test_can_find_opinion_records(
+        nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
+    feedback_text = 'The schnitzel was not very tasty. The waiter was polite.'
+    opinion_miner = analysis.OpinionMiner(nlp_en, lexicon_restauranteering, english_sentiment, RestaurantTopic)
+    opinion_records = list(opinion_miner.opinion_records(feedback_text, with_token_indices=True))
+    assert [
+        (record.topic, record.rating, record.start, record.end, record.text, record.token_indices)
+        for record in opinion_records
+    ] == [
+        (RestaurantTopic.FOOD, Rating.SOMEWHAT_BAD, 0, 33, 'The schnitzel was not very tasty.', (1, 3, 4, 5)),
+        (RestaurantTopic.SERVICE, Rating.GOOD, 34, 56, 'The waiter was polite.', (8, 10)),
+    ]
+    assert all(feedback_text[record.start:record.end] == record.text for record in opinion_records)
+    assert not hasattr(opinion_records[0], '__dict__')
+
+
+def test_can_find_opinion_records_without_offsets_for_replaced_idioms(
+        nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
+    feedback_text = 'The waiter was polite. The schnitzel was not up to par.'
+    opinion_miner = analysis.OpinionMiner(nlp_en, lexicon_restauranteering, english_sentiment, RestaurantTopic)
+    assert [
+        (record.start, record.end, record.text) for record in opinion_miner.opinion_records(feedback_text)
+    ] == [
+        (None, None, 'The waiter was polite.'),
+        (None, None, 'The schnitzel was not good.'),
+    ]
+    token_opinion_miner = analysis.OpinionMiner(
+        nlp_en, lexicon_restauranteering, english_sentiment, RestaurantTopic,
+        idiom_matching=analysis.IDIOM_MATCHING_TOKENS)
+    assert [
+        (record.start, record.end, record.text) for record in token_opinion_miner.opinion_records(feedback_text)
+    ] == [
+        (0, 22, 'The waiter was polite.'),
+        (23, 55, 'The schnitzel was not up to par.'),
+    ]
+
+
+def test_can_find_opinions_with_multiple_lexicons_for_same_document(
+        nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
+    other_lexicon = Lexicon(RestaurantTopic)
+    other_lexicon.entries.append(analysis.LexiconEntry('schnitzel', RestaurantTopic.AMBIENCE, Rating.VERY_GOOD))
+    opinion_miner = analysis.OpinionMiner(nlp_en, lexicon_restauranteering, english_sentiment, RestaurantTopic)
+    other_opinion_miner = analysis.OpinionMiner(nlp_en, other_lexicon, english_sentiment, RestaurantTopic)
+    assert 'opinion_matcher' not in nlp_en.pipe_names
+
+    document = opinion_miner.parsed('The schnitzel was tasty.')
+    topics_and_ratings = [
+        (topic, rating) for topic, rating, _ in opinion_miner.opinions_of_document(document)
+    ]
+    assert topics_and_ratings == [(RestaurantTopic.FOOD, Rating.GOOD)]
+    other_topics_and_ratings = [
+        (topic, rating) for topic, rating, _ in opinion_miner.opinions_of_document(document, lexicon=other_lexicon)
+    ]
+    assert other_topics_and_ratings == [(RestaurantTopic.AMBIENCE, Rating.VERY_GOOD)]
+    assert [
+        (topic, rating) for topic, rating, _ in other_opinion_miner.opinions('The schnitzel was tasty.')
+    ] == other_topics_and_ratings
+
+
 def test_can_find_opinions_with_idioms(
         nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
     feedback_text = 'The schnitzel was not up to par with other restaurants.'
@@ -142,6 +354,34 @@ def test_can_find_opinions_with_idioms(
     ]
 
 
+def test_can_find_opinions_with_idioms_matching_tokens(
+        nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
+    feedback_text = 'The schnitzel was not up to par with other restaurants. The waiter is not rocket science.'
+    opinion_miner = analysis.OpinionMiner(
+        nlp_en, lexicon_restauranteering, english_sentiment, RestaurantTopic,
+        idiom_matching=analysis.IDIOM_MATCHING_TOKENS)
+    opinions = opinion_miner.opinions(feedback_text)
+    opinions_with_text = [
+        (topic, rating, str(sent).strip())
+        for topic, rating, sent in opinions
+    ]
+    assert opinions_with_text == [
+        (RestaurantTopic.FOOD, Rating.BAD, 'The schnitzel was not up to par with other restaurants.'),
+        (RestaurantTopic.SERVICE, Rating.BAD, 'The waiter is not rocket science.'),
+    ]
+
+
+def test_can_find_opinions_with_multi_token_modifiers(
+        nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
+    feedback_text = 'The waiter was a little bit very polite.'
+    opinion_miner = analysis.OpinionMiner(nlp_en, lexicon_restauranteering, english_sentiment, RestaurantTopic)
+    document = opinion_miner.parsed(feedback_text)
+    opinions = list(opinion_miner.opinions_of_document(document))
+    assert [(topic, rating) for topic, rating, _ in opinions] == [(RestaurantTopic.SERVICE, Rating.GOOD)]
+    assert [token.text for token in document if token._.is_diminisher] == ['a', 'little', 'bit']
+    assert [token.text for token in document if token._.is_modifier_continuation] == ['little', 'bit']
+
+
 def test_can_use_previous_topic_for_opinion(
         nlp_en: Language, lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
     feedback_text = 'The waiter was very polite. He was not quick though.'
@@ -0,0 +1,68 @@
+"""
+Tests for :py:mod:`shapiro.checkpoint`.
+"""
+import pytest
+from shapiro.checkpoint import (AnalysisCheckpoint, Checkpointer, documents_after_checkpoint, read_checkpoint,
+                                truncate_output_to_checkpoint, write_checkpoint)
+from shapiro.common import OpinionError, Rating, RestaurantTopic
+from shapiro.documents import documents_from_texts
+from shapiro.output import opinion_writer
+
+
+def test_can_write_and_read_checkpoint(tmpdir):
+    checkpoint_path = str(tmpdir.join('checkpoint.json'))
+    write_checkpoint(checkpoint_path, AnalysisCheckpoint(['feedback.csv'], 'opinions.csv', 3, 120, 5))
+    checkpoint = read_checkpoint(checkpoint_path)
+    assert checkpoint.text_to_analyze_paths == ['feedback.csv']
+    assert checkpoint.output_path == 'opinions.csv'
+    assert (checkpoint.document_count, checkpoint.output_size, checkpoint.opinion_count) == (3, 120, 5)
+    assert not tmpdir.join('checkpoint.json.tmp').exists()
+
+
+def test_fails_on_broken_checkpoint(tmpdir):
+    checkpoint_path = str(tmpdir.join('checkpoint.json'))
+    with open(checkpoint_path, 'w', encoding='utf-8') as checkpoint_file:
+        checkpoint_file.write('{"format": "something-else"}')
+    with pytest.raises(OpinionError) as error:
+        read_checkpoint(checkpoint_path)
+    assert error.match(r'file must contain a checkpoint$')
+
+
+def test_fails_on_checkpoint_for_other_files(tmpdir):
+    output_path = str(tmpdir.join('opinions.csv'))
+    checkpoint = AnalysisCheckpoint(['feedback.csv'], output_path, 1, 10)
+    with pytest.raises(OpinionError) as error:
+        checkpoint.check_can_resume(['other_feedback.csv'], output_path)
+    assert error.match(r'^files to analyze must be the same as for the checkpoint')
+    with pytest.raises(OpinionError) as error:
+        checkpoint.check_can_resume(['feedback.csv'], output_path)
+    assert error.match(r'must have at least 10 bytes to resume from the checkpoint but has 0$')
+
+
+def test_can_resume_from_checkpoint(tmpdir):
+    output_path = str(tmpdir.join('opinions.csv'))
+    checkpoint_path = str(tmpdir.join('checkpoint.json'))
+    documents = list(documents_from_texts(['Tasty.', 'Polite.', 'Slow.']))
+    with opinion_writer(output_path) as writer:
+        checkpointer = Checkpointer(checkpoint_path, writer, AnalysisCheckpoint(['-'], output_path), interval=2)
+        for document in documents:
+            writer.write_opinion(RestaurantTopic.FOOD, Rating.GOOD, document.text)
+            checkpointer.document_written(document)
+        # Simulate a crash before the last document is part of a checkpoint.
+        writer.flush()
+
+    checkpoint = read_checkpoint(checkpoint_path)
+    assert (checkpoint.document_count, checkpoint.opinion_count) == (2, 2)
+    checkpoint.check_can_resume(['-'], output_path)
+    truncate_output_to_checkpoint(checkpoint)
+    with opinion_writer(output_path, append=True) as writer:
+        checkpointer = Checkpointer(checkpoint_path, writer, checkpoint)
+        for document in documents_after_checkpoint(documents, checkpoint):
+            writer.write_opinion(RestaurantTopic.FOOD, Rating.BAD, document.text)
+            checkpointer.document_written(document)
+        checkpointer.save()
+
+    with open(output_path, encoding='utf-8') as output_file:
+        assert output_file.read() == '# topic,rating,text\nfood,good,Tasty.\nfood,good,Polite.\nfood,bad,Slow.\n'
+    checkpoint = read_checkpoint(checkpoint_path)
+    assert (checkpoint.document_count, checkpoint.opinion_count) == (3, 3)
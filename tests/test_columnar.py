@@ -0,0 +1,63 @@
+"""
+Tests for :py:mod:`shapiro.columnar`.
+"""
+import numpy as np
+import pytest
+from shapiro import columnar
+from shapiro.common import Rating, RestaurantTopic
+
+
+def _write_some_opinions(writer: columnar.ColumnarOpinionWriter):
+    with writer:
+        writer.write_opinion(
+            RestaurantTopic.FOOD, Rating.GOOD, 'Tasty schnitzel.', ['brauhof'], document_index=0, start=0, end=16)
+        writer.write_opinion(None, None, 'Hello.', ['nofood'], document_index=1, start=3, end=9)
+        writer.write_opinion(RestaurantTopic.SERVICE, Rating.VERY_BAD, 'Rüde waiter.', ['brauhof'])
+
+
+def test_can_write_npy_opinions(tmpdir):
+    npy_folder = str(tmpdir.join('opinions.npy'))
+    _write_some_opinions(columnar.NpyOpinionWriter(
+        npy_folder, RestaurantTopic, key_names=['restaurant'], batch_size=2))
+    assert list(columnar.read_npy_opinions(npy_folder)) == [
+        {'restaurant': 'brauhof', 'topic': 'food', 'rating': 'good', 'text': 'Tasty schnitzel.',
+         'document_index': 0, 'start': 0, 'end': 16},
+        {'restaurant': 'nofood', 'topic': None, 'rating': None, 'text': 'Hello.',
+         'document_index': 1, 'start': 3, 'end': 9},
+        {'restaurant': 'brauhof', 'topic': 'service', 'rating': 'very_bad', 'text': 'Rüde waiter.',
+         'document_index': None, 'start': None, 'end': None},
+    ]
+
+
+def test_can_memory_map_npy_columns(tmpdir):
+    npy_folder = str(tmpdir.join('opinions.npy'))
+    _write_some_opinions(columnar.NpyOpinionWriter(
+        npy_folder, RestaurantTopic, key_names=['restaurant'], batch_size=2))
+    ratings = columnar.npy_column(npy_folder, 'rating')
+    ratings_names = columnar.npy_column(npy_folder, 'rating_names')
+    assert isinstance(ratings, np.memmap)
+    assert ratings.dtype == np.int8
+    assert [ratings_names[code] if code != columnar.MISSING_CODE else None for code in ratings] == \
+        ['good', None, 'very_bad']
+    text_offsets = np.load(str(tmpdir.join('opinions.npy', 'text_offsets.npy')), mmap_mode='r')
+    assert isinstance(text_offsets, np.memmap)
+    assert text_offsets.tolist() == [0, 16, 22, 35]
+
+
+def test_can_write_empty_npy(tmpdir):
+    npy_folder = str(tmpdir.join('opinions.npy'))
+    columnar.NpyOpinionWriter(npy_folder, RestaurantTopic).close()
+    assert list(columnar.read_npy_opinions(npy_folder)) == []
+
+
+def test_can_write_arrow_opinions(tmpdir):
+    pyarrow = pytest.importorskip('pyarrow')
+    arrow_path = str(tmpdir.join('opinions.arrow'))
+    _write_some_opinions(columnar.ArrowOpinionWriter(
+        arrow_path, RestaurantTopic, key_names=['restaurant'], batch_size=2))
+    with pyarrow.memory_map(arrow_path) as arrow_file:
+        table = pyarrow.ipc.open_file(arrow_file).read_all()
+    assert table.column('restaurant').to_pylist() == ['brauhof', 'nofood', 'brauhof']
+    assert table.column('topic').to_pylist() == ['food', None, 'service']
+    assert table.column('rating').to_pylist() == ['good', None, 'very_bad']
+    assert table.column('start').to_pylist() == [0, 3, None]
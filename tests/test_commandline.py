@@ -2,8 +2,11 @@
 Tests for :py:mod:`shapiro.commandline`.
 """
 import pytest
+from shapiro.checkpoint import AnalysisCheckpoint, read_checkpoint, write_checkpoint
 from shapiro.commandline import process
 
+from conftest import data_path
+
 
 def test_can_print_help():
     with pytest.raises(SystemExit) as exception_info:
@@ -46,3 +49,126 @@ def test_can_analyze_immediate_restaurant_feedback(
     assert 0 == process([
         'analyze', '--language=en', '--immediate', en_restauranteering_csv_path,
         'The', 'waiter', 'was', 'very', 'polite'])
+
+
+def test_can_analyze_restaurant_feedback_with_idioms_matching_tokens(
+        en_restauranteering_csv_path: str, en_restaurant_single_feedback_txt_path: str):
+    assert 0 == process([
+        'analyze', '--idiom-matching=tokens', en_restauranteering_csv_path, en_restaurant_single_feedback_txt_path])
+
+
+def test_can_analyze_pretokenized_restaurant_feedback(tmpdir, en_restauranteering_csv_path: str):
+    for pretokenized_format in ('conllu', 'jsonl'):
+        output_path = str(tmpdir.join('opinions_from_%s.csv' % pretokenized_format))
+        assert 0 == process([
+            'analyze', '--pretokenized', pretokenized_format, '--output', output_path, en_restauranteering_csv_path,
+            data_path('en_restaurant_pretokenized_feedback.' + pretokenized_format)])
+        with open(output_path, encoding='utf-8') as output_file:
+            assert 'r1,service,somewhat_bad,The waiter was not very polite.' in output_file.read()
+
+
+def test_fails_on_pretokenized_with_idiom_matching_text(en_restauranteering_csv_path: str):
+    with pytest.raises(SystemExit) as exception_info:
+        process([
+            'analyze', '--pretokenized=jsonl', '--idiom-matching=text', en_restauranteering_csv_path,
+            data_path('en_restaurant_pretokenized_feedback.jsonl')])
+    assert exception_info.value.code == 2
+
+
+def test_can_resume_analysis_from_checkpoint(tmpdir, en_restauranteering_csv_path: str):
+    output_path = str(tmpdir.join('opinions.csv'))
+    checkpoint_path = str(tmpdir.join('checkpoint.json'))
+    arguments = [
+        'analyze', '--pretokenized=conllu', '--checkpoint', checkpoint_path, '--checkpoint-interval=1',
+        '--output', output_path, en_restauranteering_csv_path, data_path('en_restaurant_pretokenized_feedback.conllu')]
+    assert 0 == process(arguments)
+    with open(output_path, encoding='utf-8') as output_file:
+        expected_output = output_file.read()
+    assert read_checkpoint(checkpoint_path).document_count == 2
+
+    # Simulate an analysis that was interrupted after the checkpoint for the first document.
+    first_document_output_size = len(expected_output[:expected_output.index('r2,')].encode('utf-8'))
+    write_checkpoint(checkpoint_path, AnalysisCheckpoint(arguments[-1:], output_path, 1, first_document_output_size, 2))
+    with open(output_path, 'a', encoding='utf-8') as output_file:
+        output_file.write('r2,broken')
+    assert 0 == process(arguments + ['--resume'])
+    with open(output_path, encoding='utf-8') as output_file:
+        assert output_file.read() == expected_output
+    assert read_checkpoint(checkpoint_path).opinion_count == 3
+
+
+def test_fails_on_checkpoint_without_output_file(en_restauranteering_csv_path: str):
+    with pytest.raises(SystemExit) as exception_info:
+        process([
+            'analyze', '--checkpoint=checkpoint.json', en_restauranteering_csv_path,
+            data_path('en_restaurant_single_feedback.txt')])
+    assert exception_info.value.code == 2
+
+
+def test_can_analyze_restaurant_feedback_in_detected_languages(tmpdir, en_restaurant_single_feedback_txt_path: str):
+    output_path = str(tmpdir.join('opinions.csv'))
+    assert 0 == process([
+        'analyze', '--language=auto', '--output', output_path, data_path('{language}_restauranteering.csv'),
+        en_restaurant_single_feedback_txt_path, data_path('de_restaurant_single_feedback.txt')])
+    with open(output_path, encoding='utf-8') as output_file:
+        output = output_file.read()
+    # German documents are parsed first but the output keeps the order of the input.
+    english_opinion_index = output.index('Sadly the waiter was very slow')
+    german_opinion_index = output.index('Leider war der Kellner sehr langsam')
+    assert english_opinion_index < german_opinion_index
+
+
+def test_can_analyze_restaurant_feedback_to_json_lines(
+        tmpdir, en_restauranteering_csv_path: str, en_restaurant_single_feedback_txt_path: str):
+    output_path = str(tmpdir.join('opinions.jsonl.gz'))
+    assert 0 == process([
+        'analyze', '--language=en', '--output', output_path,
+        en_restauranteering_csv_path, en_restaurant_single_feedback_txt_path])
+    assert 0 == process([
+        'analyze', '--format=jsonl', en_restauranteering_csv_path, en_restaurant_single_feedback_txt_path])
+
+
+def test_can_analyze_restaurant_feedback_csv_to_npy(tmpdir, en_restauranteering_csv_path: str):
+    output_path = str(tmpdir.join('opinions.npy'))
+    assert 0 == process([
+        'analyze', '--text-column=4', '--key-columns=1,2', '--output', output_path,
+        en_restauranteering_csv_path, data_path('en_restauranteering_data.csv')])
+
+
+def test_fails_on_key_columns_without_text_column(en_restauranteering_csv_path: str):
+    with pytest.raises(SystemExit) as exception_info:
+        process(['analyze', '--key-columns=1', en_restauranteering_csv_path, 'some.csv'])
+    assert exception_info.value.code == 2
+
+
+def test_can_aggregate_restaurant_feedback_csv(tmpdir, en_restauranteering_csv_path: str):
+    output_path = str(tmpdir.join('aggregates.csv'))
+    assert 0 == process([
+        'analyze', '--aggregate', '--text-column=4', '--key-columns=2', '--time-column=1', '--window=week',
+        '--output', output_path, en_restauranteering_csv_path, data_path('en_restauranteering_data.csv')])
+
+
+def test_can_count_incrementally_and_merge_counts(tmpdir, restaurant_feedback_txt_path: str):
+    day_1_state_path = str(tmpdir.join('day_1.json.gz'))
+    day_2_state_path = str(tmpdir.join('day_2.json.gz'))
+    all_time_state_path = str(tmpdir.join('all_time.json.gz'))
+    assert 0 == process(['count', '--save-state', day_1_state_path, restaurant_feedback_txt_path])
+    assert 0 == process(['count', '--save-state', day_2_state_path, restaurant_feedback_txt_path])
+    assert 0 == process([
+        'count', '--load-state', day_1_state_path, '--save-state', all_time_state_path, restaurant_feedback_txt_path])
+    assert 0 == process(['merge-counts', day_1_state_path, day_2_state_path])
+
+
+def test_can_profile_analyze_and_count(
+        tmpdir, en_restauranteering_csv_path: str, en_restaurant_single_feedback_txt_path: str,
+        restaurant_feedback_txt_path: str):
+    assert 0 == process([
+        'analyze', '--profile', en_restauranteering_csv_path, en_restaurant_single_feedback_txt_path])
+    profile_path = str(tmpdir.join('count.prof'))
+    assert 0 == process(['count', '--profile-output', profile_path, restaurant_feedback_txt_path])
+    assert tmpdir.join('count.prof').check(file=1)
+    assert tmpdir.join('count.prof.collapsed').size() > 0
+
+
+def test_can_print_memory(en_restauranteering_csv_path: str, restaurant_feedback_txt_path: str):
+    assert 0 == process(['memory', '--top', '3', en_restauranteering_csv_path, restaurant_feedback_txt_path])
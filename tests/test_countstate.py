@@ -0,0 +1,86 @@
+"""
+Tests for :py:mod:`shapiro.countstate`.
+"""
+import gzip
+from collections import Counter
+
+import pytest
+from shapiro import countstate
+from shapiro.common import OpinionError
+from shapiro.countstate import LemmaCountState
+from shapiro.sketch import SpaceSavingCounter
+
+
+def test_can_write_and_read_exact_state(tmpdir):
+    state_path = str(tmpdir.join('counts.json.gz'))
+    state = LemmaCountState(use_pos=True, lemma_pos_to_count_map=Counter({
+        ('hello', 'INTJ'): 3,
+        ('Wien', 'PROPN'): 1,
+    }))
+    countstate.write_lemma_count_state(state_path, state)
+    read_state = countstate.read_lemma_count_state(state_path)
+    assert read_state.use_pos
+    assert not read_state.count_stopwords
+    assert read_state.capacity is None
+    assert read_state.lemma_pos_to_count_map == state.lemma_pos_to_count_map
+
+
+def test_can_replace_state_without_leaving_temporary_files(tmpdir):
+    state_path = str(tmpdir.join('counts.json.gz'))
+    countstate.write_lemma_count_state(state_path, LemmaCountState(lemma_pos_to_count_map=Counter({('a', None): 1})))
+    countstate.write_lemma_count_state(state_path, LemmaCountState(lemma_pos_to_count_map=Counter({('b', None): 2})))
+    assert [path.basename for path in tmpdir.listdir()] == ['counts.json.gz']
+    assert countstate.read_lemma_count_state(state_path).lemma_pos_to_count_map == Counter({('b', None): 2})
+
+
+def test_can_keep_previous_state_if_writing_fails(tmpdir, monkeypatch):
+    state_path = str(tmpdir.join('counts.json.gz'))
+    countstate.write_lemma_count_state(state_path, LemmaCountState(lemma_pos_to_count_map=Counter({('a', None): 1})))
+
+    def broken_fsync(file_descriptor):
+        raise OSError('disk is broken')
+
+    monkeypatch.setattr(countstate.os, 'fsync', broken_fsync)
+    with pytest.raises(OSError):
+        countstate.write_lemma_count_state(
+            state_path, LemmaCountState(lemma_pos_to_count_map=Counter({('b', None): 2})))
+    monkeypatch.undo()
+    assert [path.basename for path in tmpdir.listdir()] == ['counts.json.gz']
+    assert countstate.read_lemma_count_state(state_path).lemma_pos_to_count_map == Counter({('a', None): 1})
+
+
+def test_can_write_and_read_approximate_state(tmpdir):
+    state_path = str(tmpdir.join('counts.json.gz'))
+    lemma_pos_to_count_map = SpaceSavingCounter(2)
+    lemma_pos_to_count_map.update([('a', None), ('a', None), ('b', None), ('c', None)])
+    countstate.write_lemma_count_state(
+        state_path, LemmaCountState(capacity=2, lemma_pos_to_count_map=lemma_pos_to_count_map))
+    read_lemma_pos_to_count_map = countstate.read_lemma_count_state(state_path).lemma_pos_to_count_map
+    assert read_lemma_pos_to_count_map.total == 4
+    assert list(read_lemma_pos_to_count_map.items_with_error()) == list(lemma_pos_to_count_map.items_with_error())
+
+
+def test_can_merge_states(tmpdir):
+    state_paths = []
+    for day, words in enumerate(['a b', 'b c', 'c c']):
+        state_path = str(tmpdir.join('counts_%d.json.gz' % day))
+        countstate.write_lemma_count_state(state_path, LemmaCountState(
+            lemma_pos_to_count_map=Counter((word, None) for word in words.split())))
+        state_paths.append(state_path)
+    merged_state = countstate.merged_lemma_count_state(state_paths)
+    assert merged_state.lemma_pos_to_count_map == {('a', None): 1, ('b', None): 2, ('c', None): 3}
+
+
+def test_fails_on_merging_incompatible_states():
+    with pytest.raises(OpinionError) as error:
+        LemmaCountState(use_pos=True).merge(LemmaCountState(use_pos=False))
+    assert error.match(r'^lemma counts to merge must have the same use_pos but are True and False$')
+
+
+def test_fails_on_reading_other_file(tmpdir):
+    state_path = str(tmpdir.join('other.json.gz'))
+    with gzip.open(state_path, 'wt', encoding='utf-8') as state_file:
+        state_file.write('{"some": "json"}')
+    with pytest.raises(OpinionError) as error:
+        countstate.read_lemma_count_state(state_path)
+    assert error.match(r'file must contain lemma counts$')
@@ -0,0 +1,141 @@
+"""
+Tests for :py:mod:`shapiro.daemon`.
+"""
+import os
+import stat
+import tempfile
+import threading
+from collections import Counter
+
+import pytest
+from shapiro import countstate, daemon
+from shapiro.commandline import process
+from shapiro.common import OpinionError
+from shapiro.countstate import LemmaCountState
+
+from conftest import data_path
+
+pytestmark = pytest.mark.skipif(not daemon.is_supported(), reason='daemon requires Unix domain sockets')
+
+
+def _state_path(tmpdir) -> str:
+    result = str(tmpdir.join('counts.json.gz'))
+    countstate.write_lemma_count_state(result, LemmaCountState(lemma_pos_to_count_map=Counter({
+        ('hello', None): 3,
+        ('Wien', None): 1,
+    })))
+    return result
+
+
+class _DaemonThread(threading.Thread):
+    def __init__(self, socket_path: str):
+        super().__init__(daemon=True)
+        self.server = daemon.DaemonServer(socket_path)
+
+    def run(self):
+        self.server.serve_forever()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+        self.join()
+
+
+def test_can_forward_only_commands_using_models(monkeypatch):
+    monkeypatch.delenv(daemon.NO_DAEMON_ENVIRONMENT_VARIABLE, raising=False)
+    assert daemon.can_forward(['analyze', 'lexicon.csv', 'feedback.txt'])
+    assert daemon.can_forward(['count', 'feedback.txt'])
+    assert not daemon.can_forward(['merge-counts', 'counts.json.gz'])
+    assert not daemon.can_forward(['--help'])
+    assert not daemon.can_forward([])
+    monkeypatch.setenv(daemon.NO_DAEMON_ENVIRONMENT_VARIABLE, '1')
+    assert not daemon.can_forward(['count', 'feedback.txt'])
+
+
+def test_can_execute_command_like_in_current_process(tmpdir, capsys):
+    state_path = _state_path(tmpdir)
+    assert process(['merge-counts', state_path]) == 0
+    expected_stdout = capsys.readouterr().out
+    exit_code, stdout_data, stderr_data = daemon.executed_exit_code_stdout_and_stderr(
+        ['merge-counts', state_path], os.getcwd(), 'utf-8', 'utf-8')
+    assert exit_code == 0
+    assert stdout_data == expected_stdout.encode('utf-8')
+
+
+def test_can_execute_command_with_invalid_arguments():
+    exit_code, stdout_data, stderr_data = daemon.executed_exit_code_stdout_and_stderr(
+        ['merge-counts', '--number', '-1', 'counts.json.gz'], os.getcwd(), 'utf-8', 'utf-8')
+    assert exit_code == 2
+    assert stdout_data == b''
+    assert b'--number must be at least 0' in stderr_data
+
+
+def test_can_forward_to_daemon(tmpdir, capsys):
+    socket_path = str(tmpdir.join('shapiro.sock'))
+    state_path = _state_path(tmpdir)
+    assert process(['merge-counts', state_path]) == 0
+    expected_stdout = capsys.readouterr().out
+    with _DaemonThread(socket_path):
+        assert daemon.forwarded_exit_code(['merge-counts', state_path], socket_path) == 0
+    assert capsys.readouterr().out == expected_stdout
+    assert not os.path.exists(socket_path)
+
+
+def test_can_analyze_with_daemon_like_in_current_process(tmpdir, en_restauranteering_csv_path: str):
+    socket_path = str(tmpdir.join('shapiro.sock'))
+    data_csv_path = data_path('en_restauranteering_data.csv')
+    in_process_output_path = str(tmpdir.join('in_process.jsonl'))
+    daemon_output_path = str(tmpdir.join('daemon.jsonl'))
+    assert process([
+        'analyze', '--text-column', '4', '--output', in_process_output_path,
+        en_restauranteering_csv_path, data_csv_path]) == 0
+    with _DaemonThread(socket_path):
+        assert daemon.forwarded_exit_code([
+            'analyze', '--text-column', '4', '--output', daemon_output_path,
+            en_restauranteering_csv_path, data_csv_path], socket_path) == 0
+    with open(in_process_output_path, 'rb') as in_process_output_file:
+        with open(daemon_output_path, 'rb') as daemon_output_file:
+            assert daemon_output_file.read() == in_process_output_file.read()
+
+
+def test_can_fall_back_without_daemon(tmpdir):
+    assert daemon.forwarded_exit_code(['count', 'feedback.txt'], str(tmpdir.join('no_such.sock'))) is None
+
+
+def test_fails_on_daemon_already_running(tmpdir):
+    socket_path = str(tmpdir.join('shapiro.sock'))
+    with _DaemonThread(socket_path):
+        with pytest.raises(OpinionError, match='daemon must not already be running'):
+            daemon.DaemonServer(socket_path)
+
+
+def test_can_fall_back_with_socket_of_other_user(tmpdir, monkeypatch):
+    socket_path = str(tmpdir.join('shapiro.sock'))
+    state_path = _state_path(tmpdir)
+    with _DaemonThread(socket_path):
+        current_user_id = os.getuid()
+        monkeypatch.setattr(os, 'getuid', lambda: current_user_id + 1)
+        assert daemon.forwarded_exit_code(['merge-counts', state_path], socket_path) is None
+
+
+def test_can_use_private_temp_folder_for_default_socket(tmpdir, monkeypatch):
+    monkeypatch.delenv(daemon.SOCKET_PATH_ENVIRONMENT_VARIABLE, raising=False)
+    monkeypatch.delenv(daemon.RUNTIME_FOLDER_ENVIRONMENT_VARIABLE, raising=False)
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmpdir))
+    socket_path = daemon.default_socket_path()
+    assert os.path.dirname(socket_path) == daemon.private_temp_folder()
+    with _DaemonThread(socket_path):
+        assert stat.S_IMODE(os.stat(daemon.private_temp_folder()).st_mode) == 0o700
+
+
+def test_fails_on_private_temp_folder_accessible_by_others(tmpdir, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmpdir))
+    os.makedirs(daemon.private_temp_folder())
+    os.chmod(daemon.private_temp_folder(), 0o755)
+    with pytest.raises(OpinionError) as error:
+        daemon.DaemonServer(os.path.join(daemon.private_temp_folder(), 'shapiro.sock'))
+    assert error.match(r'^folder for daemon socket must be a directory only the current user can access')
@@ -0,0 +1,47 @@
+"""
+Tests for :py:mod:`shapiro.detection`.
+"""
+import pytest
+from shapiro.common import OpinionError
+from shapiro.detection import (LanguageDetector, LanguageProfile, detectable_language_codes, language_detector_for,
+                               ngrams)
+
+from conftest import data_path
+
+
+def test_can_split_text_into_ngrams():
+    assert list(ngrams('The cat!')) == [' th', 'the', 'he ', ' ca', 'cat', 'at ']
+    assert list(ngrams('1:0 :-)')) == []
+
+
+def test_can_detect_language_codes():
+    assert {'de', 'en'} <= set(detectable_language_codes())
+
+
+def test_can_detect_language_of_feedback():
+    language_detector = language_detector_for(['de', 'en'])
+    assert language_detector is language_detector_for(['de', 'en'])
+    for language_code in ('de', 'en'):
+        with open(data_path('%s_restaurant_single_feedback.txt' % language_code), encoding='utf-8') as feedback_file:
+            for line in feedback_file:
+                assert language_detector.language_code_of(line) == language_code, 'line=%r' % line
+    assert language_detector.language_code_of('Sehr gut') == 'de'
+    assert language_detector.language_code_of('Food cold') == 'en'
+
+
+def test_can_detect_language_with_custom_profiles():
+    language_detector = LanguageDetector([
+        LanguageProfile('xx', 'aaa aab aba'),
+        LanguageProfile('yy', 'zzz zzy zyz'),
+    ])
+    assert language_detector.language_codes == ['xx', 'yy']
+    assert language_detector.language_code_of('zyzzy') == 'yy'
+    assert language_detector.language_code_of('baa') == 'xx'
+    # Without any letters the first language is used.
+    assert language_detector.language_code_of(':-)') == 'xx'
+
+
+def test_fails_on_language_without_sample():
+    with pytest.raises(OpinionError) as error:
+        language_detector_for(['xx'])
+    assert error.match(r'^cannot detect language "xx" because there is no sample text for it')
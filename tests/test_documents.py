@@ -0,0 +1,34 @@
+"""
+Tests for :py:mod:`shapiro.documents`.
+"""
+import pytest
+from shapiro import documents
+from shapiro.common import OpinionCsvError
+
+from conftest import data_path
+
+
+def test_can_read_documents_from_csv():
+    csv_path = data_path('en_restauranteering_data.csv')
+    assert documents.csv_key_names(csv_path, [0, 1]) == ['Timestap', 'Restaurant-ID']
+    documents_read = list(documents.documents_from_csv_files([csv_path], 3, [1]))
+    assert len(documents_read) == 17
+    assert documents_read[1].index == 1
+    assert documents_read[1].keys == ('nofood',)
+    assert documents_read[1].text == 'Service was very good actually.'
+
+
+def test_can_name_unnamed_csv_columns(tmpdir):
+    csv_path = str(tmpdir.join('feedback.csv'))
+    with open(csv_path, 'w', encoding='utf-8') as csv_file:
+        csv_file.write('brauhof,Tasty.\n')
+    assert documents.csv_key_names(csv_path, [0]) == ['column_1']
+
+
+def test_fails_on_csv_row_with_missing_text(tmpdir):
+    csv_path = str(tmpdir.join('feedback.csv'))
+    with open(csv_path, 'w', encoding='utf-8') as csv_file:
+        csv_file.write('brauhof\n')
+    with pytest.raises(OpinionCsvError) as error:
+        list(documents.documents_from_csv_files([csv_path], 1))
+    assert error.match(r'.+feedback\.csv \(R1\): row must have at least 2 items but has 1$')
@@ -1,8 +1,12 @@
 """
 Tests for :py:mod:`shapiro.language`.
 """
-from shapiro.language import (EnglishSentiment, GermanSentiment,
-                              LanguageSentiment, language_sentiment_for)
+from types import SimpleNamespace
+
+import pytest
+from shapiro.common import OpinionCsvError, Rating
+from shapiro.language import (DIMINISHER, INTENSIFIER, NEGATION, EnglishSentiment, GermanSentiment,
+                              LanguageSentiment, ModifierTrie, WordTrie, language_sentiment_for)
 from spacy.language import Language
 from spacy.tokens import Token
 
@@ -30,3 +34,75 @@ def test_can_find_language_sentiment_for_code():
     assert type(language_sentiment_for('en_US')) == EnglishSentiment
     assert type(language_sentiment_for('de')) == GermanSentiment
     assert type(language_sentiment_for('xx')) == LanguageSentiment
+
+
+def test_can_share_language_sentiment():
+    english_sentiment = language_sentiment_for('en')
+    assert language_sentiment_for('en_GB') is english_sentiment
+    assert 'bad' in english_sentiment.negatives
+    with pytest.raises(TypeError):
+        english_sentiment.negatives['bad'] = Rating.VERY_BAD
+    assert english_sentiment.compiled_idiom_to_localized_rating_text_map \
+        is english_sentiment.compiled_idiom_to_localized_rating_text_map
+
+
+def test_can_read_language_sentiment_from_csv(tmpdir):
+    sentiment_csv_path = str(tmpdir.join('sentiment_es.csv'))
+    with open(sentiment_csv_path, 'w', encoding='utf-8') as sentiment_csv_file:
+        sentiment_csv_file.write('\n'.join([
+            '# kind,text,rating',
+            'intensifier,muy',
+            'positive,bueno,good',
+            'idiom,de rechupete,very good',
+            'rating text,bueno,good',
+            'rating text,muy bueno,very good',
+        ]))
+    spanish_sentiment = LanguageSentiment('es', sentiment_csv_path)
+    assert spanish_sentiment.intensifiers == {'muy'}
+    assert spanish_sentiment.positives == {'bueno': Rating.GOOD}
+    assert spanish_sentiment.rating_to_localized_text_map[Rating.VERY_GOOD] == 'muy bueno'
+    assert list(spanish_sentiment.compiled_idiom_to_localized_rating_text_map.values()) == ['muy bueno']
+
+
+def test_fails_on_language_sentiment_csv_with_unknown_kind(tmpdir):
+    sentiment_csv_path = str(tmpdir.join('sentiment_es.csv'))
+    with open(sentiment_csv_path, 'w', encoding='utf-8') as sentiment_csv_file:
+        sentiment_csv_file.write('adjective,bueno,good\n')
+    with pytest.raises(OpinionCsvError) as error:
+        LanguageSentiment('es', sentiment_csv_path)
+    assert error.match(r'sentiment_es\.csv \(R1C1\): kind "adjective" must be one of: ')
+
+
+def test_can_find_longest_modifiers_with_trie():
+    modifier_trie = ModifierTrie()
+    modifier_trie.add('a little', DIMINISHER)
+    modifier_trie.add('a little bit', DIMINISHER)
+    modifier_trie.add('kind-of', DIMINISHER)
+    modifier_trie.add('not', NEGATION)
+    modifier_trie.add('not', INTENSIFIER)
+    words = 'not a little bit kind - of a little good a'.split()
+    assert list(modifier_trie.spans(words)) == [
+        (0, 1, NEGATION),
+        (1, 4, DIMINISHER),
+        (4, 7, DIMINISHER),
+        (7, 9, DIMINISHER),
+    ]
+    assert list(modifier_trie.spans(words, 2, 9)) == [(4, 7, DIMINISHER), (7, 9, DIMINISHER)]
+
+
+def test_can_find_multi_token_modifier_spans(nlp_en: Language):
+    document = nlp_en('It was a little bit salty. Not kind of good.')
+    modifier_texts_and_kinds = [
+        (document[start:end].text, kind)
+        for start, end, kind in language_sentiment_for('en').modifier_spans(document)
+    ]
+    assert modifier_texts_and_kinds == [('a little bit', DIMINISHER), ('Not', NEGATION), ('kind of', DIMINISHER)]
+
+
+def test_can_find_word_trie_spans_within_sentences():
+    word_trie = WordTrie()
+    word_trie.add_words(['up', 'to', 'par'], Rating.GOOD)
+    words = ['up', 'to', 'par', 'up', 'to', 'par']
+    tokens = [SimpleNamespace(is_sent_start=word_index in (0, 4)) for word_index in range(len(words))]
+    assert list(word_trie.spans(words)) == [(0, 3, Rating.GOOD), (3, 6, Rating.GOOD)]
+    assert list(word_trie.sentence_spans(tokens, words)) == [(0, 3, Rating.GOOD)]
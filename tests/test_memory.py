@@ -0,0 +1,75 @@
+"""
+Tests for :py:mod:`shapiro.memory`.
+"""
+import io
+import re
+import sys
+
+from shapiro.analysis import Lexicon, LexiconEntry
+from shapiro.common import RestaurantTopic
+from shapiro.memory import (MemoryReport, RssTracker, deep_size, loaded_with_component_memory, memory_report,
+                            type_memory_breakdown)
+
+
+def test_can_compute_deep_size():
+    texts = ['a' * 1000, 'b' * 1000]
+    assert deep_size(texts) == sys.getsizeof(texts) + sum(sys.getsizeof(text) for text in texts)
+
+
+def test_can_break_down_lexicon_memory_by_type(lexicon_restauranteering: Lexicon):
+    type_name_to_memory_map = {
+        type_memory.type_name: type_memory
+        for type_memory in type_memory_breakdown(lexicon_restauranteering)
+    }
+    assert type_name_to_memory_map['str'].object_count >= len(lexicon_restauranteering.entries)
+    # Lexicon entries are only created when accessed.
+    assert 'shapiro.analysis.LexiconEntry' not in type_name_to_memory_map
+    # Enums are shared and consequently not part of the lexicon.
+    assert all('Rating' not in type_name and 'Topic' not in type_name for type_name in type_name_to_memory_map)
+
+
+def test_can_attribute_compiled_regexes_to_lexicon():
+    lexicon = Lexicon(RestaurantTopic)
+    lexicon.entries.extend([
+        LexiconEntry('waiter', RestaurantTopic.SERVICE),
+        LexiconEntry('tast.*', RestaurantTopic.FOOD),
+        LexiconEntry('noisy.*', RestaurantTopic.AMBIENCE),
+    ])
+    type_name_to_memory_map = {
+        type_memory.type_name: type_memory
+        for type_memory in type_memory_breakdown(lexicon)
+    }
+    assert type_name_to_memory_map['re.Pattern'].object_count == 2
+
+
+def test_can_measure_memory_of_component():
+    texts, component_memory = loaded_with_component_memory('texts', lambda: ['x' * 100000 for _ in range(10)])
+    assert len(texts) == 10
+    assert component_memory.name == 'texts'
+    # Allow for some noise caused by other allocations in the meantime.
+    assert component_memory.traced_size >= 9 * 100000
+
+
+def test_can_track_peak_rss():
+    rss_tracker = RssTracker(2)
+    for _ in range(5):
+        rss_tracker.add_document()
+    rss_tracker.finish()
+    assert [document_count for document_count, _ in rss_tracker.document_count_and_peak_rss_pairs] == [0, 2, 4, 5]
+
+
+def test_can_write_memory_report():
+    report = MemoryReport()
+    report.loaded('texts', lambda: ['x' * 1000, 'y' * 1000])
+    report_file = io.StringIO()
+    report.write(report_file)
+    report_text = report_file.getvalue()
+    assert re.search(r'^texts +\d+\.\d{3} ', report_text, re.MULTILINE) is not None
+    assert 'texts: 3 objects' in report_text
+
+
+def test_can_create_memory_report(en_restauranteering_csv_path: str, restaurant_feedback_txt_path: str):
+    report = memory_report(en_restauranteering_csv_path, 'en', [restaurant_feedback_txt_path], rss_interval=1)
+    assert [component_memory.name for component_memory in report.component_memories] == [
+        'lexicon', 'language sentiment', 'compiled idioms', 'emoticons', 'model en']
+    assert report.rss_tracker.document_count >= 1
@@ -0,0 +1,36 @@
+"""
+Tests for :py:mod:`shapiro.models`.
+"""
+import gc
+from concurrent.futures import ThreadPoolExecutor
+
+from shapiro import models
+from shapiro.analysis import Lexicon, SentimentContext
+from shapiro.common import RestaurantTopic
+
+
+def test_can_build_model_key():
+    assert models.model_key('en') == ('en', ())
+    assert models.model_key('en', ['parser', 'ner', 'parser']) == ('en', ('ner', 'parser'))
+
+
+def test_can_share_language_model():
+    nlp_en = models.language_model('en')
+    assert models.language_model('en') is nlp_en
+    assert models.model_key('en') in models.loaded_model_keys()
+    assert SentimentContext('en', Lexicon(RestaurantTopic)).language is nlp_en
+
+
+def test_can_share_language_model_between_threads():
+    models.unload_models()
+    with ThreadPoolExecutor(4) as executor:
+        nlps = list(executor.map(lambda _: models.language_model('en', models.LEMMA_ONLY_DISABLED_PIPES), range(4)))
+    assert all(nlp is nlps[0] for nlp in nlps)
+    assert models.loaded_model_keys() == [models.model_key('en', models.LEMMA_ONLY_DISABLED_PIPES)]
+
+
+def test_can_prepare_fork():
+    with models.prepared_fork():
+        pass
+    if hasattr(gc, 'get_freeze_count'):
+        assert gc.get_freeze_count() == 0
@@ -0,0 +1,68 @@
+"""
+Tests for :py:mod:`shapiro.output`.
+"""
+import gzip
+import io
+import json
+import os
+
+from shapiro import output
+from shapiro.common import Rating, RestaurantTopic
+from shapiro.output import OutputFormat
+
+
+def test_can_write_csv_opinions():
+    target_file = io.StringIO()
+    with output.CsvOpinionWriter(target_file) as writer:
+        writer.write_header()
+        writer.write_opinion(RestaurantTopic.SERVICE, Rating.VERY_GOOD, 'The waiter was "very" polite.')
+        writer.write_opinion(None, None, 'The football game ended 2:1, sadly.')
+    assert target_file.getvalue() == (
+        '# topic,rating,text\n'
+        'service,very_good,"The waiter was ""very"" polite."\n'
+        ',,"The football game ended 2:1, sadly."\n'
+    )
+
+
+def test_can_write_csv_opinions_with_keys():
+    target_file = io.StringIO()
+    with output.CsvOpinionWriter(target_file, key_names=['restaurant']) as writer:
+        writer.write_header()
+        writer.write_opinion(RestaurantTopic.FOOD, Rating.GOOD, 'Tasty.', keys=['brauhof'])
+    assert target_file.getvalue() == '# restaurant,topic,rating,text\nbrauhof,food,good,Tasty.\n'
+
+
+def test_can_write_json_lines_opinions():
+    target_file = io.StringIO()
+    with output.JsonLinesOpinionWriter(target_file, key_names=['restaurant']) as writer:
+        writer.write_opinion(RestaurantTopic.FOOD, Rating.GOOD, 'Tasty.', keys=['brauhof'])
+        writer.write_opinion(None, None, 'Hello.', keys=['nofood'])
+    assert [json.loads(line) for line in target_file.getvalue().splitlines()] == [
+        {'restaurant': 'brauhof', 'topic': 'food', 'rating': 'good', 'text': 'Tasty.'},
+        {'restaurant': 'nofood', 'topic': None, 'rating': None, 'text': 'Hello.'},
+    ]
+
+
+def test_can_buffer_opinions():
+    target_file = io.StringIO()
+    writer = output.CsvOpinionWriter(target_file, buffer_size=20)
+    writer.write_opinion(None, None, 'short')
+    assert target_file.getvalue() == ''
+    writer.write_opinion(None, None, 'something longer than the buffer')
+    assert target_file.getvalue() == ',,short\n,,something longer than the buffer\n'
+    writer.close()
+
+
+def test_can_derive_output_format_from_path():
+    assert output.output_format_for('opinions.csv') == OutputFormat.CSV
+    assert output.output_format_for('opinions.jsonl') == OutputFormat.JSON_LINES
+    assert output.output_format_for('opinions.JSONL.gz') == OutputFormat.JSON_LINES
+    assert output.output_format_for('opinions.txt') == OutputFormat.CSV
+
+
+def test_can_write_gzip_compressed_opinions(tmpdir):
+    target_path = os.path.join(str(tmpdir), 'opinions.jsonl.gz')
+    with output.opinion_writer(target_path) as writer:
+        writer.write_opinion(RestaurantTopic.FOOD, Rating.GOOD, 'Tasty.')
+    with gzip.open(target_path, 'rt', encoding='utf-8') as target_file:
+        assert json.loads(target_file.read()) == {'topic': 'food', 'rating': 'good', 'text': 'Tasty.'}
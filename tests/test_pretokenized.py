@@ -0,0 +1,92 @@
+"""
+Tests for :py:mod:`shapiro.pretokenized`.
+"""
+import io
+
+import pytest
+from shapiro import analysis
+from shapiro.analysis import Lexicon
+from shapiro.common import OpinionError, Rating, RestaurantTopic
+from shapiro.language import EnglishSentiment
+from shapiro.pretokenized import (PretokenizedDoc, documents_from_conllu, documents_from_jsonl,
+                                  documents_from_pretokenized_files)
+
+from conftest import data_path
+
+_CONLLU_PATH = data_path('en_restaurant_pretokenized_feedback.conllu')
+_JSONL_PATH = data_path('en_restaurant_pretokenized_feedback.jsonl')
+
+
+def test_can_build_pretokenized_doc():
+    doc = PretokenizedDoc([
+        [('Tasty', 'tasty', 'ADJ', False), ('!', '!', 'PUNCT', False)],
+        [('Yes', 'yes', 'INTJ', True)],
+    ])
+    assert doc.text == 'Tasty! Yes'
+    assert [(sent.start_char, str(sent)) for sent in doc.sents] == [(0, 'Tasty! '), (7, 'Yes ')]
+    assert [token.is_sent_start for token in doc] == [True, False, True]
+
+
+def test_can_read_documents_from_conllu():
+    with open(_CONLLU_PATH, encoding='utf-8') as conllu_file:
+        documents = list(documents_from_conllu(conllu_file))
+    assert [(document.index, document.keys, document.text) for document in documents] == [
+        (0, ('r1',), 'The waiter was not very polite. The food was a little bit tasty.'),
+        (1, ('r2',), "Don't cut corners!"),
+    ]
+    assert [token.lemma_ for token in documents[1].doc] == ['do', 'not', 'cut', 'corner', '!']
+
+
+def test_can_read_same_documents_from_conllu_and_jsonl():
+    documents_from_both_formats = [
+        list(documents_from_pretokenized_files([path], pretokenized_format))
+        for path, pretokenized_format in ((_CONLLU_PATH, 'conllu'), (_JSONL_PATH, 'jsonl'))
+    ]
+    conllu_documents, jsonl_documents = [
+        [(document.keys, document.text, [token.pos_ for token in document.doc]) for document in documents]
+        for documents in documents_from_both_formats
+    ]
+    assert conllu_documents == jsonl_documents
+
+
+def test_fails_on_broken_conllu():
+    with pytest.raises(OpinionError) as error:
+        list(documents_from_conllu(io.StringIO('1\tTasty\ttasty\n')))
+    assert error.match(r'^<io>:1: CoNLL-U token line must have 10 tab separated columns but has 3$')
+
+
+def test_fails_on_broken_jsonl():
+    with pytest.raises(OpinionError) as error:
+        list(documents_from_jsonl(io.StringIO('{"sentences": [[{"lemma": "tasty"}]]}\n')))
+    assert error.match(r'^<io>:1: cannot read pretokenized document: ')
+
+
+def test_can_find_opinions_in_pretokenized_documents(
+        lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
+    opinion_miner = analysis.OpinionMiner(None, lexicon_restauranteering, english_sentiment)
+    assert opinion_miner.idiom_matching == analysis.IDIOM_MATCHING_TOKENS
+    with open(_JSONL_PATH, encoding='utf-8') as jsonl_file:
+        topics_and_ratings = [
+            (topic, rating)
+            for document in documents_from_jsonl(jsonl_file)
+            for topic, rating, _ in opinion_miner.opinions_of_document(document.doc)
+        ]
+    assert topics_and_ratings == [
+        (RestaurantTopic.SERVICE, Rating.SOMEWHAT_BAD),
+        (RestaurantTopic.FOOD, Rating.SOMEWHAT_GOOD),
+        (None, Rating.SOMEWHAT_GOOD),
+    ]
+
+
+def test_can_find_opinion_records_in_pretokenized_documents(
+        lexicon_restauranteering: Lexicon, english_sentiment: EnglishSentiment):
+    opinion_miner = analysis.OpinionMiner(None, lexicon_restauranteering, english_sentiment)
+    with open(_CONLLU_PATH, encoding='utf-8') as conllu_file:
+        document = next(documents_from_conllu(conllu_file))
+    opinion_records = list(opinion_miner.opinion_records_of_document(document.doc, with_token_indices=True))
+    assert [(record.start, record.end, record.text, record.token_indices) for record in opinion_records] == [
+        (0, 31, 'The waiter was not very polite.', (1, 3, 4, 5)),
+        (32, 64, 'The food was a little bit tasty.', (10, 11, 12, 13)),
+    ]
+    assert [record.text for record in opinion_records] == [
+        document.text[record.start:record.end] for record in opinion_records]
@@ -0,0 +1,91 @@
+"""
+Tests for :py:mod:`shapiro.profiling`.
+"""
+import cProfile
+import io
+import pstats
+
+from shapiro import profiling
+from shapiro.profiling import TimingStats, collapsed_stacks, profiled
+
+
+def test_can_measure_stages():
+    stats = TimingStats(enabled=True)
+    for _ in range(3):
+        with stats.measured('some'):
+            sum(range(1000))
+    with stats.measured('other'):
+        pass
+    assert [stage for stage, _ in stats.stage_and_timing_pairs()] == ['some', 'other']
+    assert stats.timing('some').call_count == 3
+    assert stats.timing('some').wall_time > 0
+
+
+def test_ignores_stages_unless_enabled():
+    stats = TimingStats()
+    with stats.measured('some'):
+        pass
+    assert stats.stage_and_timing_pairs() == []
+
+
+def test_can_merge_timing_stats():
+    stats = TimingStats()
+    stats.add('some', 1.0, 0.5)
+    other_stats = TimingStats()
+    other_stats.add('some', 2.0, 1.0, 3)
+    other_stats.add('other', 1.0, 1.0)
+    stats.merge(other_stats)
+    assert stats.timing('some').wall_time == 3.0
+    assert stats.timing('some').call_count == 4
+    assert stats.timing('other').cpu_time == 1.0
+
+
+def test_can_write_timing_report():
+    stats = TimingStats()
+    stats.add('preprocess', 1.0, 1.0, 10)
+    stats.add('spacy.parser', 3.0, 2.5, 10)
+    report_file = io.StringIO()
+    stats.write_report(report_file, 5.0, 4.0)
+    report_lines = report_file.getvalue().splitlines()
+    assert report_lines[0].split() == ['stage', 'calls', 'wall', 's', 'cpu', 's', 'wall', '%', 'wall', 'ms/call']
+    assert report_lines[2].split() == ['spacy.parser', '10', '3.000', '2.500', '60.0', '300.000']
+    assert report_lines[3].split() == ['other', '1.000', '0.500', '20.0']
+    assert report_lines[4].split() == ['total', '5.000', '4.000', '100.0']
+
+
+def test_can_measure_stage_cpu_time_with_same_clock_as_total():
+    stats = TimingStats(enabled=True)
+    start_cpu_time = profiling.cpu_time()
+    with stats.measured('some'):
+        sum(range(100000))
+    sum(range(100000))
+    total_cpu_time = profiling.cpu_time() - start_cpu_time
+    assert 0.0 <= stats.timing('some').cpu_time <= total_cpu_time
+
+
+def _some_leaf():
+    return sum(range(20000))
+
+
+def _some_branch():
+    return [_some_leaf() for _ in range(50)]
+
+
+def test_can_collapse_stacks():
+    profile = cProfile.Profile()
+    profile.enable()
+    _some_branch()
+    profile.disable()
+    stack_to_microseconds_map = collapsed_stacks(pstats.Stats(profile))
+    leaf_stacks = [stack.split(';') for stack in stack_to_microseconds_map if '_some_leaf ' in stack]
+    assert len(leaf_stacks) >= 1
+    for leaf_stack in leaf_stacks:
+        assert leaf_stack[0].startswith('_some_branch ')
+
+
+def test_can_write_profile(tmpdir):
+    profile_path = str(tmpdir.join('some.prof'))
+    with profiled(profile_path):
+        _some_branch()
+    assert pstats.Stats(profile_path).total_calls >= 1
+    assert '_some_leaf' in tmpdir.join('some.prof.collapsed').read_text('utf-8')
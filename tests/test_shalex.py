@@ -7,6 +7,8 @@ from shapiro.analysis import Lexicon
 from shapiro.common import RestaurantTopic
 from spacy.language import Language
 
+from conftest import data_path
+
 
 def test_lexicon_and_feedback_file(
         nlp_en: Language, en_restauranteering_csv_path: str, restaurant_feedback_txt_path: str):
@@ -21,3 +23,53 @@ def test_lexicon_and_feedback_file(
     document = nlp_en(feedback_text)
     for sentence in document.sents:
         shalex.unknown_lexicon_lemmas(lexicon, sentence)
+
+
+def test_can_rank_unknown_lemmas():
+    lemma_pos_to_count_map = {
+        ('soap', 'NOUN'): 1,
+        ('waiter', 'NOUN'): 3,
+        ('cozy', 'ADJ'): 3,
+        ('wait', 'VERB'): 2,
+    }
+    assert shalex.ranked_unknown_lemmas(lemma_pos_to_count_map, min_count=2) == [
+        (3, 'cozy', 'ADJ'),
+        (3, 'waiter', 'NOUN'),
+        (2, 'wait', 'VERB'),
+    ]
+    assert shalex.ranked_unknown_lemmas(lemma_pos_to_count_map, number=1) == [(3, 'cozy', 'ADJ')]
+
+
+def test_can_count_unknown_lemmas(nlp_en: Language, en_restauranteering_csv_path: str):
+    lexicon = Lexicon(RestaurantTopic)
+    lexicon.read_from_csv(en_restauranteering_csv_path)
+    lemma_pos_to_count_map = shalex.unknown_lemma_pos_to_count_map(
+        nlp_en, lexicon, ['The waiter was very good.', 'What a waiter!'])
+    assert lemma_pos_to_count_map[('waiter', 'NOUN')] == 2
+    assert all(lemma != 'good' for lemma, _ in lemma_pos_to_count_map.keys())
+
+
+def test_can_count_unknown_lemmas_in_parallel(nlp_en: Language, en_restauranteering_csv_path: str):
+    lexicon = Lexicon(RestaurantTopic)
+    lexicon.read_from_csv(en_restauranteering_csv_path)
+    texts = list(shalex.texts_from_files([data_path('en_restauranteering_data.csv')]))
+    serial_lemma_pos_to_count_map = shalex.unknown_lemma_pos_to_count_map(nlp_en, lexicon, texts)
+    parallel_lemma_pos_to_count_map = shalex.unknown_lemma_pos_to_count_map(
+        nlp_en, lexicon, texts, jobs=2, chunk_size=3)
+    assert len(serial_lemma_pos_to_count_map) >= 1
+    assert parallel_lemma_pos_to_count_map == serial_lemma_pos_to_count_map
+
+
+def test_can_write_unknown_lemmas_csv(en_restauranteering_csv_path: str, tmpdir):
+    unknown_lemmas_csv_path = str(tmpdir.join('unknown_lemmas.csv'))
+    exit_code = shalex.process([
+        '--output', unknown_lemmas_csv_path, '--min-count', '1',
+        en_restauranteering_csv_path, data_path('en_restauranteering_data.csv')])
+    assert exit_code == 0
+    with open(unknown_lemmas_csv_path, encoding='utf-8') as unknown_lemmas_csv_file:
+        lines = unknown_lemmas_csv_file.read().splitlines()
+    assert lines[0] == '# Lemma,POS,Topic,Rating,Count'
+    assert len(lines) >= 2
+    lexicon = Lexicon(RestaurantTopic)
+    lexicon.read_from_csv(unknown_lemmas_csv_path)
+    assert len(lexicon.entries) == len(lines) - 1
@@ -0,0 +1,57 @@
+"""
+Tests for :py:mod:`shapiro.sketch`.
+"""
+from collections import Counter
+
+from shapiro.sketch import SpaceSavingCounter
+
+
+def _zipf_keys(key_count: int):
+    """
+    Keys where key ``i`` occurs about ``key_count / i`` times.
+    """
+    result = []
+    for key in range(1, key_count + 1):
+        result.extend([key] * (key_count // key))
+    # Shuffle deterministically so keys do not arrive sorted.
+    return sorted(result, key=lambda key: (key * 7919) % 104729)
+
+
+def test_can_count_exactly_within_capacity():
+    counter = SpaceSavingCounter(10)
+    counter.update('abracadabra')
+    assert counter.is_exact
+    assert dict(counter.items()) == dict(Counter('abracadabra'))
+    assert counter.most_common(1) == [('a', 5)]
+
+
+def test_can_count_approximately_beyond_capacity():
+    keys = _zipf_keys(200)
+    exact_counts = Counter(keys)
+    counter = SpaceSavingCounter(50)
+    counter.update(keys)
+    assert len(counter) == 50
+    assert counter.total == len(keys)
+    assert not counter.is_exact
+    assert counter.max_error <= counter.total / counter.capacity
+    for key, count in counter.items():
+        assert count - counter.error(key) <= exact_counts[key] <= count
+    for key, exact_count in exact_counts.items():
+        if exact_count > counter.total / counter.capacity:
+            assert key in counter
+    assert [key for key, _ in counter.most_common(3)] == [1, 2, 3]
+
+
+def test_can_merge_counters():
+    keys = _zipf_keys(200)
+    exact_counts = Counter(keys)
+    counter = SpaceSavingCounter(50)
+    counter.update(keys[::2])
+    other_counter = SpaceSavingCounter(50)
+    other_counter.update(keys[1::2])
+    counter.merge(other_counter)
+    assert len(counter) == 50
+    assert counter.total == len(keys)
+    for key, count in counter.items():
+        assert count - counter.error(key) <= exact_counts[key] <= count
+    assert [key for key, _ in counter.most_common(3)] == [1, 2, 3]
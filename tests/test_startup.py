@@ -0,0 +1,53 @@
+"""
+Tests for the time it takes to start the command line interface.
+"""
+import os
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+
+#: Modules that take long to import and must only be imported by commands that need them.
+_SLOW_MODULE_NAMES = ('numpy', 'pkg_resources', 'spacy')
+
+#: Maximum time in microseconds importing the command line interface may take.
+_MAX_IMPORT_MICROSECONDS = 500000
+
+
+def _module_name_to_import_microseconds_map(module_name: str) -> Dict[str, int]:
+    """
+    The cumulative time in microseconds it took to import each module when
+    importing ``module_name`` in a new process as reported by
+    ``python -X importtime``.
+    """
+    # Use the same module search path as the current process so the module
+    # to import is found even if shapiro is not installed.
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    completed_process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module_name],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True, env=environment)
+    result = {}
+    for line in completed_process.stderr.splitlines():
+        # Lines look like: "import time:       145 |        521 |   shapiro.tools"
+        if line.startswith('import time:'):
+            _, cumulative_microseconds_text, imported_module_name = line[len('import time:'):].split('|')
+            if cumulative_microseconds_text.strip().isdigit():
+                result[imported_module_name.strip()] = int(cumulative_microseconds_text)
+    return result
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='python -X importtime requires Python 3.7')
+def test_can_import_commandline_without_slow_modules():
+    module_name_to_import_microseconds_map = _module_name_to_import_microseconds_map('shapiro.commandline')
+    slow_module_names = [
+        module_name for module_name in module_name_to_import_microseconds_map.keys()
+        if module_name.split('.')[0] in _SLOW_MODULE_NAMES
+    ]
+    assert slow_module_names == []
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='python -X importtime requires Python 3.7')
+def test_can_import_commandline_within_budget():
+    import_microseconds = _module_name_to_import_microseconds_map('shapiro.commandline')['shapiro.commandline']
+    assert import_microseconds <= _MAX_IMPORT_MICROSECONDS
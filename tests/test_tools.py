@@ -1,6 +1,9 @@
 """
 Tests for :py:mod:`shapiro.tools`.
 """
+from multiprocessing.pool import ThreadPool
+
+import pytest
 from shapiro import tools
 
 
@@ -8,3 +11,31 @@ def test_can_detect_close_float_numbers():
     assert tools.is_close(0.0, 0.0)
     assert tools.is_close(1.0, 1.0)
     assert not tools.is_close(1.0, 0.99)
+
+
+def test_can_split_items_into_chunks():
+    assert list(tools.chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(tools.chunked([], 2)) == []
+
+
+def test_can_map_with_bounded_pending_items():
+    taken_item_count = 0
+
+    def items():
+        nonlocal taken_item_count
+        for item in range(20):
+            taken_item_count += 1
+            yield item
+
+    results = []
+    with ThreadPool(2) as pool:
+        for result in tools.bounded_imap_unordered(pool, abs, items(), 3):
+            results.append(result)
+            assert taken_item_count <= len(results) + 3
+    assert sorted(results) == list(range(20))
+
+
+def test_fails_on_error_in_bounded_map():
+    with ThreadPool(2) as pool:
+        with pytest.raises(ZeroDivisionError):
+            list(tools.bounded_imap_unordered(pool, lambda item: 1 / item, [1, 0, 2], 2))